@@ -0,0 +1,258 @@
+from threading import Lock, Thread
+from time import monotonic
+from typing import Callable, Iterator
+from app.constants import *
+from app import logger
+from app.database import Database, Stream, current_ms
+from app.datatypes import Collection, Hash, List, Set
+from app.resp import RESPParser, encode_array
+import os
+
+class AppendOnlyFile:
+    def __init__(self, config: dict, database: Database) -> None:
+        self._config = config
+        self._database = database
+        self._lock = Lock()
+        self._buffer = bytearray()
+        self._file = None
+        self._needs_fsync = False
+        self._fsync_thread = None
+        self._last_fsync = monotonic()
+        self._rewrite_pid = None
+        self._rewrite_buffer = None
+
+    def path(self) -> str:
+        return os.path.join(self._config[RDB_DIR] or DEFAULT_RDB_DIR, self._config[APPENDFILENAME])
+
+    def enabled(self) -> bool:
+        return self._config[APPENDONLY]
+
+    def open(self) -> None:
+        if self.enabled():
+            self._file = open(self.path(), "ab")
+
+    def feed(self, command: str, args: list[bytes], payload: bytes) -> None:
+        if not self.enabled():
+            return
+
+        self._append(self.persistent_payload(command, args, payload))
+
+    def feed_transaction(self, payloads: list[bytes]) -> None:
+        if self.enabled():
+            self._append(wrap_transaction(payloads))
+
+    def persistent_payload(self, command: str, args: list[bytes], payload: bytes) -> bytes:
+        if command == 'SET' and len(args) > 3:
+            options = [arg.upper() for arg in args[2:]]
+
+            if b'EX' in options or b'PX' in options or b'EXAT' in options:
+                expiry = self._database.expiry(args[0])
+                return encode_array([command, args[0], args[1]] + _without_expiry(args[2:]) + ["PXAT", expiry])
+
+        return payload
+
+    def _append(self, payload: bytes) -> None:
+        with self._lock:
+            self._buffer += payload
+
+            if self._rewrite_buffer is not None:
+                self._rewrite_buffer += payload
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+
+        with self._lock:
+            self._file.write(self._buffer)
+            self._file.flush()
+            self._buffer.clear()
+            self._needs_fsync = True
+
+            if self._config[APPENDFSYNC] == APPENDFSYNC_ALWAYS:
+                os.fsync(self._file.fileno())
+                self._needs_fsync = False
+
+    def cron(self) -> None:
+        if self._rewrite_pid is not None:
+            self._reap_rewrite()
+
+        if not self.enabled() or self._config[APPENDFSYNC] != APPENDFSYNC_EVERYSEC:
+            return
+
+        self.flush()
+
+        if self._needs_fsync and monotonic() - self._last_fsync >= 1 and not (self._fsync_thread and self._fsync_thread.is_alive()):
+            self._needs_fsync = False
+            self._last_fsync = monotonic()
+            self._fsync_thread = Thread(target=self._fsync, daemon=True)
+            self._fsync_thread.start()
+
+    def _fsync(self) -> None:
+        with self._lock:
+            if self._file is None or self._file.closed:
+                return
+
+            fd = os.dup(self._file.fileno())
+
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def rewrite_in_progress(self) -> bool:
+        return self._rewrite_pid is not None
+
+    def background_rewrite(self) -> bool:
+        if self.rewrite_in_progress():
+            return False
+
+        with self._database.locked(None), self._lock:
+            pid = os.fork()
+
+            if pid == 0:
+                try:
+                    self._write_rewrite(self._temp_rewrite_path(os.getpid()))
+                    os._exit(0)
+                except BaseException:
+                    os._exit(1)
+
+            self._rewrite_pid = pid
+            self._rewrite_buffer = bytearray()
+
+        logger.notice("background append only file rewriting started by pid %d", pid)
+        return True
+
+    def replay(self, execute: Callable[[str, list[bytes]], None]) -> int:
+        parser = RESPParser()
+        commands = 0
+
+        with open(self.path(), "rb") as file:
+            while data := file.read(AOF_REPLAY_READ_BYTES):
+                parser.feed(data)
+
+                while request := parser.next_command():
+                    execute(*request)
+                    commands += 1
+
+        if parser.is_not_empty():
+            logger.warning("ignoring truncated command at the end of the append only file")
+
+        return commands
+
+    def _reap_rewrite(self) -> None:
+        pid, status = os.waitpid(self._rewrite_pid, os.WNOHANG)
+
+        if pid == 0:
+            return
+
+        temp_path = self._temp_rewrite_path(pid)
+
+        with self._lock:
+            if os.waitstatus_to_exitcode(status) == 0:
+                with open(temp_path, "ab") as file:
+                    file.write(self._rewrite_buffer)
+                    file.flush()
+                    os.fsync(file.fileno())
+
+                if self._file:
+                    self._file.write(self._buffer)
+                    self._file.close()
+                    self._buffer.clear()
+
+                os.replace(temp_path, self.path())
+
+                if self.enabled():
+                    self._file = open(self.path(), "ab")
+
+                logger.notice("background append only file rewriting terminated with success")
+            else:
+                logger.warning("background append only file rewriting error")
+
+            self._rewrite_pid = None
+            self._rewrite_buffer = None
+
+    def _temp_rewrite_path(self, pid: int) -> str:
+        return os.path.join(os.path.dirname(self.path()) or ".", f"temp-rewriteaof-{pid}.aof")
+
+    def _write_rewrite(self, path: str) -> None:
+        now = current_ms()
+
+        with open(path, "wb") as file:
+            buffer = bytearray()
+
+            for key, value, expiry in self._database.items():
+                if expiry is not None and expiry <= now:
+                    continue
+
+                if isinstance(value, Stream):
+                    for command in _rewrite_stream(key, value):
+                        buffer += encode_array(command)
+                elif isinstance(value, Collection):
+                    for command in _rewrite_commands(key, value):
+                        buffer += encode_array(command)
+                else:
+                    buffer += encode_array(["SET", key, value] + (["PXAT", expiry] if expiry is not None else []))
+
+                if len(buffer) >= AOF_REWRITE_BUFFER_BYTES:
+                    file.write(buffer)
+                    buffer.clear()
+
+            file.write(buffer)
+            file.flush()
+            os.fsync(file.fileno())
+
+def _rewrite_commands(key: bytes, value: Collection) -> Iterator[list[object]]:
+    if isinstance(value, Hash):
+        command, elements, step = "HSET", value.items(), 2
+    elif isinstance(value, List):
+        command, elements, step = "RPUSH", value.items(), 1
+    elif isinstance(value, Set):
+        command, elements, step = "SADD", value.members(), 1
+    else:
+        command, elements, step = "ZADD", [e for member, score in value.to_rdb()[1] for e in (b"%r" % score, member)], 2
+
+    batch = AOF_REWRITE_ITEMS_PER_CMD * step
+
+    for i in range(0, len(elements), batch):
+        yield [command, key] + elements[i:i + batch]
+
+def _rewrite_stream(key: bytes, value: Stream) -> Iterator[list[object]]:
+    stream = value.to_rdb()
+    format_id = lambda entry_id: b"%d-%d" % entry_id
+
+    for entry_id, fields in stream["entries"]:
+        yield ["XADD", key, format_id(entry_id)] + fields
+
+    if not stream["entries"]:
+        yield ["XADD", key, "MAXLEN", 0, format_id(max(stream["last_id"], (0, 1))), "x", "y"]
+
+    yield ["XSETID", key, format_id(stream["last_id"]), "ENTRIESADDED", stream["entries_added"], "MAXDELETEDID", format_id(stream["max_deleted_id"])]
+
+    for group in stream["groups"]:
+        entries_read = group["entries_read"] if group["entries_read"] is not None else -1
+        yield ["XGROUP", "CREATE", key, group["name"], format_id(group["last_id"]), "ENTRIESREAD", entries_read]
+
+        for consumer in group["consumers"]:
+            yield ["XGROUP", "CREATECONSUMER", key, group["name"], consumer]
+
+        for entry_id, (consumer, delivery_time, delivery_count) in group["pending"].items():
+            yield ["XCLAIM", key, group["name"], consumer, 0, format_id(entry_id), "TIME", delivery_time, "RETRYCOUNT", delivery_count, "JUSTID", "FORCE"]
+
+def _without_expiry(options: list[bytes]) -> list[bytes]:
+    kept = []
+    i = 0
+
+    while i < len(options):
+        if options[i].upper() in (b'EX', b'PX', b'EXAT', b'PXAT'):
+            i += 2
+        else:
+            kept.append(options[i])
+            i += 1
+
+    return kept
+
+def wrap_transaction(payloads: list[bytes]) -> bytes:
+    if len(payloads) == 1:
+        return payloads[0]
+
+    return b"".join([encode_array(["MULTI"])] + payloads + [encode_array(["EXEC"])])
@@ -0,0 +1,149 @@
+from heapq import heappush, heappop
+from itertools import count
+from threading import Event, Lock, get_ident
+from time import monotonic
+from typing import Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+class KeyspaceNotifier:
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._waiters = {}
+        self._loop_thread = None
+        self._call_soon = None
+        self._deadlines = []
+        self._sequence = count()
+        self._parked = None
+
+    def use_event_loop(self, loop_thread: int, call_soon: Callable[[Callable[[], None]], None]) -> None:
+        self._loop_thread = loop_thread
+        self._call_soon = call_soon
+
+    def wait_for(self, keys: list[Hashable], predicate: Callable[[], T], timeout: float | None, on_result: Callable[[T], None]) -> None:
+        if self._loop_thread is None or get_ident() != self._loop_thread:
+            on_result(self._wait(keys, predicate, timeout))
+            return
+
+        result = predicate()
+
+        if result:
+            on_result(result)
+            return
+
+        waiter = Waiter(keys, predicate, on_result, result, self._schedule_retry)
+        self._register(keys, waiter)
+
+        if timeout is not None:
+            heappush(self._deadlines, (monotonic() + timeout, next(self._sequence), waiter))
+
+        self._parked = waiter
+
+    def take_parked(self) -> "Waiter | None":
+        waiter, self._parked = self._parked, None
+        return waiter
+
+    def next_deadline(self) -> float | None:
+        while self._deadlines and self._deadlines[0][2].done:
+            heappop(self._deadlines)
+
+        return self._deadlines[0][0] if self._deadlines else None
+
+    def expire_waiters(self) -> None:
+        now = monotonic()
+
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, waiter = heappop(self._deadlines)
+
+            if not waiter.done:
+                self._finish(waiter, waiter.result)
+
+    def cancel(self, waiter: "Waiter") -> None:
+        if not waiter.done:
+            waiter.done = True
+            self._unregister(waiter.keys, waiter)
+
+    def notify(self, key: Hashable) -> None:
+        if key not in self._waiters:
+            return
+
+        with self._lock:
+            for event in self._waiters.get(key, ()):
+                event.set()
+
+    def _wait(self, keys: list[Hashable], predicate: Callable[[], T], timeout: float | None) -> T:
+        deadline = monotonic() + timeout if timeout is not None else None
+        event = Event()
+        self._register(keys, event)
+
+        try:
+            result = predicate()
+
+            while not result:
+                remaining = deadline - monotonic() if deadline is not None else None
+
+                if remaining is not None and remaining <= 0:
+                    break
+
+                event.wait(remaining)
+                event.clear()
+                result = predicate()
+        finally:
+            self._unregister(keys, event)
+
+        return result
+
+    def _schedule_retry(self, waiter: "Waiter") -> None:
+        self._call_soon(lambda: self._retry(waiter))
+
+    def _retry(self, waiter: "Waiter") -> None:
+        waiter.scheduled = False
+
+        if waiter.done:
+            return
+
+        waiter.result = waiter.predicate()
+
+        if waiter.result:
+            self._finish(waiter, waiter.result)
+
+    def _finish(self, waiter: "Waiter", result: object) -> None:
+        self.cancel(waiter)
+        waiter.on_result(result)
+
+        if waiter.on_done is not None:
+            waiter.on_done()
+
+    def _register(self, keys: list[Hashable], event: "Event | Waiter") -> None:
+        with self._lock:
+            for key in keys:
+                self._waiters.setdefault(key, set()).add(event)
+
+    def _unregister(self, keys: list[Hashable], event: "Event | Waiter") -> None:
+        with self._lock:
+            for key in keys:
+                waiters = self._waiters.get(key)
+
+                if waiters is None:
+                    continue
+
+                waiters.discard(event)
+
+                if not waiters:
+                    del self._waiters[key]
+
+class Waiter:
+    def __init__(self, keys: list[Hashable], predicate: Callable[[], object], on_result: Callable[[object], None], result: object, schedule_retry: Callable[["Waiter"], None]) -> None:
+        self.keys = keys
+        self.predicate = predicate
+        self.on_result = on_result
+        self.on_done = None
+        self.result = result
+        self.done = False
+        self.scheduled = False
+        self._schedule_retry = schedule_retry
+
+    def set(self) -> None:
+        if not self.scheduled:
+            self.scheduled = True
+            self._schedule_retry(self)
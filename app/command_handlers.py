@@ -1,253 +1,1950 @@
 from app.resp import *
 from app.constants import *
-from time import time, sleep
-from app.database import Database
-import sys
+from time import time
+from math import isfinite
+from decimal import Decimal
+from app.database import Database, Stream, ConsumerGroup, current_ms, type_name, pack_stream_id, format_stream_id
+from app.datatypes import Collection, Hash, List, Set, SortedSet, encode_int, decode_int
+from app.blocking import KeyspaceNotifier
+from app.persistence import SnapshotManager
+from app.aof import AppendOnlyFile
+from app.replication import ReplicationBacklog, ReplicaConnection, start_full_resync
+from app.metrics import Metrics
+from app.commands import Command, xreadgroup_without_block
+from app.transactions import Transaction
+from app import logger, datatypes
+from typing import Callable
+import os
+import resource
 
-def handle_ping(socket: RESPSocket, args: list[str]) -> None:
+def handle_ping(socket: RESPSocket, args: list[bytes]) -> None:
     response = encode_simple_string("PONG")
     socket.sendall(response)
 
-def handle_echo(socket: RESPSocket, args: list[str]) -> None:
-    message = ' '.join([s for s in args])
-    response = encode_simple_string(message)
+def handle_echo(socket: RESPSocket, args: list[bytes]) -> None:
+    message = b' '.join([s for s in args])
+    response = encode_bulk(message)
     socket.sendall(response)
 
-def handle_set(socket: RESPSocket, args: list[str], database: Database) -> None:
+def handle_set(socket: RESPSocket, args: list[bytes], database: Database) -> None:
     key = args[0]
     value = args[1]
+    condition, get, keep_ttl, expiry = None, False, False, None
+    i = 2
 
-    expiry = (round(time() * 1000) + int(args[3])) if len(args) > 3 and args[2].upper() == 'PX' else None
+    while i < len(args):
+        option = args[i].upper()
 
-    database.set(key, (value, expiry))
-    response = encode_simple_string("OK")
-    socket.sendall(response)
+        if option in (b"NX", b"XX") and condition is None:
+            condition = option
+        elif option == b"GET" and not get:
+            get = True
+        elif option == b"KEEPTTL" and not keep_ttl and expiry is None:
+            keep_ttl = True
+        elif option in (b"EX", b"PX", b"EXAT", b"PXAT") and not keep_ttl and expiry is None and i + 1 < len(args):
+            amount = encode_int(args[i + 1])
 
-def handle_get(socket: RESPSocket, args: list[str], database: Database) -> None:
-    key = args[0]
+            if not isinstance(amount, int):
+                socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+                return
+
+            if amount <= 0:
+                socket.sendall(encode_error_string("ERR invalid expire time in 'set' command"))
+                return
+
+            expiry = _expiry_ms(option, amount)
+            i += 1
+        else:
+            socket.sendall(encode_error_string("ERR syntax error"))
+            return
+
+        i += 1
+
+    current = database.lookup(key)
+
+    if get and isinstance(current, Collection):
+        socket.sendall(encode_error_string(WRONGTYPE_ERROR))
+        return
+
+    if (condition == b"NX" and current is not None) or (condition == b"XX" and current is None):
+        socket.sendall(encode_bulk(current) if get else NULL_BULK_STRING)
+        return
+
+    if keep_ttl and current is not None:
+        expiry = database.expiry(key)
+
+    database.set(key, value, expiry)
+    socket.sendall(encode_bulk(current) if get else encode_simple_string("OK"))
+
+def _expiry_ms(option: bytes, amount: int) -> int:
+    if option == b"EX":
+        return current_ms() + amount * 1000
+    elif option == b"PX":
+        return current_ms() + amount
+    elif option == b"EXAT":
+        return amount * 1000
+
+    return amount
 
-    response = encode_bulk_string(None)
+def handle_mset(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    if len(args) % 2:
+        socket.sendall(encode_error_string("ERR wrong number of arguments for 'mset' command"))
+        return
+
+    for i in range(0, len(args), 2):
+        database.set(args[i], args[i + 1])
+
+    socket.sendall(encode_simple_string("OK"))
+
+def handle_msetnx(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    if len(args) % 2:
+        socket.sendall(encode_error_string("ERR wrong number of arguments for 'msetnx' command"))
+        return
+
+    if any(database.contains(key) for key in args[::2]):
+        socket.sendall(encode_integer(0))
+        return
+
+    for i in range(0, len(args), 2):
+        database.set(args[i], args[i + 1])
 
-    if database.contains(key):
-        value, expires = database.get(key)
+    socket.sendall(encode_integer(1))
 
-        current = round(time() * 1000)
+def handle_del(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    deleted = 0
 
-        if expires and expires < current:
+    for key in args:
+        if database.contains(key):
             database.delete(key)
-        else:
-            response = encode_simple_string(value)
-    
-    socket.sendall(response)
+            deleted += 1
+
+    socket.sendall(encode_integer(deleted))
+
+def handle_get(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key = args[0]
+    value = database.lookup(key)
+
+    if isinstance(value, Collection):
+        socket.sendall(encode_error_string(WRONGTYPE_ERROR))
+        return
+
+    socket.sendall(encode_bulk(value))
+
+def handle_mget(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    values = []
+
+    for key in args:
+        value = database.lookup(key)
+        values.append(None if isinstance(value, Collection) else value)
+
+    socket.sendall(encode_array(values))
+
+def handle_incr(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    _increment(socket, database, args[0], 1)
+
+def handle_decr(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    _increment(socket, database, args[0], -1)
+
+def handle_incrby(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    increment = encode_int(args[1])
+
+    if not isinstance(increment, int):
+        socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+        return
+
+    _increment(socket, database, args[0], increment)
+
+def handle_decrby(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    decrement = encode_int(args[1])
+
+    if not isinstance(decrement, int):
+        socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+        return
+
+    if decrement == INT64_MIN:
+        socket.sendall(encode_error_string("ERR decrement would overflow"))
+        return
+
+    _increment(socket, database, args[0], -decrement)
+
+def _increment(socket: RESPSocket, database: Database, key: bytes, increment: int) -> None:
+    value = database.lookup(key)
+
+    if value is None:
+        value = 0
+    elif isinstance(value, Collection):
+        socket.sendall(encode_error_string(WRONGTYPE_ERROR))
+        return
+    elif not isinstance(value, int):
+        socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+        return
+
+    value += increment
+
+    if not INT64_MIN <= value <= INT64_MAX:
+        socket.sendall(encode_error_string("ERR increment or decrement would overflow"))
+        return
+
+    database.update(key, value)
+    socket.sendall(encode_integer(value))
+
+def handle_incrbyfloat(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key = args[0]
+    value = database.lookup(key)
+
+    if isinstance(value, Collection):
+        socket.sendall(encode_error_string(WRONGTYPE_ERROR))
+        return
+
+    try:
+        increment = _parse_float(args[1])
+        value = _parse_float(decode_int(value)) if value is not None else 0.0
+    except ValueError:
+        socket.sendall(encode_error_string("ERR value is not a valid float"))
+        return
+
+    value += increment
+
+    if not isfinite(value):
+        socket.sendall(encode_error_string("ERR increment would produce NaN or Infinity"))
+        return
+
+    formatted = _format_float(value)
+    database.update(key, formatted)
+    socket.sendall(encode_bulk(formatted))
+
+def _parse_float(value: bytes) -> float:
+    if not value or value != value.strip() or b"_" in value:
+        raise ValueError(value)
+
+    number = float(value)
+
+    if not isfinite(number):
+        raise ValueError(value)
+
+    return number
+
+def _format_float(value: float) -> bytes:
+    formatted = format(Decimal(repr(value)), "f")
+
+    if "." in formatted:
+        formatted = formatted.rstrip("0").rstrip(".")
+
+    return formatted.encode(ENCODING)
+
+def handle_append(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key = args[0]
+    value = database.lookup(key)
+
+    if isinstance(value, Collection):
+        socket.sendall(encode_error_string(WRONGTYPE_ERROR))
+        return
+
+    value = decode_int(value) + args[1] if value is not None else args[1]
+
+    database.update(key, value)
+    socket.sendall(encode_integer(len(value)))
+
+def handle_strlen(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if isinstance(value, Collection):
+        socket.sendall(encode_error_string(WRONGTYPE_ERROR))
+        return
+
+    socket.sendall(encode_integer(len(decode_int(value)) if value is not None else 0))
+
+def handle_getrange(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    start, end = encode_int(args[1]), encode_int(args[2])
+
+    if not isinstance(start, int) or not isinstance(end, int):
+        socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+        return
+
+    value = database.lookup(args[0])
+
+    if isinstance(value, Collection):
+        socket.sendall(encode_error_string(WRONGTYPE_ERROR))
+        return
+
+    value = decode_int(value) if value is not None else b""
+    length = len(value)
+
+    if start < 0:
+        start = max(0, length + start)
+
+    if end < 0:
+        end = max(0, length + end)
+
+    end = min(end, length - 1)
+
+    socket.sendall(encode_bulk(value[start:end + 1] if start <= end else b""))
+
+def handle_setrange(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key, offset, patch = args[0], encode_int(args[1]), args[2]
+
+    if not isinstance(offset, int) or offset < 0:
+        socket.sendall(encode_error_string("ERR offset is out of range"))
+        return
+
+    if offset + len(patch) > STRING_MAX_BYTES:
+        socket.sendall(encode_error_string("ERR string exceeds maximum allowed size (proto-max-bulk-len)"))
+        return
+
+    value = database.lookup(key)
+
+    if isinstance(value, Collection):
+        socket.sendall(encode_error_string(WRONGTYPE_ERROR))
+        return
+
+    value = decode_int(value) if value is not None else b""
+
+    if not patch:
+        socket.sendall(encode_integer(len(value)))
+        return
+
+    if len(value) < offset:
+        value += bytes(offset - len(value))
+
+    value = value[:offset] + patch + value[offset + len(patch):]
+
+    database.update(key, value)
+    socket.sendall(encode_integer(len(value)))
 
-def handle_info(socket: RESPSocket, args: list[str], config: dict) -> None:
-    info = [f"{ROLE}:{config[ROLE]}"]
+def handle_info(socket: RESPSocket, args: list[bytes], config: dict, database: Database, metrics: Metrics) -> None:
+    sections = [arg.decode(ENCODING).lower() for arg in args] or ["clients", "replication", "memory", "stats"]
+    info = []
+
+    if "all" in sections or "everything" in sections:
+        sections = ["clients", "replication", "memory", "stats", "commandstats", "latencystats"]
+
+    if "clients" in sections:
+        info += ["# Clients", f"connected_clients:{metrics.connected_clients}"]
+
+    if "replication" in sections:
+        info += ["# Replication", f"{ROLE}:{config[ROLE]}"]
     
-    if config[ROLE] is LEADER_ROLE:
-        info.append(f"{REPLID}:{config[REPLID]}")
-        info.append(f"{REPLOFFSET}:{config[REPLOFFSET]}")
+        if config[ROLE] is LEADER_ROLE:
+            info.append(f"{REPLID}:{config[REPLID]}")
+            info.append(f"{REPLOFFSET}:{config[REPLOFFSET]}")
 
-    socket.sendall(encode_bulk_string(info))
+    if "memory" in sections:
+        used_memory, rss = database.used_memory(), _rss_bytes()
 
-def handle_replconf(socket: RESPSocket, args: list[str], config: dict, replicas: dict[tuple[str, int], tuple[RESPSocket, int]]) -> None:
-    if len(args) > 1 and args[0].upper() == "GETACK":
+        info += [
+            "# Memory",
+            f"used_memory:{used_memory}",
+            f"used_memory_human:{_human_bytes(used_memory)}",
+            f"used_memory_rss:{rss}",
+            f"used_memory_rss_human:{_human_bytes(rss)}",
+            f"mem_fragmentation_ratio:{rss / used_memory if used_memory else 0:.2f}",
+            f"maxmemory:{config[MAXMEMORY]}",
+            f"maxmemory_human:{_human_bytes(config[MAXMEMORY])}",
+            f"maxmemory_policy:{config[MAXMEMORY_POLICY]}",
+            f"keys:{len(database)}",
+        ]
+
+    if "stats" in sections:
+        info += [
+            "# Stats",
+            f"total_connections_received:{metrics.total_connections_received}",
+            f"total_commands_processed:{metrics.total_commands_processed()}",
+            f"total_net_input_bytes:{metrics.total_net_input_bytes}",
+            f"total_net_output_bytes:{metrics.total_net_output_bytes}",
+            f"evicted_keys:{database.evicted_keys}",
+        ]
+
+    if "commandstats" in sections:
+        info.append("# Commandstats")
+
+        for command, stats in metrics.command_stats():
+            usec_per_call = stats.usec / stats.calls if stats.calls else 0
+            info.append(f"cmdstat_{command.lower()}:calls={stats.calls},usec={stats.usec},usec_per_call={usec_per_call:.2f},rejected_calls={stats.rejected_calls}")
+
+    if "latencystats" in sections:
+        info.append("# Latencystats")
+
+        for command, stats in metrics.command_stats():
+            if stats.calls:
+                percentiles = ",".join(f"p{p:g}={stats.percentile(p):.3f}" for p in LATENCY_PERCENTILES)
+                info.append(f"latency_percentiles_usec_{command.lower()}:{percentiles}")
+
+    socket.sendall(encode_bulk_string(info) if info else encode_bulk(b""))
+
+def handle_memory(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    if len(args) > 1 and args[0].upper() == b"USAGE":
+        usage = database.memory_usage(args[1])
+        socket.sendall(encode_integer(usage) if usage is not None else NULL_BULK_STRING)
+    else:
+        socket.sendall(encode_error_string("ERR unknown subcommand or wrong number of arguments for 'MEMORY'"))
+
+def handle_replconf(socket: RESPSocket, args: list[bytes], config: dict, replicas: dict[tuple[str, int], ReplicaConnection], notifier: KeyspaceNotifier) -> None:
+    if len(args) > 1 and args[0].upper() == b"GETACK":
         socket.sendall(encode_array(["REPLCONF", "ACK", config[REPLOFFSET]]))
-    elif len(args) > 1 and args[0].upper() == "ACK":
+    elif len(args) > 1 and args[0].upper() == b"ACK":
         if socket.get_addr() in replicas:
-            replicas[socket.get_addr()] = (socket, int(args[1]))
+            replicas[socket.get_addr()].ack_offset = int(args[1])
+            notifier.notify(REPLICA_ACK_EVENT)
     elif config[ROLE] is LEADER_ROLE:
         socket.sendall(encode_simple_string("OK"))
 
-def handle_psync(socket: RESPSocket, args: list[str], config: dict[str, str|int], replicas: dict[tuple[str, int], tuple[RESPSocket, int]]) -> None:
+def handle_psync(socket: RESPSocket, args: list[bytes], config: dict[str, str|int], replicas: dict[tuple[str, int], ReplicaConnection], backlog: ReplicationBacklog, snapshots: SnapshotManager, database: Database) -> None:
+    if config[WORKERS] > 1:
+        socket.sendall(encode_error_string("ERR replication is not supported with multiple workers"))
+        return
+
     if config[ROLE] is LEADER_ROLE:
-        socket.sendall(encode_simple_string(f"FULLRESYNC {config[REPLID]} {config[REPLOFFSET]}"))
-        socket.sendall(encode_rdb_file(EMPTY_RDB_FILE_B64))
-        print(f"adding replica: {socket.get_addr()}")
-        replicas.setdefault(socket.get_addr(), (socket, 0))
+        replid, offset = args[0].decode(ENCODING), int(args[1])
+
+        with database.locked(None), backlog.lock:
+            missing = backlog.read_from(offset - 1) if backlog.active and replid == config[REPLID] else None
+
+            if missing is not None:
+                logger.notice("partial resync with replica %s from offset %d", socket.get_addr(), offset)
+                socket.sendall(encode_simple_string(f"CONTINUE {config[REPLID]}"))
+                socket.sendall(missing)
+                replica = ReplicaConnection(socket, config, online=True)
+            else:
+                socket.sendall(encode_simple_string(f"FULLRESYNC {config[REPLID]} {config[REPLOFFSET]}"))
+                replica = ReplicaConnection(socket, config, online=False)
+                start_full_resync(replica, snapshots)
+
+            logger.notice("adding replica: %s", socket.get_addr())
+            backlog.active = True
+            replicas[socket.get_addr()] = replica
+            replica.start()
     
-def handle_wait(socket: RESPSocket, args: list[str], config: dict[str, str|int], replicas: dict[tuple[str, int], tuple[RESPSocket, int]]) -> None:
-    wait_ms = int(args[1]) if len(args) > 1 else 0
-    timeout = (time() * 1000) + wait_ms
-    within_timeout = lambda : (time() * 1000) < timeout if wait_ms > 0 else True
+def handle_wait(socket: RESPSocket, args: list[bytes], config: dict[str, str|int], replicas: dict[tuple[str, int], ReplicaConnection], notifier: KeyspaceNotifier, feed_replicas: Callable[[bytes], None]) -> None:
+    min_acknowledged = encode_int(args[0])
+    wait_ms = encode_int(args[1]) if len(args) > 1 else 0
+
+    if not isinstance(min_acknowledged, int) or not isinstance(wait_ms, int):
+        socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+        return
+
+    if wait_ms < 0:
+        socket.sendall(encode_error_string("ERR timeout is negative"))
+        return
 
-    acknowledged = 0
-    min_acknowledged = int(args[0])
+    timeout = wait_ms / 1000 if wait_ms > 0 else None
+    target_offset = config[REPLOFFSET]
 
-    for replica_socket, _ in replicas.values():
-        replica_socket.sendall(encode_array(["REPLCONF", "GETACK", "*"]))
+    if replicas:
+        feed_replicas(encode_array(["REPLCONF", "GETACK", "*"]))
 
-    while within_timeout():
-        acknowledged = sum([1 if offset >= config[REPLOFFSET] else 0 for _, offset in replicas.values()])
-        print(f"{acknowledged} of {len(replicas)} acknowledged. Min: {min_acknowledged}")
+    count_acknowledged = lambda: sum([1 if replica.ack_offset >= target_offset else 0 for replica in list(replicas.values())])
 
-        if acknowledged >= min(min_acknowledged, len(replicas)):
-            break
-        
-        sleep(0.1)
+    def reply(_: bool) -> None:
+        acknowledged = count_acknowledged()
+        logger.debug("%d of %d acknowledged. Min: %d", acknowledged, len(replicas), min_acknowledged)
 
-    socket.sendall(encode_integer(acknowledged))
+        socket.sendall(encode_integer(acknowledged))
 
-def handle_config(socket: RESPSocket, args: list[str], config: dict[str, str|int])-> None:
-    if len(args) > 1 and args[0].upper() == "GET":
-        key = args[1].lower()
-        value = config[key] if key in [RDB_DIR, RDB_FILENAME] else ""
+    notifier.wait_for([REPLICA_ACK_EVENT], lambda: count_acknowledged() >= min(min_acknowledged, len(replicas)), timeout, reply)
+
+def handle_config(socket: RESPSocket, args: list[bytes], config: dict[str, str|int])-> None:
+    if len(args) > 1 and args[0].upper() == b"GET":
+        key = args[1].decode(ENCODING).lower()
+        value = config[key] if key in [RDB_DIR, RDB_FILENAME] + CONFIG_SET_PARAMETERS else ""
         socket.sendall(encode_array([key, value]))
+    elif len(args) > 2 and args[0].upper() == b"SET":
+        key, value = args[1].decode(ENCODING).lower(), args[2].decode(ENCODING)
 
-def handle_keys(socket: RESPSocket, args: list[str], database: Database) -> None:
-    keys = encode_array(database.keys())
-    socket.sendall(keys)
+        if key not in CONFIG_SET_PARAMETERS:
+            socket.sendall(encode_error_string(f"ERR Unknown option or number of arguments for CONFIG SET - '{key}'"))
+            return
 
-def handle_type(socket: RESPSocket, args: list[str], database: Database) -> None:
-    key = args[0]
+        try:
+            config[key] = _parse_config_value(key, value)
+        except ValueError:
+            socket.sendall(encode_error_string(f"ERR Invalid argument '{value}' for CONFIG SET '{key}'"))
+            return
 
-    if database.contains(key):
-        value = database.get(key)
-        value_type = "string" if isinstance(value[0], str) else "stream"
-        socket.sendall(encode_simple_string(value_type))
+        if key == LOGLEVEL:
+            logger.set_level(config[key])
+        elif key in ENCODING_LIMIT_DEFAULTS:
+            datatypes.configure(config)
+
+        socket.sendall(encode_simple_string("OK"))
     else:
-        socket.sendall(encode_simple_string("none"))
+        subcommand = args[0].decode(ENCODING).upper()
+        socket.sendall(encode_error_string(f"ERR unknown subcommand or wrong number of arguments for 'CONFIG|{subcommand}'"))
+
+def parse_memory(value: str) -> int:
+    value = value.lower()
+
+    for suffix, multiplier in (("gb", 1 << 30), ("mb", 1 << 20), ("kb", 1 << 10), ("g", 10 ** 9), ("m", 10 ** 6), ("k", 10 ** 3), ("b", 1)):
+        if value.endswith(suffix):
+            return int(value[:-len(suffix)]) * multiplier
+
+    return int(value)
+
+def _parse_config_value(key: str, value: str) -> str | int:
+    if key == MAXMEMORY:
+        return parse_memory(value)
+    elif key == MAXMEMORY_SAMPLES and int(value) > 0:
+        return int(value)
+    elif key == MAXMEMORY_POLICY and value.lower() in MAXMEMORY_POLICIES:
+        return value.lower()
+    elif key == LOGLEVEL and value.lower() in LOG_LEVELS:
+        return value.lower()
+    elif key == SLOWLOG_LOG_SLOWER_THAN:
+        return int(value)
+    elif key == SLOWLOG_MAX_LEN and int(value) >= 0:
+        return int(value)
+    elif key in ENCODING_LIMIT_DEFAULTS and int(value) >= 0:
+        return int(value)
+
+    raise ValueError(value)
 
-def handle_xadd(socket: RESPSocket, args: list[str], database: Database) -> None:
-    key, entry_id, entry = args[0], args[1], args[1:]
+def handle_slowlog(socket: RESPSocket, args: list[bytes], metrics: Metrics) -> None:
+    subcommand = args[0].upper() if args else b""
 
-    if entry_id == "*":
-        ms_time, seq_no = int(time()) * 1000, 0
-        entry_id = f"{ms_time}-{seq_no}"
-        entry[0] = entry_id
+    if subcommand == b"GET":
+        try:
+            count = int(args[1]) if len(args) > 1 else SLOWLOG_DEFAULT_COUNT
+        except ValueError:
+            socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+            return
+
+        socket.sendall(encode_value(metrics.slowlog.get(count)))
+    elif subcommand == b"LEN":
+        socket.sendall(encode_integer(len(metrics.slowlog)))
+    elif subcommand == b"RESET":
+        metrics.slowlog.reset()
+        socket.sendall(encode_simple_string("OK"))
     else:
-        ms_time, _, seq_no = entry_id.partition("-")
-        ms_time, seq_no = int(ms_time), int(seq_no) if seq_no.isdigit() else seq_no
+        socket.sendall(encode_error_string("ERR unknown subcommand or wrong number of arguments for 'SLOWLOG'"))
 
-    if ms_time < 0 or (isinstance(seq_no, int) and seq_no < 0) or (ms_time == 0 and isinstance(seq_no, int) and seq_no == 0):
-        socket.sendall(encode_error_string("ERR The ID specified in XADD must be greater than 0-0"))
+def handle_latency(socket: RESPSocket, args: list[bytes], metrics: Metrics) -> None:
+    if not args or args[0].upper() != b"HISTOGRAM":
+        socket.sendall(encode_error_string("ERR unknown subcommand or wrong number of arguments for 'LATENCY'"))
         return
 
-    if database.contains(key):
-        stream, _ = database.get(key) 
-        last_entry = stream[-1]
+    commands = {arg.decode(ENCODING).upper() for arg in args[1:]}
+    reply = []
 
-        last_ms_time, _, last_seq_no = last_entry[0].partition("-")
-        last_ms_time, last_seq_no = int(last_ms_time), int(last_seq_no)
+    for command, stats in metrics.command_stats():
+        if stats.calls and (not commands or command in commands):
+            reply += [command.lower(), ["calls", stats.calls, "histogram_usec", stats.cumulative_histogram()]]
 
-        if seq_no == "*":
-            seq_no = last_seq_no + 1 if ms_time == last_ms_time else 0
-            entry_id = f"{ms_time}-{seq_no}"
-            entry[0] = entry_id
+    socket.sendall(encode_value(reply))
 
-        if ms_time < last_ms_time or (ms_time == last_ms_time and seq_no <= last_seq_no):
-            socket.sendall(encode_error_string("ERR The ID specified in XADD is equal or smaller than the target stream top item"))
-            return
+def handle_command(socket: RESPSocket, args: list[bytes], commands: dict[str, Command]) -> None:
+    subcommand = args[0].upper() if args else None
+
+    if subcommand is None:
+        socket.sendall(encode_value([command.info() for command in commands.values()]))
+    elif subcommand == b"COUNT":
+        socket.sendall(encode_integer(len(commands)))
+    elif subcommand == b"INFO":
+        names = [arg.decode(ENCODING).upper() for arg in args[1:]]
+        socket.sendall(encode_value([commands[name].info() if name in commands else None for name in names] if names else [command.info() for command in commands.values()]))
+    elif subcommand == b"GETKEYS" and len(args) > 1:
+        command = commands.get(args[1].decode(ENCODING).upper())
+
+        if command is None:
+            socket.sendall(encode_error_string("ERR Invalid command specified"))
+        elif not command.check_arity(args[2:]):
+            socket.sendall(encode_error_string("ERR Invalid number of arguments specified for command"))
+        elif not (keys := command.keys(args[2:])):
+            socket.sendall(encode_error_string("ERR The command has no key arguments"))
+        else:
+            socket.sendall(encode_array(keys))
+    else:
+        socket.sendall(encode_error_string(f"ERR unknown subcommand '{args[0].decode(ENCODING)}'. Try COMMAND HELP."))
+
+def handle_multi(socket: RESPSocket, args: list[bytes]) -> None:
+    if socket.transaction is None:
+        socket.transaction = Transaction()
+
+    if socket.transaction.in_multi():
+        socket.sendall(encode_error_string("ERR MULTI calls can not be nested"))
+        return
+
+    socket.transaction.begin()
+    socket.sendall(encode_simple_string("OK"))
+
+def handle_exec(socket: RESPSocket, args: list[bytes], database: Database, execute: Callable[[RESPSocket, Transaction], None]) -> None:
+    transaction = socket.transaction
+
+    if transaction is None or not transaction.in_multi():
+        socket.sendall(encode_error_string("ERR EXEC without MULTI"))
+        return
 
-        stream = stream + [entry]
+    if transaction.failed:
+        socket.sendall(encode_error_string("EXECABORT Transaction discarded because of previous errors."))
     else:
-        if seq_no == "*":
-            seq_no = 1 if ms_time == 0 else 0
-            entry_id = f"{ms_time}-{seq_no}"
-            entry[0] = entry_id
-        stream = [entry]
+        execute(socket, transaction)
 
-    database.set(key, (stream, None))
+    database.unwatch(transaction)
+    transaction.reset()
 
-    socket.sendall(encode_bulk_string([entry_id]))
+def handle_discard(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    transaction = socket.transaction
 
-def handle_xrange(socket: RESPSocket, args: list[str], database: Database) -> None:
-    key, start, end = args
+    if transaction is None or not transaction.in_multi():
+        socket.sendall(encode_error_string("ERR DISCARD without MULTI"))
+        return
+
+    database.unwatch(transaction)
+    transaction.reset()
+    socket.sendall(encode_simple_string("OK"))
+
+def handle_watch(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    if socket.transaction is None:
+        socket.transaction = Transaction()
+
+    if socket.transaction.in_multi():
+        socket.sendall(encode_error_string("ERR WATCH inside MULTI is not allowed"))
+        return
+
+    for key in args:
+        database.watch(key, socket.transaction)
+
+    socket.sendall(encode_simple_string("OK"))
+
+def handle_unwatch(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    if socket.transaction is not None:
+        database.unwatch(socket.transaction)
+        socket.transaction.dirty = False
+
+    socket.sendall(encode_simple_string("OK"))
+
+def unknown_command_error(command: str, args: list[bytes]) -> str:
+    arguments = "".join(f"'{arg.decode(ENCODING)}' " for arg in args)
+    return f"ERR unknown command '{command}', with args beginning with: {arguments}"
+
+def handle_save(socket: RESPSocket, args: list[bytes], snapshots: SnapshotManager) -> None:
+    if snapshots.in_progress():
+        socket.sendall(encode_error_string("ERR Background save already in progress"))
+        return
+
+    snapshots.save()
+    socket.sendall(encode_simple_string("OK"))
+
+def handle_bgsave(socket: RESPSocket, args: list[bytes], snapshots: SnapshotManager) -> None:
+    if snapshots.background_save():
+        socket.sendall(encode_simple_string("Background saving started"))
+    else:
+        socket.sendall(encode_error_string("ERR Background save already in progress"))
+
+def handle_lastsave(socket: RESPSocket, args: list[bytes], snapshots: SnapshotManager) -> None:
+    socket.sendall(encode_integer(snapshots.last_save))
 
-    if start == "-":
-        start_ms_time, start_seq_no = 0, 0
+def handle_bgrewriteaof(socket: RESPSocket, args: list[bytes], aof: AppendOnlyFile) -> None:
+    if aof.background_rewrite():
+        socket.sendall(encode_simple_string("Background append only file rewriting started"))
     else:
-        start_ms_time, _, start_seq_no = start.partition("-")
-        start_ms_time, start_seq_no = int(start_ms_time), int(start_seq_no) if start_seq_no.isdigit() else 0
+        socket.sendall(encode_error_string("ERR Background append only file rewriting already in progress"))
 
-    if end == "+":
-        end_ms_time, end_seq_no = sys.maxsize, sys.maxsize
+def handle_keys(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    pattern = args[0] if args else b"*"
+    body, count = bytearray(), 0
+
+    for key in database.iter_keys(pattern):
+        body += b"$%d\r\n%s\r\n" % (len(key), key)
+        count += 1
+
+    socket.sendall(b"*%d\r\n" % count)
+    socket.sendall(body)
+
+def handle_scan(socket: RESPSocket, args: list[bytes], database: Database, end_slot: int) -> None:
+    try:
+        cursor = int(args[0])
+    except (IndexError, ValueError):
+        socket.sendall(encode_error_string("ERR invalid cursor"))
+        return
+
+    pattern, count, value_type = b"*", SCAN_DEFAULT_COUNT, None
+
+    for option, value in zip(args[1::2], args[2::2]):
+        option = option.upper()
+
+        if option == b"MATCH":
+            pattern = value
+        elif option == b"COUNT" and value.isdigit() and int(value) > 0:
+            count = int(value)
+        elif option == b"TYPE":
+            value_type = value.decode(ENCODING).lower()
+        else:
+            socket.sendall(encode_error_string("ERR syntax error"))
+            return
+
+    if not 0 <= cursor < KEYSPACE_SLOTS:
+        cursor = KEYSPACE_SLOTS
+
+    next_cursor, keys = database.scan(cursor, count, pattern, value_type, end_slot)
+    socket.sendall(b"*2\r\n" + encode_bulk(next_cursor) + encode_array(keys))
+
+def handle_type(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key = args[0]
+    value = database.lookup(key)
+
+    if value is not None:
+        socket.sendall(encode_simple_string(type_name(value)))
     else:
-        end_ms_time, _, end_seq_no = end.partition("-")
-        end_ms_time, end_seq_no = int(end_ms_time), int(end_seq_no) if end_seq_no.isdigit() else sys.maxsize
+        socket.sendall(encode_simple_string("none"))
+
+def handle_xadd(socket: RESPSocket, args: list[bytes], database: Database, notifier: KeyspaceNotifier) -> None:
+    key, nomkstream, trim, i = args[0], False, None, 1
 
-    if database.contains(key):
-        stream, _ = database.get(key)
-        
-        stream_range = []
+    try:
+        while i < len(args) and args[i].upper() in (b"NOMKSTREAM", b"MAXLEN", b"MINID"):
+            if args[i].upper() == b"NOMKSTREAM":
+                nomkstream, i = True, i + 1
+            else:
+                trim, i = _parse_trim(args, i)
+    except ValueError as e:
+        socket.sendall(encode_error_string(str(e)))
+        return
+
+    fields = args[i + 1:]
+
+    if not fields or len(fields) % 2:
+        socket.sendall(encode_error_string("ERR wrong number of arguments for 'xadd' command"))
+        return
+
+    entry_id = args[i]
+    stream = database.lookup(key)
+
+    if _wrong_type(socket, stream, Stream):
+        return
 
-        for entry in stream:
-            entry_id = entry[0]
-            ms_time, seq_no = [int(e) for e in entry_id.split("-")]
+    if stream is None and nomkstream:
+        socket.sendall(NULL_BULK_STRING)
+        return
+
+    last_id = stream.last_id() if stream is not None else None
+    last_ms_time, last_seq_no = last_id if last_id else (0, 0)
+
+    if last_id == (STREAM_ID_MAX, STREAM_ID_MAX):
+        socket.sendall(encode_error_string("ERR The stream has exhausted the last possible ID, unable to add more items"))
+        return
 
-            if ms_time >= start_ms_time and seq_no >= start_seq_no and ms_time <= end_ms_time and seq_no <= end_seq_no:
-                stream_range.append(entry)
-        
-        socket.sendall(encode_stream(stream_range))
+    if entry_id == b"*":
+        ms_time = max(current_ms(), last_ms_time)
+        seq_no = last_seq_no + 1 if last_id and ms_time == last_ms_time else 0
+
+        if seq_no > STREAM_ID_MAX:
+            ms_time, seq_no = ms_time + 1, 0
     else:
-        socket.sendall(encode_bulk_string(None))
+        try:
+            ms_time, seq_no = _parse_stream_id(entry_id.removesuffix(b"-*"))
+        except ValueError as e:
+            socket.sendall(encode_error_string(str(e)))
+            return
+
+        if entry_id.endswith(b"-*"):
+            seq_no = last_seq_no + 1 if last_id and ms_time == last_ms_time else (1 if ms_time == 0 else 0)
+
+            if seq_no > STREAM_ID_MAX:
+                socket.sendall(encode_error_string("ERR The ID specified in XADD is equal or smaller than the target stream top item"))
+                return
+
+    if (ms_time, seq_no) <= (0, 0):
+        socket.sendall(encode_error_string("ERR The ID specified in XADD must be greater than 0-0"))
+        return
+
+    if last_id and (ms_time, seq_no) <= last_id:
+        socket.sendall(encode_error_string("ERR The ID specified in XADD is equal or smaller than the target stream top item"))
+        return
+
+    if stream is None:
+        stream = Stream()
+        database.set(key, stream)
+
+    stream.append((ms_time, seq_no), fields)
+
+    if trim is not None:
+        stream.trim(*trim)
+
+    database.touch(key)
+    notifier.notify(key)
+
+    args[i] = b"%d-%d" % (ms_time, seq_no)
+    socket.sendall(encode_bulk(args[i]))
+
+def handle_xrange(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key, count = args[0], None
+
+    if len(args) > 3:
+        if len(args) != 5 or args[3].upper() != b"COUNT":
+            socket.sendall(encode_error_string("ERR syntax error"))
+            return
+
+        count = encode_int(args[4])
+
+        if count.__class__ is not int:
+            socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+            return
 
-def handle_xread(socket: RESPSocket, args: list[str], database: Database) -> None:
-    if args[0].upper() == "BLOCK":
-        _, wait_ms, xread_args = args[0], args[1], args[3:]
+    try:
+        start, end = _parse_range_id(args[1]), _parse_range_id(args[2], STREAM_ID_MAX)
+    except ValueError as e:
+        socket.sendall(encode_error_string(str(e)))
+        return
+
+    stream = database.lookup(key)
+
+    if _wrong_type(socket, stream, Stream):
+        return
+
+    if stream is not None:
+        socket.sendall(encode_stream(stream.range(start, end, max(count, 0) if count is not None else None)))
     else:
-        _, wait_ms, xread_args = args[0], None, args[1:]
+        socket.sendall(NULL_BULK_STRING)
+
+def handle_xread(socket: RESPSocket, args: list[bytes], database: Database, notifier: KeyspaceNotifier) -> None:
+    count, wait_ms, i = None, None, 0
+
+    while i < len(args) and args[i].upper() != b"STREAMS":
+        option = args[i].upper()
+
+        if option not in (b"COUNT", b"BLOCK") or i + 1 >= len(args):
+            socket.sendall(encode_error_string("ERR syntax error"))
+            return
+
+        value = encode_int(args[i + 1])
+
+        if value.__class__ is not int:
+            socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+            return
+
+        if option == b"BLOCK" and value < 0:
+            socket.sendall(encode_error_string("ERR timeout is negative"))
+            return
+
+        if option == b"COUNT":
+            count = value if value > 0 else None
+        else:
+            wait_ms = value
 
-    if len(xread_args) % 2 != 0:
+        i += 2
+
+    xread_args = args[i + 1:]
+
+    if not xread_args or len(xread_args) % 2 != 0:
         socket.sendall(encode_error_string("ERR invalid number of arguments for XREAD"))
         return 
 
     n = len(xread_args) // 2
     keys = xread_args[:n]
-    starts = xread_args[n:]
 
-    last_response_length, response = -1, b""
+    for key in keys:
+        if _wrong_type(socket, database.lookup(key), Stream):
+            return
 
-    timeout = (time() * 1000)
-    
-    if wait_ms and wait_ms.isdigit():
-        wait_ms = int(wait_ms)
-        timeout += wait_ms
-
-    def should_wait() -> bool:
-        if wait_ms == 0: 
-            if last_response_length > -1 and len(response) > last_response_length:
-                return False
-            else:
-                return True
-        return (time() * 1000) < timeout
+    try:
+        starts = [_resolve_xread_start(database, key, start) for key, start in zip(keys, xread_args[n:])]
+    except ValueError as e:
+        socket.sendall(encode_error_string(str(e)))
+        return
 
-    while True:
-        for i in range(n):
-            key, start = keys[i], starts[i]
+    read_streams = lambda: _read_streams(database, keys, starts, count)
+    reply = lambda response: socket.sendall(response or NULL_BULK_STRING)
 
-            if start == "$":
-                start_ms_time, start_seq_no = 0, 0
-            else:   
-                start_ms_time, _, start_seq_no = start.partition("-")
-                start_ms_time, start_seq_no = int(start_ms_time), int(start_seq_no) if start_seq_no.isdigit() else 0
+    if wait_ms is None:
+        reply(read_streams())
+    else:
+        notifier.wait_for(keys, read_streams, wait_ms / 1000 if wait_ms > 0 else None, reply)
 
-            if database.contains(key):
-                stream, _ = database.get(key)
+def handle_xtrim(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key = args[0]
 
-                if start == "$":
-                    entry = stream[-1]
-                    starts[i] = entry[0]
-                    continue
+    try:
+        trim, i = _parse_trim(args, 1)
+    except ValueError as e:
+        socket.sendall(encode_error_string(str(e)))
+        return
 
-                stream_range = []
+    if i != len(args):
+        socket.sendall(encode_error_string("ERR syntax error"))
+        return
 
-                for entry in stream:
-                    entry_id = entry[0]
-                    ms_time, seq_no = [int(e) for e in entry_id.split("-")]
+    stream = database.lookup(key)
 
-                    if ms_time > start_ms_time or (ms_time == start_ms_time and seq_no > start_seq_no):
-                        stream_range.append(entry)
-                
-                if stream_range:
-                    response += f"*2\r\n${len(key)}\r\n{key}\r\n".encode(ENCODING) + encode_stream(stream_range)
-    
-        if should_wait():
-            last_response_length, response = len(response), b""
-            sleep(0.1)
-        else:
-            break
-            
-    response = f"*{n}\r\n".encode(ENCODING) + response if response else encode_bulk_string(None)
+    if _wrong_type(socket, stream, Stream):
+        return
 
-    socket.sendall(response)
+    trimmed = stream.trim(*trim) if stream is not None else 0
+
+    if trimmed:
+        database.touch(key)
+
+    socket.sendall(encode_integer(trimmed))
+
+def handle_xsetid(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key, entries_added, max_deleted_id, i = args[0], None, None, 2
+
+    try:
+        last_id = _parse_stream_id(args[1])
+
+        while i < len(args):
+            option = args[i].upper()
+
+            if option == b"ENTRIESADDED" and i + 1 < len(args):
+                entries_added = encode_int(args[i + 1])
+
+                if entries_added.__class__ is not int or entries_added < 0:
+                    raise ValueError("ERR entries_added must be positive")
+            elif option == b"MAXDELETEDID" and i + 1 < len(args):
+                max_deleted_id = _parse_stream_id(args[i + 1])
+            else:
+                raise ValueError("ERR syntax error")
+
+            i += 2
+    except ValueError as e:
+        socket.sendall(encode_error_string(str(e)))
+        return
+
+    stream = database.lookup(key)
+
+    if _wrong_type(socket, stream, Stream):
+        return
+
+    if stream is None:
+        socket.sendall(encode_error_string("ERR no such key"))
+    elif max_deleted_id is not None and last_id < max_deleted_id:
+        socket.sendall(encode_error_string("ERR The ID specified in XSETID is smaller than the provided max_deleted_entry_id"))
+    elif max_deleted_id is None and last_id < stream.max_deleted_id():
+        socket.sendall(encode_error_string("ERR The ID specified in XSETID is smaller than current max_deleted_entry_id"))
+    elif entries_added is not None and entries_added < len(stream):
+        socket.sendall(encode_error_string("ERR The entries_added specified in XSETID is smaller than the target stream length"))
+    elif stream.after(last_id, 1):
+        socket.sendall(encode_error_string("ERR The ID specified in XSETID is smaller than the target stream top item"))
+    else:
+        stream.set_id(last_id, entries_added, max_deleted_id)
+        database.touch(key)
+        socket.sendall(encode_simple_string("OK"))
+
+def handle_xgroup(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    subcommand = args[0].upper()
+    arity = {b"CREATE": -4, b"SETID": -4, b"DESTROY": 3, b"CREATECONSUMER": 4, b"DELCONSUMER": 4}.get(subcommand)
+
+    if arity is None or (len(args) != arity if arity > 0 else len(args) < -arity):
+        socket.sendall(encode_error_string("ERR unknown subcommand or wrong number of arguments for 'XGROUP'"))
+        return
+
+    key, group_name = args[1], args[2]
+    stream = database.lookup(key)
+
+    if _wrong_type(socket, stream, Stream):
+        return
+
+    if subcommand in (b"CREATE", b"SETID"):
+        mkstream, entries_read, i = False, None, 4
+
+        while i < len(args):
+            option = args[i].upper()
+
+            if option == b"MKSTREAM" and subcommand == b"CREATE":
+                mkstream, i = True, i + 1
+            elif option == b"ENTRIESREAD" and i + 1 < len(args):
+                entries_read = encode_int(args[i + 1])
+
+                if entries_read.__class__ is not int or entries_read < -1:
+                    socket.sendall(encode_error_string("ERR value for ENTRIESREAD must be positive or -1"))
+                    return
+
+                entries_read, i = entries_read if entries_read >= 0 else None, i + 2
+            else:
+                socket.sendall(encode_error_string("ERR syntax error"))
+                return
+
+        if args[3] == b"$":
+            last_id = (stream.last_id() if stream is not None else None) or (0, 0)
+        else:
+            try:
+                last_id = _parse_stream_id(args[3])
+            except ValueError as e:
+                socket.sendall(encode_error_string(str(e)))
+                return
+
+        if stream is None and mkstream:
+            stream = Stream()
+            database.set(key, stream)
+
+    if stream is None:
+        socket.sendall(encode_error_string("ERR The XGROUP subcommand requires the key to exist. Note that for CREATE you may want to use the MKSTREAM option to create an empty stream automatically."))
+        return
+
+    group = stream.groups.get(group_name)
+
+    if subcommand == b"CREATE":
+        if stream.create_group(group_name, last_id, entries_read) is None:
+            socket.sendall(encode_error_string("BUSYGROUP Consumer Group name already exists"))
+            return
+
+        database.touch(key)
+        socket.sendall(encode_simple_string("OK"))
+    elif subcommand == b"DESTROY":
+        destroyed = stream.destroy_group(group_name)
+
+        if destroyed:
+            database.touch(key)
+
+        socket.sendall(encode_integer(int(destroyed)))
+    elif group is None:
+        socket.sendall(encode_error_string(f"NOGROUP No such consumer group '{group_name.decode(ENCODING)}' for key name '{key.decode(ENCODING)}'"))
+    elif subcommand == b"SETID":
+        group.last_id, group.entries_read = pack_stream_id(*last_id), entries_read
+        database.touch(key)
+        socket.sendall(encode_simple_string("OK"))
+    elif subcommand == b"CREATECONSUMER":
+        _, created = stream.consumer(group, args[3], current_ms())
+
+        if created:
+            database.touch(key)
+
+        socket.sendall(encode_integer(int(created)))
+    else:
+        existed = args[3] in group.consumers
+        pending = stream.delete_consumer(group, args[3])
+
+        if existed:
+            database.touch(key)
+
+        socket.sendall(encode_integer(pending))
+
+def handle_xreadgroup(socket: RESPSocket, args: list[bytes], database: Database, notifier: KeyspaceNotifier, propagate: Callable[[str, list[bytes]], None]) -> None:
+    group_name, consumer_name, count, wait_ms, noack, i = None, None, None, None, False, 0
+
+    while i < len(args) and args[i].upper() != b"STREAMS":
+        option = args[i].upper()
+
+        if option == b"GROUP" and i + 2 < len(args):
+            group_name, consumer_name = args[i + 1], args[i + 2]
+            i += 3
+        elif option in (b"COUNT", b"BLOCK") and i + 1 < len(args):
+            value = encode_int(args[i + 1])
+
+            if value.__class__ is not int:
+                socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+                return
+
+            if option == b"BLOCK" and value < 0:
+                socket.sendall(encode_error_string("ERR timeout is negative"))
+                return
+
+            if option == b"COUNT":
+                count = value if value > 0 else None
+            else:
+                wait_ms = value
+
+            i += 2
+        elif option == b"NOACK":
+            noack, i = True, i + 1
+        else:
+            socket.sendall(encode_error_string("ERR syntax error"))
+            return
+
+    streams = args[i + 1:]
+
+    if group_name is None:
+        socket.sendall(encode_error_string("ERR Missing GROUP option for XREADGROUP"))
+        return
+
+    if not streams or len(streams) % 2:
+        socket.sendall(encode_error_string("ERR Unbalanced 'xreadgroup' list of streams: for each stream key an ID or '>' must be specified."))
+        return
+
+    n = len(streams) // 2
+    keys = streams[:n]
+
+    try:
+        starts = [None if start == b">" else _parse_stream_id(start) for start in streams[n:]]
+    except ValueError as e:
+        socket.sendall(encode_error_string(str(e)))
+        return
+
+    def read() -> bytes:
+        with database.locked(keys):
+            parts, changed, now = [b""], False, current_ms()
+
+            for key, start in zip(keys, starts):
+                stream = database.lookup(key)
+
+                if stream is not None and not isinstance(stream, Stream):
+                    return encode_error_string(WRONGTYPE_ERROR)
+
+                group = stream.groups.get(group_name) if stream is not None else None
+
+                if group is None:
+                    return encode_error_string(f"NOGROUP No such key '{key.decode(ENCODING)}' or consumer group '{group_name.decode(ENCODING)}' in XREADGROUP with GROUP option")
+
+                consumer, created = stream.consumer(group, consumer_name, now)
+
+                if start is None:
+                    entries = stream.read_group(group, consumer, count, noack, now)
+                else:
+                    entries = stream.read_history(consumer, start, count, now)
+
+                if created or (start is None and entries):
+                    database.touch(key)
+                    changed = True
+
+                if entries or start is not None:
+                    parts += (b"*2\r\n", encode_bulk(key), encode_stream(entries))
+
+            if changed and wait_ms is not None:
+                propagate("XREADGROUP", xreadgroup_without_block(args))
+
+            if len(parts) == 1:
+                return b""
+
+            parts[0] = b"*%d\r\n" % (len(parts) // 3)
+
+            return b"".join(parts)
+
+    reply = lambda response: socket.sendall(response or NULL_BULK_STRING)
+
+    if wait_ms is not None and all(start is None for start in starts):
+        notifier.wait_for(keys, read, wait_ms / 1000 if wait_ms > 0 else None, reply)
+    else:
+        reply(read())
+
+def handle_xack(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key, group_name = args[0], args[1]
+
+    try:
+        entry_ids = [pack_stream_id(*_parse_stream_id(entry_id)) for entry_id in args[2:]]
+    except ValueError as e:
+        socket.sendall(encode_error_string(str(e)))
+        return
+
+    stream = database.lookup(key)
+
+    if _wrong_type(socket, stream, Stream):
+        return
+
+    group = stream.groups.get(group_name) if stream is not None else None
+    acked = sum([stream.ack(group, entry_id) for entry_id in entry_ids]) if group is not None else 0
+
+    if acked:
+        database.touch(key)
+
+    socket.sendall(encode_integer(acked))
+
+def handle_xpending(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key, group_name, min_idle, i = args[0], args[1], 0, 2
+
+    if len(args) > 3 and args[2].upper() == b"IDLE":
+        min_idle, i = encode_int(args[3]), 4
+
+    extended = args[i:]
+
+    if (extended or i > 2) and len(extended) not in (3, 4):
+        socket.sendall(encode_error_string("ERR syntax error"))
+        return
+
+    if extended:
+        count = encode_int(extended[2])
+
+        if min_idle.__class__ is not int or count.__class__ is not int:
+            socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+            return
+
+        try:
+            start = pack_stream_id(*_parse_range_id(extended[0]))
+            end = pack_stream_id(*_parse_range_id(extended[1], STREAM_ID_MAX))
+        except ValueError as e:
+            socket.sendall(encode_error_string(str(e)))
+            return
+
+    stream, group = _lookup_group(socket, database, key, group_name)
+
+    if group is None:
+        return
+
+    if extended:
+        consumer = group.consumers.get(extended[3]) if len(extended) == 4 else None
+        now = current_ms()
+
+        if (len(extended) == 4 and consumer is None) or count <= 0:
+            socket.sendall(encode_array([]))
+            return
+
+        pending = stream.pending_range(group, start, end, count, consumer, min_idle, now)
+        socket.sendall(encode_value([[format_stream_id(entry_id), entry.consumer.name, now - entry.delivery_time, entry.delivery_count] for entry_id, entry in pending]))
+    elif not group.pending:
+        socket.sendall(encode_value([0, None, None, None]))
+    else:
+        consumers = [[name, b"%d" % len(group.consumers[name].pending)] for name in sorted(group.consumers) if group.consumers[name].pending]
+        socket.sendall(encode_value([len(group.pending), format_stream_id(group.pending_ids[0]), format_stream_id(group.pending_ids[-1]), consumers]))
+
+def handle_xclaim(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key, group_name, consumer_name, min_idle = args[0], args[1], args[2], encode_int(args[3])
+
+    if min_idle.__class__ is not int:
+        socket.sendall(encode_error_string("ERR Invalid min-idle-time argument for XCLAIM"))
+        return
+
+    entry_ids, i = [], 4
+
+    while i < len(args):
+        try:
+            entry_ids.append(pack_stream_id(*_parse_stream_id(args[i])))
+        except ValueError:
+            break
+
+        i += 1
+
+    delivery_time, retry_count, force, justid, last_id, now = None, None, False, False, None, current_ms()
+
+    while i < len(args):
+        option = args[i].upper()
+
+        if option in (b"IDLE", b"TIME", b"RETRYCOUNT") and i + 1 < len(args):
+            value = encode_int(args[i + 1])
+
+            if value.__class__ is not int:
+                socket.sendall(encode_error_string(f"ERR Invalid {option.decode(ENCODING)} option argument for XCLAIM"))
+                return
+
+            if option == b"IDLE":
+                delivery_time = now - value
+            elif option == b"TIME":
+                delivery_time = value
+            else:
+                retry_count = value
+
+            i += 2
+        elif option in (b"FORCE", b"JUSTID"):
+            force, justid = force or option == b"FORCE", justid or option == b"JUSTID"
+            i += 1
+        elif option == b"LASTID" and i + 1 < len(args):
+            try:
+                last_id = pack_stream_id(*_parse_stream_id(args[i + 1]))
+            except ValueError as e:
+                socket.sendall(encode_error_string(str(e)))
+                return
+
+            i += 2
+        else:
+            socket.sendall(encode_error_string(f"ERR Unrecognized XCLAIM option '{args[i].decode(ENCODING)}'"))
+            return
+
+    stream, group = _lookup_group(socket, database, key, group_name)
+
+    if group is None:
+        return
+
+    consumer, changed = stream.consumer(group, consumer_name, now)
+    claimed = []
+
+    for entry_id in entry_ids:
+        if stream.get(entry_id) is None:
+            changed = stream.ack(group, entry_id) or changed
+        elif stream.claim(group, consumer, entry_id, min_idle, now, delivery_time, retry_count, justid, force):
+            claimed.append(entry_id)
+
+    if last_id is not None and last_id > group.last_id:
+        group.last_id = last_id
+        changed = True
+
+    if changed or claimed:
+        database.touch(key)
+
+    if justid:
+        socket.sendall(encode_array([format_stream_id(entry_id) for entry_id in claimed]))
+    else:
+        socket.sendall(encode_stream([(format_stream_id(entry_id), stream.get(entry_id)) for entry_id in claimed]))
+
+def handle_xautoclaim(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key, group_name, consumer_name, min_idle = args[0], args[1], args[2], encode_int(args[3])
+    count, justid, i = STREAM_AUTOCLAIM_DEFAULT_COUNT, False, 5
+
+    if min_idle.__class__ is not int:
+        socket.sendall(encode_error_string("ERR Invalid min-idle-time argument for XAUTOCLAIM"))
+        return
+
+    try:
+        start = pack_stream_id(*_parse_range_id(args[4]))
+    except ValueError as e:
+        socket.sendall(encode_error_string(str(e)))
+        return
+
+    while i < len(args):
+        option = args[i].upper()
+
+        if option == b"COUNT" and i + 1 < len(args):
+            count = encode_int(args[i + 1])
+
+            if count.__class__ is not int or count <= 0:
+                socket.sendall(encode_error_string("ERR COUNT must be > 0"))
+                return
+
+            i += 2
+        elif option == b"JUSTID":
+            justid, i = True, i + 1
+        else:
+            socket.sendall(encode_error_string("ERR syntax error"))
+            return
+
+    stream, group = _lookup_group(socket, database, key, group_name)
+
+    if group is None:
+        return
+
+    now = current_ms()
+    consumer, changed = stream.consumer(group, consumer_name, now)
+    claimed, deleted, examined = [], [], None
+
+    for entry_id in stream.pending_after(group, start, count * STREAM_AUTOCLAIM_ATTEMPTS_FACTOR):
+        if len(claimed) == count:
+            break
+
+        examined = entry_id
+
+        if stream.get(entry_id) is None:
+            stream.ack(group, entry_id)
+            deleted.append(format_stream_id(entry_id))
+        elif stream.claim(group, consumer, entry_id, min_idle, now, justid=justid):
+            claimed.append(entry_id)
+
+    if changed or claimed or deleted:
+        database.touch(key)
+
+    following = stream.pending_after(group, examined + 1, 1) if examined is not None else []
+    cursor = format_stream_id(following[0]) if following else b"0-0"
+
+    if justid:
+        entries = encode_array([format_stream_id(entry_id) for entry_id in claimed])
+    else:
+        entries = encode_stream([(format_stream_id(entry_id), stream.get(entry_id)) for entry_id in claimed])
+
+    socket.sendall(b"*3\r\n" + encode_bulk(cursor) + entries + encode_array(deleted))
+
+def handle_hset(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key, pairs = args[0], args[1:]
+
+    if len(pairs) % 2:
+        socket.sendall(encode_error_string("ERR wrong number of arguments for 'hset' command"))
+        return
+
+    value = database.lookup(key)
+
+    if _wrong_type(socket, value, Hash):
+        return
+
+    created = value is None
+    value = Hash() if created else value
+    added = 0
+
+    for i in range(0, len(pairs), 2):
+        added += value.set(pairs[i], pairs[i + 1])
+
+    _store(database, key, value, created)
+    socket.sendall(encode_integer(added))
+
+def handle_hget(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, Hash):
+        return
+
+    socket.sendall(encode_bulk(value.get(args[1]) if value is not None else None))
+
+def handle_hgetall(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, Hash):
+        return
+
+    socket.sendall(encode_array(value.items() if value is not None else []))
+
+def handle_hdel(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key = args[0]
+    value = database.lookup(key)
+
+    if _wrong_type(socket, value, Hash):
+        return
+
+    deleted = sum([value.delete(field) for field in args[1:]]) if value is not None else 0
+
+    if deleted:
+        _store(database, key, value, False)
+
+    socket.sendall(encode_integer(deleted))
+
+def handle_hlen(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, Hash):
+        return
+
+    socket.sendall(encode_integer(len(value) if value is not None else 0))
+
+def handle_hexists(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, Hash):
+        return
+
+    socket.sendall(encode_integer(int(value is not None and value.get(args[1]) is not None)))
+
+def handle_push(socket: RESPSocket, args: list[bytes], database: Database, notifier: KeyspaceNotifier, left: bool) -> None:
+    key = args[0]
+    value = database.lookup(key)
+
+    if _wrong_type(socket, value, List):
+        return
+
+    created = value is None
+    value = List() if created else value
+    length = value.push(args[1:], left)
+
+    _store(database, key, value, created)
+    notifier.notify(key)
+    socket.sendall(encode_integer(length))
+
+def handle_pop(socket: RESPSocket, args: list[bytes], database: Database, left: bool) -> None:
+    key, count = args[0], None
+
+    if len(args) > 2:
+        socket.sendall(encode_error_string("ERR syntax error"))
+        return
+
+    if len(args) > 1:
+        count = encode_int(args[1])
+
+        if not isinstance(count, int) or count < 0:
+            socket.sendall(encode_error_string("ERR value is out of range, must be positive"))
+            return
+
+    value = database.lookup(key)
+
+    if _wrong_type(socket, value, List):
+        return
+
+    if value is None:
+        socket.sendall(NULL_BULK_STRING if count is None else NULL_ARRAY)
+        return
+
+    if count is None:
+        response = encode_bulk(value.pop(left))
+    else:
+        response = encode_array([value.pop(left) for _ in range(min(count, len(value)))])
+
+    if count != 0:
+        _store(database, key, value, False)
+
+    socket.sendall(response)
+
+def handle_blocking_pop(socket: RESPSocket, args: list[bytes], database: Database, notifier: KeyspaceNotifier, propagate: Callable[[str, list[bytes]], None], wait: bool, left: bool) -> None:
+    keys = args[:-1]
+
+    try:
+        timeout = _parse_float(args[-1])
+    except ValueError:
+        socket.sendall(encode_error_string("ERR timeout is not a float or out of range"))
+        return
+
+    if timeout < 0:
+        socket.sendall(encode_error_string("ERR timeout is negative"))
+        return
+
+    def pop() -> bytes:
+        with database.locked(keys):
+            for key in keys:
+                value = database.lookup(key)
+
+                if value is None:
+                    continue
+
+                if not isinstance(value, List):
+                    return encode_error_string(WRONGTYPE_ERROR)
+
+                element = value.pop(left)
+                _store(database, key, value, False)
+                propagate("LPOP" if left else "RPOP", [key])
+
+                return encode_array([key, element])
+
+        return b""
+
+    reply = lambda response: socket.sendall(response or NULL_ARRAY)
+
+    if wait:
+        notifier.wait_for(keys, pop, timeout or None, reply)
+    else:
+        reply(pop())
+
+def handle_lrange(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    start, stop = encode_int(args[1]), encode_int(args[2])
+
+    if not isinstance(start, int) or not isinstance(stop, int):
+        socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+        return
+
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, List):
+        return
+
+    if value is None:
+        socket.sendall(encode_array([]))
+        return
+
+    start, stop = _normalize_range(start, stop, len(value))
+    socket.sendall(encode_array(value.range(start, stop)))
+
+def handle_llen(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, List):
+        return
+
+    socket.sendall(encode_integer(len(value) if value is not None else 0))
+
+def handle_sadd(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key = args[0]
+    value = database.lookup(key)
+
+    if _wrong_type(socket, value, Set):
+        return
+
+    created = value is None
+    value = Set() if created else value
+    added = sum([value.add(member) for member in args[1:]])
+
+    if added:
+        _store(database, key, value, created)
+
+    socket.sendall(encode_integer(added))
+
+def handle_srem(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key = args[0]
+    value = database.lookup(key)
+
+    if _wrong_type(socket, value, Set):
+        return
+
+    removed = sum([value.remove(member) for member in args[1:]]) if value is not None else 0
+
+    if removed:
+        _store(database, key, value, False)
+
+    socket.sendall(encode_integer(removed))
+
+def handle_sismember(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, Set):
+        return
+
+    socket.sendall(encode_integer(int(value is not None and value.contains(args[1]))))
+
+def handle_smembers(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, Set):
+        return
+
+    socket.sendall(encode_array(value.members() if value is not None else []))
+
+def handle_scard(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, Set):
+        return
+
+    socket.sendall(encode_integer(len(value) if value is not None else 0))
+
+def handle_zadd(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key, options, i = args[0], set(), 1
+
+    while i < len(args) and args[i].upper() in (b"NX", b"XX", b"GT", b"LT", b"CH", b"INCR"):
+        options.add(args[i].upper())
+        i += 1
+
+    pairs = args[i:]
+
+    if not pairs or len(pairs) % 2:
+        socket.sendall(encode_error_string("ERR syntax error"))
+        return
+
+    if b"NX" in options and b"XX" in options:
+        socket.sendall(encode_error_string("ERR XX and NX options at the same time are not compatible"))
+        return
+
+    if len(options & {b"NX", b"GT", b"LT"}) > 1:
+        socket.sendall(encode_error_string("ERR GT, LT, and/or NX options at the same time are not compatible"))
+        return
+
+    if b"INCR" in options and len(pairs) > 2:
+        socket.sendall(encode_error_string("ERR INCR option supports a single increment-element pair"))
+        return
+
+    try:
+        scores = [_parse_score(score) for score in pairs[0::2]]
+    except ValueError:
+        socket.sendall(encode_error_string("ERR value is not a valid float"))
+        return
+
+    value = database.lookup(key)
+
+    if _wrong_type(socket, value, SortedSet):
+        return
+
+    created = value is None
+    value = SortedSet() if created else value
+    added, changed, score = 0, 0, None
+
+    for score, member in zip(scores, pairs[1::2]):
+        current = value.score(member)
+
+        if (b"NX" in options and current is not None) or (b"XX" in options and current is None):
+            score = None
+            continue
+
+        if b"INCR" in options and current is not None:
+            score += current
+
+            if score != score:
+                socket.sendall(encode_error_string("ERR resulting score is not a number (NaN)"))
+                return
+
+        if current is not None and ((b"GT" in options and score <= current) or (b"LT" in options and score >= current)):
+            score = None
+            continue
+
+        if value.add(member, score):
+            added += 1
+        elif current != score:
+            changed += 1
+
+    if added or changed:
+        _store(database, key, value, created)
+
+    if b"INCR" in options:
+        socket.sendall(encode_bulk(_format_score(score) if score is not None else None))
+    else:
+        socket.sendall(encode_integer(added + changed if b"CH" in options else added))
+
+def handle_zrem(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    key = args[0]
+    value = database.lookup(key)
+
+    if _wrong_type(socket, value, SortedSet):
+        return
+
+    removed = sum([value.remove(member) for member in args[1:]]) if value is not None else 0
+
+    if removed:
+        _store(database, key, value, False)
+
+    socket.sendall(encode_integer(removed))
+
+def handle_zscore(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, SortedSet):
+        return
+
+    score = value.score(args[1]) if value is not None else None
+    socket.sendall(encode_bulk(_format_score(score) if score is not None else None))
+
+def handle_zrank(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, SortedSet):
+        return
+
+    rank = value.rank(args[1]) if value is not None else None
+    socket.sendall(encode_integer(rank) if rank is not None else NULL_BULK_STRING)
+
+def handle_zcard(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    value = database.lookup(args[0])
+
+    if _wrong_type(socket, value, SortedSet):
+        return
+
+    socket.sendall(encode_integer(len(value) if value is not None else 0))
+
+def handle_zrange(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    by_score, reverse, with_scores, limit, i = False, False, False, None, 3
+
+    while i < len(args):
+        option = args[i].upper()
+
+        if option == b"BYSCORE":
+            by_score = True
+        elif option == b"REV":
+            reverse = True
+        elif option == b"WITHSCORES":
+            with_scores = True
+        elif option == b"LIMIT" and i + 2 < len(args):
+            limit = (encode_int(args[i + 1]), encode_int(args[i + 2]))
+            i += 2
+        else:
+            socket.sendall(encode_error_string("ERR syntax error"))
+            return
+
+        i += 1
+
+    if limit is not None and not by_score:
+        socket.sendall(encode_error_string("ERR syntax error, LIMIT is only supported in combination with either BYSCORE or BYLEX"))
+        return
+
+    _zrange(socket, database, args[0], args[1], args[2], by_score, reverse, with_scores, limit)
+
+def handle_zrangebyscore(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    with_scores, limit, i = False, None, 3
+
+    while i < len(args):
+        option = args[i].upper()
+
+        if option == b"WITHSCORES":
+            with_scores = True
+        elif option == b"LIMIT" and i + 2 < len(args):
+            limit = (encode_int(args[i + 1]), encode_int(args[i + 2]))
+            i += 2
+        else:
+            socket.sendall(encode_error_string("ERR syntax error"))
+            return
+
+        i += 1
+
+    _zrange(socket, database, args[0], args[1], args[2], True, False, with_scores, limit)
+
+def _zrange(socket: RESPSocket, database: Database, key: bytes, start: bytes, stop: bytes, by_score: bool, reverse: bool, with_scores: bool, limit: tuple[int | bytes, int | bytes] | None) -> None:
+    if limit is not None and not all(isinstance(n, int) for n in limit):
+        socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+        return
+
+    if by_score:
+        try:
+            low, high = (_parse_score_bound(stop), _parse_score_bound(start)) if reverse else (_parse_score_bound(start), _parse_score_bound(stop))
+        except ValueError:
+            socket.sendall(encode_error_string("ERR min or max is not a float"))
+            return
+    else:
+        start, stop = encode_int(start), encode_int(stop)
+
+        if not isinstance(start, int) or not isinstance(stop, int):
+            socket.sendall(encode_error_string(NOT_INTEGER_ERROR))
+            return
+
+    value = database.lookup(key)
+
+    if _wrong_type(socket, value, SortedSet):
+        return
+
+    if value is None:
+        socket.sendall(encode_array([]))
+        return
+
+    if by_score:
+        first, last = value.score_range(low[0], high[0], low[1], high[1])
+    else:
+        first, last = _normalize_range(start, stop, len(value))
+
+        if reverse:
+            first, last = len(value) - last, len(value) - first
+
+    if limit is not None:
+        offset, count = limit
+
+        if offset < 0:
+            offset, count = 0, 0
+
+        first, last = (first, last - offset) if reverse else (first + offset, last)
+
+        if count >= 0:
+            first, last = (max(first, last - count), last) if reverse else (first, min(last, first + count))
+
+    entries = value.range(first, max(first, last))
+
+    if reverse:
+        entries.reverse()
+
+    elements = []
+
+    for score, member in entries:
+        elements += (member, _format_score(score)) if with_scores else (member,)
+
+    socket.sendall(encode_array(elements))
+
+def handle_object(socket: RESPSocket, args: list[bytes], database: Database) -> None:
+    if len(args) != 2 or args[0].upper() != b"ENCODING":
+        socket.sendall(encode_error_string("ERR unknown subcommand or wrong number of arguments for 'OBJECT'"))
+        return
+
+    value = database.lookup(args[1])
+
+    if value is None:
+        socket.sendall(NULL_BULK_STRING)
+    elif isinstance(value, Collection):
+        socket.sendall(encode_bulk(value.encoding))
+    elif isinstance(value, int):
+        socket.sendall(encode_bulk("int"))
+    else:
+        socket.sendall(encode_bulk("embstr" if len(value) <= STRING_EMBSTR_MAX_BYTES else "raw"))
+
+def _wrong_type(socket: RESPSocket, value: object, value_type: type) -> bool:
+    if value is None or isinstance(value, value_type):
+        return False
+
+    socket.sendall(encode_error_string(WRONGTYPE_ERROR))
+    return True
+
+def _store(database: Database, key: bytes, value: Collection, created: bool) -> None:
+    if not len(value):
+        if not created:
+            database.delete(key)
+    elif created:
+        database.set(key, value)
+    else:
+        database.touch(key)
+
+def _normalize_range(start: int, stop: int, length: int) -> tuple[int, int]:
+    if start < 0:
+        start = max(0, length + start)
+
+    if stop < 0:
+        stop = length + stop
+
+    stop = min(stop, length - 1)
+
+    return start, max(start, stop + 1)
+
+def _parse_score(value: bytes) -> float:
+    if not value or value != value.strip():
+        raise ValueError(value)
+
+    score = float(value)
+
+    if score != score:
+        raise ValueError(value)
+
+    return score
+
+def _parse_score_bound(value: bytes) -> tuple[float, bool]:
+    if value[:1] == b"(":
+        return _parse_score(value[1:]), True
+
+    return _parse_score(value), False
+
+def _format_score(score: float) -> bytes:
+    if score.is_integer() and abs(score) < ZSET_SCORE_INTEGER_LIMIT:
+        return b"%d" % score
+
+    return repr(score).encode(ENCODING)
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _human_bytes(n: int) -> str:
+    for unit in ("B", "K", "M", "G"):
+        if n < 1024:
+            break
+
+        n /= 1024
+
+    return f"{n:.2f}{unit}"
+
+def _parse_range_id(value: bytes, default_seq_no: int = 0) -> tuple[int, int]:
+    if value == b"-":
+        return 0, 0
+
+    if value == b"+":
+        return STREAM_ID_MAX, STREAM_ID_MAX
+
+    return _parse_stream_id(value, default_seq_no)
+
+def _parse_stream_id(value: bytes, default_seq_no: int = 0) -> tuple[int, int]:
+    ms_time, _, seq_no = value.partition(b"-")
+
+    if not ms_time.isdigit() or not (seq_no.isdigit() or not seq_no):
+        raise ValueError("ERR Invalid stream ID specified as stream command argument")
+
+    ms_time, seq_no = int(ms_time), int(seq_no) if seq_no else default_seq_no
+
+    if ms_time > STREAM_ID_MAX or seq_no > STREAM_ID_MAX:
+        raise ValueError("ERR Invalid stream ID specified as stream command argument")
+
+    return ms_time, seq_no
+
+def _parse_trim(args: list[bytes], i: int) -> tuple[tuple[int | None, tuple[int, int] | None, bool, int | None], int]:
+    strategy, i = args[i].upper(), i + 1
+    approximate = i < len(args) and args[i] == b"~"
+
+    if i < len(args) and args[i] in (b"=", b"~"):
+        i += 1
+
+    if i >= len(args):
+        raise ValueError("ERR syntax error")
+
+    max_len, min_id, limit = None, None, None
+
+    if strategy == b"MAXLEN":
+        max_len = encode_int(args[i])
+
+        if max_len.__class__ is not int or max_len < 0:
+            raise ValueError("ERR The MAXLEN argument must be >= 0.")
+    else:
+        min_id = _parse_stream_id(args[i])
+
+    if i + 2 < len(args) and args[i + 1].upper() == b"LIMIT":
+        if not approximate:
+            raise ValueError("ERR syntax error, LIMIT cannot be used without the special ~ option")
+
+        limit = encode_int(args[i + 2])
+
+        if limit.__class__ is not int or limit < 0:
+            raise ValueError("ERR The LIMIT argument must be >= 0.")
+
+        i += 2
+
+    return (max_len, min_id, approximate, limit), i + 1
+
+def _lookup_group(socket: RESPSocket, database: Database, key: bytes, group_name: bytes) -> tuple[Stream | None, ConsumerGroup | None]:
+    stream = database.lookup(key)
+
+    if _wrong_type(socket, stream, Stream):
+        return None, None
+
+    group = stream.groups.get(group_name) if stream is not None else None
+
+    if group is None:
+        socket.sendall(encode_error_string(f"NOGROUP No such key '{key.decode(ENCODING)}' or consumer group '{group_name.decode(ENCODING)}'"))
+
+    return stream, group
+
+def _resolve_xread_start(database: Database, key: bytes, start: bytes) -> tuple[int, int]:
+    if start != b"$":
+        return _parse_stream_id(start)
+
+    stream = database.lookup(key)
+
+    if stream is not None:
+        return stream.last_id() or (0, 0)
+
+    return 0, 0
+
+def _read_streams(database: Database, keys: list[bytes], starts: list[tuple[int, int]], count: int | None) -> bytes:
+    parts = [b""]
+
+    for key, start in zip(keys, starts):
+        stream = database.lookup(key)
+
+        if not isinstance(stream, Stream):
+            continue
+
+        entries = stream.after(start, count)
+
+        if entries:
+            parts += (b"*2\r\n", encode_bulk(key), encode_stream(entries))
+
+    if len(parts) == 1:
+        return b""
+
+    parts[0] = b"*%d\r\n" % (len(parts) // 3)
 
+    return b"".join(parts)
@@ -0,0 +1,128 @@
+from typing import Callable
+from app.resp import RESPSocket
+
+Handler = Callable[[RESPSocket, list[bytes]], None]
+
+class Command:
+    def __init__(self, name: str, handler: Handler, arity: int, flags: list[str], first_key: int = 0, last_key: int = 0, key_step: int = 0, get_keys: Callable[[list[bytes]], list[bytes]] | None = None, blocks: Callable[[list[bytes]], bool] | None = None, unblock: Callable[[list[bytes]], list[bytes]] | None = None) -> None:
+        self.name = name
+        self.handler = handler
+        self.arity = arity
+        self.flags = flags
+        self.first_key = first_key
+        self.last_key = last_key
+        self.key_step = key_step
+        self.write = "write" in flags
+        self.denyoom = "denyoom" in flags
+        self.leader = "leader" in flags
+        self.no_multi = "no-multi" in flags
+        self._get_keys = get_keys
+        self._blocks = blocks
+        self._unblock = unblock
+
+    def check_arity(self, args: list[bytes]) -> bool:
+        argc = len(args) + 1
+        return argc == self.arity if self.arity > 0 else argc >= -self.arity
+
+    def keys(self, args: list[bytes]) -> list[bytes]:
+        if self._get_keys is not None:
+            return self._get_keys(args)
+
+        if not self.first_key:
+            return []
+
+        last_key = self.last_key if self.last_key > 0 else len(args) + 1 + self.last_key
+
+        return args[self.first_key - 1:last_key:self.key_step]
+
+    def is_blocking(self, args: list[bytes]) -> bool:
+        if self._blocks is not None:
+            return self._blocks(args)
+
+        return "blocking" in self.flags
+
+    def without_blocking(self, args: list[bytes]) -> list[bytes]:
+        if self._unblock is not None and self.is_blocking(args):
+            return self._unblock(args)
+
+        return args
+
+    def info(self) -> list[object]:
+        first_key = 0 if self._get_keys is not None else self.first_key
+        return [self.name.lower(), self.arity, self.flags, first_key, self.last_key if first_key else 0, self.key_step if first_key else 0]
+
+def command_table(commands: list[Command]) -> dict[str, Command]:
+    return {command.name: command for command in commands}
+
+def xread_keys(args: list[bytes]) -> list[bytes]:
+    options = [arg.upper() for arg in args]
+
+    if b"STREAMS" not in options:
+        return []
+
+    streams = args[options.index(b"STREAMS") + 1:]
+    return streams[:len(streams) // 2]
+
+def xread_blocks(args: list[bytes]) -> bool:
+    for option in args[::2]:
+        option = option.upper()
+
+        if option == b"STREAMS":
+            return False
+
+        if option == b"BLOCK":
+            return True
+
+    return False
+
+def xread_without_block(args: list[bytes]) -> list[bytes]:
+    options = []
+
+    for i in range(0, len(args), 2):
+        if args[i].upper() == b"STREAMS":
+            return options + args[i:]
+
+        if args[i].upper() != b"BLOCK":
+            options += args[i:i + 2]
+
+    return options
+
+def xreadgroup_blocks(args: list[bytes]) -> bool:
+    i = 0
+
+    while i < len(args):
+        option = args[i].upper()
+
+        if option == b"STREAMS":
+            return False
+
+        if option == b"BLOCK":
+            return True
+
+        i += 3 if option == b"GROUP" else 1 if option == b"NOACK" else 2
+
+    return False
+
+def xreadgroup_without_block(args: list[bytes]) -> list[bytes]:
+    options, i = [], 0
+
+    while i < len(args):
+        option = args[i].upper()
+
+        if option == b"STREAMS":
+            return options + args[i:]
+
+        step = 3 if option == b"GROUP" else 1 if option == b"NOACK" else 2
+
+        if option != b"BLOCK":
+            options += args[i:i + step]
+
+        i += step
+
+    return options
+
+def memory_keys(args: list[bytes]) -> list[bytes]:
+    return args[1:2] if args and args[0].upper() == b"USAGE" else []
+
+def object_keys(args: list[bytes]) -> list[bytes]:
+    return args[1:2] if args and args[0].upper() == b"ENCODING" else []
@@ -7,14 +7,168 @@ FOLLOWER_ROLE = "slave"
 REPLID = "master_replid"
 REPLOFFSET = "master_repl_offset"
 
+REPL_BACKLOG_SIZE = "repl-backlog-size"
+LEADER_RECONNECT_DELAY_S = 1
+RDB_TRANSFER_CHUNK_BYTES = 64 * 1024
+RESP_HEADER_CACHE_SIZE = 1024
+REPLICA_OUTPUT_BUFFER_LIMIT = "client-output-buffer-limit-replica"
+
+REPLICA_ACK_EVENT = "replica-ack"
+
+WORKERS = "workers"
+WORKER_ID = "worker-id"
+WORKER_SOCKET_DIR = "worker-socket-dir"
 LEADER_HOST = "leader_host"
 LEADER_PORT = "leader_port"
 
-EMPTY_RDB_FILE_B64 = "UkVESVMwMDEx+glyZWRpcy12ZXIFNy4yLjD6CnJlZGlzLWJpdHPAQPoFY3RpbWXCbQi8ZfoIdXNlZC1tZW3CsMQQAPoIYW9mLWJhc2XAAP/wbjv+wP9aog=="
+OUTPUT_BUFFER_FLUSH_BYTES = 64 * 1024
+
+PROTO_MAX_BULK_LEN = 512 * 1024 * 1024
+PROTO_MAX_MULTIBULK_LEN = 1024 * 1024
+PROTO_MAX_HEADER_BYTES = 64 * 1024
+
+HZ = "hz"
+ACTIVE_EXPIRE_CPU = "active-expire-cpu"
+
+ACTIVE_EXPIRE_CYCLE_CHECK_EVERY = 16
+ACTIVE_EXPIRE_INDEX_MIN_SIZE = 1024
+
+MAXMEMORY = "maxmemory"
+MAXMEMORY_POLICY = "maxmemory-policy"
+MAXMEMORY_SAMPLES = "maxmemory-samples"
+MAXMEMORY_POLICIES = ["noeviction", "allkeys-lru", "volatile-lru", "allkeys-lfu", "volatile-ttl", "allkeys-random"]
+EVICTION_POOL_SIZE = 16
+LFU_INIT_VAL = 5
+LFU_LOG_FACTOR = 10
+LFU_DECAY_TIME_MINUTES = 1
+MEMORY_POINTER_BYTES = 8
+MEMORY_DICT_ENTRY_BYTES = 40
+MEMORY_EXPIRE_ENTRY_BYTES = 136
+MEMORY_ZSET_ENTRY_BYTES = 80
+MEMORY_PENDING_ENTRY_BYTES = 96
+MEMORY_CONSUMER_BYTES = 128
+GLOB_PATTERN_CACHE_SIZE = 256
+GLOB_SPECIAL_CHARS = b"*?[\\"
+SCAN_DEFAULT_COUNT = 10
+KEYSPACE_SLOTS = 16384
+KEYSPACE_SHARDS = 16
+STREAM_ID_MAX = (1 << 64) - 1
+STREAM_NODE_MAX_ENTRIES = 100
+STREAM_TRIM_DEFAULT_LIMIT = 100 * STREAM_NODE_MAX_ENTRIES
+STREAM_AUTOCLAIM_DEFAULT_COUNT = 100
+STREAM_AUTOCLAIM_ATTEMPTS_FACTOR = 10
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+STRING_MAX_BYTES = 512 * 1024 * 1024
+STRING_EMBSTR_MAX_BYTES = 44
+ZSET_SCORE_INTEGER_LIMIT = 1 << 53
 
-WRITE_COMMANDS = ['SET', 'DEL']
+WRONGTYPE_ERROR = "WRONGTYPE Operation against a key holding the wrong kind of value"
+NOT_INTEGER_ERROR = "ERR value is not an integer or out of range"
 
-LEADER_COMMANDS = ['REPLCONF', 'INFO']
+HASH_MAX_LISTPACK_ENTRIES = "hash-max-listpack-entries"
+HASH_MAX_LISTPACK_VALUE = "hash-max-listpack-value"
+LIST_MAX_LISTPACK_SIZE = "list-max-listpack-size"
+SET_MAX_INTSET_ENTRIES = "set-max-intset-entries"
+SET_MAX_LISTPACK_ENTRIES = "set-max-listpack-entries"
+SET_MAX_LISTPACK_VALUE = "set-max-listpack-value"
+ZSET_MAX_LISTPACK_ENTRIES = "zset-max-listpack-entries"
+ZSET_MAX_LISTPACK_VALUE = "zset-max-listpack-value"
+ENCODING_LIMIT_DEFAULTS = {
+    HASH_MAX_LISTPACK_ENTRIES: 128,
+    HASH_MAX_LISTPACK_VALUE: 64,
+    LIST_MAX_LISTPACK_SIZE: 128,
+    SET_MAX_INTSET_ENTRIES: 512,
+    SET_MAX_LISTPACK_ENTRIES: 128,
+    SET_MAX_LISTPACK_VALUE: 64,
+    ZSET_MAX_LISTPACK_ENTRIES: 128,
+    ZSET_MAX_LISTPACK_VALUE: 64,
+}
 
+TRANSACTION_COMMANDS = ['MULTI', 'EXEC', 'DISCARD', 'WATCH']
+
+LOGLEVEL = "loglevel"
+LOG_LEVELS = ["debug", "verbose", "notice", "warning"]
+
+SLOWLOG_LOG_SLOWER_THAN = "slowlog-log-slower-than"
+SLOWLOG_MAX_LEN = "slowlog-max-len"
+SLOWLOG_MAX_ARGC = 32
+SLOWLOG_MAX_ARGLEN = 128
+SLOWLOG_DEFAULT_COUNT = 10
+
+LATENCY_HISTOGRAM_SUB_BUCKET_BITS = 4
+LATENCY_HISTOGRAM_MAX_USEC_BITS = 40
+LATENCY_PERCENTILES = [50, 99, 99.9]
+
+CONFIG_SET_PARAMETERS = [MAXMEMORY, MAXMEMORY_POLICY, MAXMEMORY_SAMPLES, LOGLEVEL, SLOWLOG_LOG_SLOWER_THAN, SLOWLOG_MAX_LEN] + list(ENCODING_LIMIT_DEFAULTS)
 RDB_DIR = "dir"
-RDB_FILENAME ="dbfilename"
\ No newline at end of file
+RDB_FILENAME ="dbfilename"
+
+DEFAULT_RDB_DIR = "."
+DEFAULT_RDB_FILENAME = "dump.rdb"
+
+SAVE_RULES = "save"
+BGSAVE_RETRY_DELAY_S = 5
+
+APPENDONLY = "appendonly"
+APPENDFSYNC = "appendfsync"
+APPENDFILENAME = "appendfilename"
+
+APPENDFSYNC_ALWAYS = "always"
+APPENDFSYNC_EVERYSEC = "everysec"
+APPENDFSYNC_NO = "no"
+
+DEFAULT_APPENDFILENAME = "appendonly.aof"
+
+AOF_REPLAY_READ_BYTES = 4 * 1024 * 1024
+AOF_REWRITE_BUFFER_BYTES = 1024 * 1024
+AOF_REWRITE_ITEMS_PER_CMD = 64
+
+RDB_REDIS_VERSION = b"7.2.0"
+RDB_WRITE_BUFFER_BYTES = 1024 * 1024
+RDB_STREAM_NODE_MAX_ENTRIES = 100
+RDB_LIST_NODE_MAX_ENTRIES = 128
+
+RDB_OPCODE_FUNCTION2 = 0xF5
+RDB_OPCODE_MODULE_AUX = 0xF7
+RDB_OPCODE_IDLE = 0xF8
+RDB_OPCODE_FREQ = 0xF9
+RDB_OPCODE_AUX = 0xFA
+RDB_OPCODE_RESIZEDB = 0xFB
+RDB_OPCODE_EXPIRETIME_MS = 0xFC
+RDB_OPCODE_EXPIRETIME = 0xFD
+RDB_OPCODE_SELECTDB = 0xFE
+RDB_OPCODE_EOF = 0xFF
+
+RDB_TYPE_STRING = 0
+RDB_TYPE_LIST = 1
+RDB_TYPE_SET = 2
+RDB_TYPE_ZSET = 3
+RDB_TYPE_HASH = 4
+RDB_TYPE_ZSET_2 = 5
+RDB_TYPE_MODULE = 6
+RDB_TYPE_MODULE_2 = 7
+RDB_TYPE_HASH_ZIPMAP = 9
+RDB_TYPE_LIST_ZIPLIST = 10
+RDB_TYPE_SET_INTSET = 11
+RDB_TYPE_ZSET_ZIPLIST = 12
+RDB_TYPE_HASH_ZIPLIST = 13
+RDB_TYPE_LIST_QUICKLIST = 14
+RDB_TYPE_STREAM_LISTPACKS = 15
+RDB_TYPE_HASH_LISTPACK = 16
+RDB_TYPE_ZSET_LISTPACK = 17
+RDB_TYPE_LIST_QUICKLIST_2 = 18
+RDB_TYPE_STREAM_LISTPACKS_2 = 19
+RDB_TYPE_SET_LISTPACK = 20
+RDB_TYPE_STREAM_LISTPACKS_3 = 21
+
+RDB_ENC_INT8 = 0
+RDB_ENC_INT16 = 1
+RDB_ENC_INT32 = 2
+RDB_ENC_LZF = 3
+
+RDB_QUICKLIST_NODE_PLAIN = 1
+RDB_QUICKLIST_NODE_PACKED = 2
+
+RDB_STREAM_ITEM_FLAG_DELETED = 1
+RDB_STREAM_ITEM_FLAG_SAMEFIELDS = 2
\ No newline at end of file
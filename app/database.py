@@ -1,121 +1,769 @@
-from io import BufferedReader
-from struct import unpack
+from mmap import mmap, ACCESS_READ
+from heapq import heappush, heappop, heapify
+from bisect import bisect_left, bisect_right, insort
+from time import time, monotonic
+from binascii import crc_hqx
+from contextlib import contextmanager
+from threading import Lock, RLock, local
 from app.constants import *
+from app import logger
+from app.rdb import RDBReader, RDBWriter
+from app.resp import RESPParser, encode_array, NULL_ARRAY
+from app.patterns import compile_glob, is_glob_pattern
+from app.transactions import Transaction
+from app.datatypes import Collection, collection_from_rdb, encode_int, decode_int
+from typing import BinaryIO, Iterator
+from sys import getsizeof
+from random import random, randrange
+from itertools import islice
+import os
+
+def current_ms() -> int:
+    return round(time() * 1000)
     
+class Stream(Collection):
+    type_name = "stream"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.encoding = "stream"
+        self.groups = {}
+        self._ids = []
+        self._entries = []
+        self._last_id = 0
+        self._max_deleted_id = 0
+        self._entries_added = 0
+        self._memory += getsizeof(self._ids) + getsizeof(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def last_id(self) -> tuple[int, int] | None:
+        if not self._last_id:
+            return None
+
+        return unpack_stream_id(self._last_id)
+
+    def max_deleted_id(self) -> tuple[int, int]:
+        return unpack_stream_id(self._max_deleted_id)
+
+    def append(self, entry_id: tuple[int, int], fields: list[bytes]) -> None:
+        packed_id = pack_stream_id(*entry_id)
+        packed_fields = encode_array(fields)
+
+        self._ids.append(packed_id)
+        self._entries.append(packed_fields)
+        self._last_id = packed_id
+        self._entries_added += 1
+        self._memory += getsizeof(packed_id) + getsizeof(packed_fields) + 2 * MEMORY_POINTER_BYTES
+
+    def get(self, packed_id: int) -> bytes | None:
+        i = bisect_left(self._ids, packed_id)
+        return self._entries[i] if i < len(self._ids) and self._ids[i] == packed_id else None
+
+    def range(self, start: tuple[int, int], end: tuple[int, int], count: int | None = None) -> list[tuple[bytes, bytes]]:
+        lo = bisect_left(self._ids, pack_stream_id(*start))
+        hi = bisect_right(self._ids, pack_stream_id(*end))
+
+        if count is not None:
+            hi = min(hi, lo + count)
+
+        return [(format_stream_id(self._ids[i]), self._entries[i]) for i in range(lo, hi)]
+
+    def after(self, start: tuple[int, int], count: int | None = None) -> list[tuple[bytes, bytes]]:
+        lo = bisect_right(self._ids, pack_stream_id(*start))
+        hi = len(self._ids) if count is None else min(len(self._ids), lo + count)
+
+        return [(format_stream_id(self._ids[i]), self._entries[i]) for i in range(lo, hi)]
+
+    def trim(self, max_len: int | None, min_id: tuple[int, int] | None, approximate: bool, limit: int | None) -> int:
+        n = len(self._ids) - max_len if max_len is not None else bisect_left(self._ids, pack_stream_id(*min_id))
+
+        if approximate:
+            limit = STREAM_TRIM_DEFAULT_LIMIT if limit is None else limit
+            n = min(n, limit) if limit else n
+            n -= n % STREAM_NODE_MAX_ENTRIES
+
+        if n <= 0:
+            return 0
+
+        self._max_deleted_id = max(self._max_deleted_id, self._ids[n - 1])
+        self._memory -= sum([getsizeof(self._ids[i]) + getsizeof(self._entries[i]) + 2 * MEMORY_POINTER_BYTES for i in range(n)])
+
+        del self._ids[:n]
+        del self._entries[:n]
+
+        return n
+
+    def set_id(self, last_id: tuple[int, int], entries_added: int | None = None, max_deleted_id: tuple[int, int] | None = None) -> None:
+        self._last_id = pack_stream_id(*last_id)
+
+        if entries_added is not None:
+            self._entries_added = entries_added
+
+        if max_deleted_id is not None:
+            self._max_deleted_id = pack_stream_id(*max_deleted_id)
+
+    def create_group(self, name: bytes, last_id: tuple[int, int], entries_read: int | None) -> "ConsumerGroup | None":
+        if name in self.groups:
+            return None
+
+        group = self.groups[name] = ConsumerGroup(name, pack_stream_id(*last_id), entries_read)
+        self._memory += getsizeof(name) + MEMORY_CONSUMER_BYTES
+
+        return group
+
+    def destroy_group(self, name: bytes) -> bool:
+        group = self.groups.pop(name, None)
+
+        if group is None:
+            return False
+
+        self._memory -= getsizeof(name) + MEMORY_CONSUMER_BYTES + len(group.pending) * MEMORY_PENDING_ENTRY_BYTES
+        self._memory -= sum([getsizeof(consumer) + MEMORY_CONSUMER_BYTES for consumer in group.consumers])
+
+        return True
+
+    def consumer(self, group: "ConsumerGroup", name: bytes, now: int) -> tuple["Consumer", bool]:
+        consumer = group.consumers.get(name)
+
+        if consumer is not None:
+            return consumer, False
+
+        consumer = group.consumers[name] = Consumer(name, now)
+        self._memory += getsizeof(name) + MEMORY_CONSUMER_BYTES
+
+        return consumer, True
+
+    def delete_consumer(self, group: "ConsumerGroup", name: bytes) -> int:
+        consumer = group.consumers.pop(name, None)
+
+        if consumer is None:
+            return 0
+
+        pending = len(consumer.pending)
+
+        for packed_id in list(consumer.pending):
+            self.ack(group, packed_id)
+
+        self._memory -= getsizeof(name) + MEMORY_CONSUMER_BYTES
+
+        return pending
+
+    def read_group(self, group: "ConsumerGroup", consumer: "Consumer", count: int | None, noack: bool, now: int) -> list[tuple[bytes, bytes]]:
+        lo = bisect_right(self._ids, group.last_id)
+        hi = len(self._ids) if count is None else min(len(self._ids), lo + count)
+        consumer.seen_time = now
+
+        if lo >= hi:
+            return []
+
+        if not noack:
+            for i in range(lo, hi):
+                self._deliver(group, consumer, self._ids[i], now)
+
+        group.last_id = self._ids[hi - 1]
+
+        if group.entries_read is not None:
+            group.entries_read += hi - lo
+
+        return [(format_stream_id(self._ids[i]), self._entries[i]) for i in range(lo, hi)]
+
+    def read_history(self, consumer: "Consumer", start: tuple[int, int], count: int | None, now: int) -> list[tuple[bytes, bytes]]:
+        start = pack_stream_id(*start)
+        packed_ids = sorted([packed_id for packed_id in consumer.pending if packed_id > start])
+        consumer.seen_time = now
+
+        return [(format_stream_id(packed_id), self.get(packed_id) or NULL_ARRAY) for packed_id in packed_ids[:count]]
+
+    def ack(self, group: "ConsumerGroup", packed_id: int) -> bool:
+        entry = group.pending.pop(packed_id, None)
+
+        if entry is None:
+            return False
+
+        del entry.consumer.pending[packed_id]
+        del group.pending_ids[bisect_left(group.pending_ids, packed_id)]
+        self._memory -= MEMORY_PENDING_ENTRY_BYTES
+
+        return True
+
+    def claim(self, group: "ConsumerGroup", consumer: "Consumer", packed_id: int, min_idle: int, now: int, delivery_time: int | None = None, retry_count: int | None = None, justid: bool = False, force: bool = False) -> bool:
+        entry = group.pending.get(packed_id)
+
+        if entry is None:
+            if not force or self.get(packed_id) is None:
+                return False
+
+            entry = self._deliver(group, consumer, packed_id, now)
+            entry.delivery_count = 0
+        elif now - entry.delivery_time < min_idle:
+            return False
+        else:
+            del entry.consumer.pending[packed_id]
+            entry.consumer = consumer
+            consumer.pending[packed_id] = entry
+
+        entry.delivery_time = delivery_time if delivery_time is not None else now
+
+        if retry_count is not None:
+            entry.delivery_count = retry_count
+        elif not justid:
+            entry.delivery_count += 1
+
+        return True
+
+    def pending_range(self, group: "ConsumerGroup", start: int, end: int, count: int, consumer: "Consumer | None", min_idle: int, now: int) -> list[tuple[int, "PendingEntry"]]:
+        ids = group.pending_ids
+        entries = []
+
+        for i in range(bisect_left(ids, start), bisect_right(ids, end)):
+            if len(entries) >= count:
+                break
+
+            entry = group.pending[ids[i]]
+
+            if (consumer is None or entry.consumer is consumer) and now - entry.delivery_time >= min_idle:
+                entries.append((ids[i], entry))
+
+        return entries
+
+    def pending_after(self, group: "ConsumerGroup", start: int, limit: int) -> list[int]:
+        lo = bisect_left(group.pending_ids, start)
+        return group.pending_ids[lo:lo + limit]
+
+    def entries(self) -> Iterator[tuple[tuple[int, int], list[bytes]]]:
+        for i in range(len(self._ids)):
+            parser = RESPParser()
+            parser.feed(self._entries[i])
+            yield unpack_stream_id(self._ids[i]), parser.next_frame()
+
+    def to_rdb(self) -> dict:
+        groups = []
+
+        for group in self.groups.values():
+            pending = {}
+
+            for packed_id in group.pending_ids:
+                entry = group.pending[packed_id]
+                pending[unpack_stream_id(packed_id)] = [entry.consumer.name, entry.delivery_time, entry.delivery_count]
+
+            consumers = {consumer.name: consumer.seen_time for consumer in group.consumers.values()}
+            groups.append({"name": group.name, "last_id": unpack_stream_id(group.last_id), "entries_read": group.entries_read, "pending": pending, "consumers": consumers})
+
+        return {"entries": list(self.entries()), "last_id": self.last_id() or (0, 0), "max_deleted_id": self.max_deleted_id(), "entries_added": self._entries_added, "groups": groups}
+
+    def restore_rdb(self, value: dict) -> None:
+        self.set_id(value["last_id"], value["entries_added"], value["max_deleted_id"])
+        now = current_ms()
+
+        for group_value in value["groups"]:
+            group = self.create_group(group_value["name"], group_value["last_id"], group_value["entries_read"])
+
+            for name, seen_time in group_value["consumers"].items():
+                self.consumer(group, name, now)[0].seen_time = seen_time
+
+            for entry_id, (name, delivery_time, delivery_count) in sorted(group_value["pending"].items()):
+                if name is not None:
+                    entry = self._deliver(group, self.consumer(group, name, now)[0], pack_stream_id(*entry_id), delivery_time)
+                    entry.delivery_count = delivery_count
+
+    def _deliver(self, group: "ConsumerGroup", consumer: "Consumer", packed_id: int, now: int) -> "PendingEntry":
+        entry = group.pending.get(packed_id)
+
+        if entry is None:
+            entry = group.pending[packed_id] = PendingEntry(consumer, now, 1)
+            self._memory += MEMORY_PENDING_ENTRY_BYTES
+
+            if not group.pending_ids or packed_id > group.pending_ids[-1]:
+                group.pending_ids.append(packed_id)
+            else:
+                insort(group.pending_ids, packed_id)
+        else:
+            del entry.consumer.pending[packed_id]
+            entry.consumer, entry.delivery_time = consumer, now
+            entry.delivery_count += 1
+
+        consumer.pending[packed_id] = entry
+
+        return entry
+
+class ConsumerGroup:
+    def __init__(self, name: bytes, last_id: int, entries_read: int | None) -> None:
+        self.name = name
+        self.last_id = last_id
+        self.entries_read = entries_read
+        self.consumers = {}
+        self.pending = {}
+        self.pending_ids = []
+
+class Consumer:
+    def __init__(self, name: bytes, seen_time: int) -> None:
+        self.name = name
+        self.seen_time = seen_time
+        self.pending = {}
+
+class PendingEntry:
+    def __init__(self, consumer: Consumer, delivery_time: int, delivery_count: int) -> None:
+        self.consumer = consumer
+        self.delivery_time = delivery_time
+        self.delivery_count = delivery_count
+
+def pack_stream_id(ms_time: int, seq_no: int) -> int:
+    return (ms_time << 64) | seq_no
+
+def unpack_stream_id(packed: int) -> tuple[int, int]:
+    return packed >> 64, packed & STREAM_ID_MAX
+
+def format_stream_id(packed: int) -> bytes:
+    return b"%d-%d" % (packed >> 64, packed & STREAM_ID_MAX)
+
 class Database():
-    def __init__(self, filename: str | None) -> None:
-        self._data = {}
+    def __init__(self, filename: str | None, shards: int = KEYSPACE_SHARDS) -> None:
+        self._slots = [{} for _ in range(KEYSPACE_SLOTS)]
+        self._shards = [_Shard() for _ in range(shards)]
+        self._expire_cursor = 0
+        self._dirty_lock = Lock()
+        self._writes = _WriteCounter()
+        self._access_tracking = None
+        self._watchers = {}
+        self._watch_lock = Lock()
+        self.dirty = 0
+        self.evicted_keys = 0
 
         if filename:
-            self._read_rdb(filename)
+            self.load_rdb_file(filename)
 
-    def set(self, key: str, value: tuple[str | list[list[str]], int | None]) -> None:
-        self._data[key] = value
+    def __len__(self) -> int:
+        return sum([len(data) for data in self._slots])
 
-    def get(self, key: str) -> tuple[str | list[list[str]], int | None]:
-        return self._data[key]
-    
-    def delete(self, key: str) -> None:
-        del self._data[key]
+    def set(self, key: bytes, value: bytes | Collection, expiry: int | None = None) -> None:
+        data, shard = self._locate(key)
+
+        if isinstance(value, bytes):
+            value = encode_int(value)
+
+        with shard.lock:
+            if key in data:
+                self._remove(data, shard, key)
+
+            self._insert(data, shard, key, value, expiry)
+            self._mark_dirty(key)
+
+    def update(self, key: bytes, value: bytes | int) -> None:
+        data, shard = self._locate(key)
+
+        if isinstance(value, bytes):
+            value = encode_int(value)
+
+        with shard.lock:
+            current = data.get(key)
+
+            if current is None:
+                self._insert(data, shard, key, value, None)
+            else:
+                data[key] = value
+                shard.used_memory += getsizeof(value) - getsizeof(current)
+
+            self._mark_dirty(key)
+
+    def lookup(self, key: bytes) -> bytes | int | Collection | None:
+        data, shard = self._locate(key)
+        value = data.get(key)
+
+        if value is None:
+            return None
+
+        expiry = shard.expires.get(key)
+
+        if expiry is None or expiry > current_ms():
+            if self._access_tracking is not None:
+                self._record_access(shard, key)
 
-    def contains(self, key: str) -> bool:
-        return key in self._data
+            return value
+
+        with shard.lock:
+            if data.get(key) is value and shard.expires.get(key) == expiry:
+                self._remove(data, shard, key)
+                self._mark_dirty(key)
+
+        return None
+
+    def expiry(self, key: bytes) -> int | None:
+        _, shard = self._locate(key)
+        return shard.expires.get(key)
     
-    def keys(self) -> list[str]:
-        return self._data.keys()
+    def delete(self, key: bytes) -> None:
+        data, shard = self._locate(key)
+
+        with shard.lock:
+            self._remove(data, shard, key)
+            self._mark_dirty(key)
+
+    def touch(self, key: bytes) -> None:
+        data, shard = self._locate(key)
+
+        with shard.lock:
+            value = data.get(key)
+
+            if isinstance(value, Collection):
+                shard.used_memory += value.memory_growth()
+
+            self._mark_dirty(key)
+
+    def contains(self, key: bytes) -> bool:
+        return self.lookup(key) is not None
+
+    def memory_usage(self, key: bytes) -> int | None:
+        value = self.lookup(key)
+
+        if value is None:
+            return None
+
+        return self._entry_memory(key, value, self.expiry(key))
+
+    def set_access_tracking(self, mode: str | None) -> None:
+        self._access_tracking = mode
+
+        for shard in self._shards:
+            with shard.lock:
+                shard.access = {}
+
+    def sample(self, count: int, volatile: bool) -> list[tuple[bytes, int | None, int]]:
+        samples = []
+        start = randrange(KEYSPACE_SLOTS)
+
+        for i in range(KEYSPACE_SLOTS):
+            slot = (start + i) % KEYSPACE_SLOTS
+            data = self._slots[slot]
+
+            if not data:
+                continue
+
+            shard = self._shards[slot % len(self._shards)]
+
+            with shard.lock:
+                if not data:
+                    continue
+
+                key = next(islice(iter(data), randrange(len(data)), None))
+                expiry = shard.expires.get(key)
+
+                if not volatile or expiry is not None:
+                    samples.append((key, expiry, shard.access.get(key, 0)))
+
+            if len(samples) >= count:
+                break
+
+        return samples
+
+    def evict(self, key: bytes) -> bool:
+        data, shard = self._locate(key)
+
+        with shard.lock:
+            if key not in data:
+                return False
+
+            self._remove(data, shard, key)
+            self._mark_dirty(key)
+
+        self.evicted_keys += 1
+        return True
+
+    def used_memory(self) -> int:
+        return sum([shard.used_memory for shard in self._shards])
+
+    def writes(self) -> int:
+        return self._writes.count
+
+    def subtract_dirty(self, count: int) -> None:
+        with self._dirty_lock:
+            self.dirty -= count
+
+    def watch(self, key: bytes, transaction: Transaction) -> None:
+        with self._watch_lock:
+            self._watchers.setdefault(key, set()).add(transaction)
+            transaction.watched.add(key)
+
+    def unwatch(self, transaction: Transaction) -> None:
+        with self._watch_lock:
+            for key in transaction.watched:
+                watchers = self._watchers.get(key)
+
+                if watchers is not None:
+                    watchers.discard(transaction)
+
+                    if not watchers:
+                        del self._watchers[key]
+
+            transaction.watched.clear()
+
+    @contextmanager
+    def locked(self, keys: list[bytes] | None) -> Iterator[None]:
+        shards = range(len(self._shards)) if keys is None else sorted({key_slot(key) % len(self._shards) for key in keys})
+        locks = [self._shards[i].lock for i in shards]
+
+        for lock in locks:
+            lock.acquire()
+
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
     
-    def _read_rdb(self, filename: str) -> None:
+    def keys(self, pattern: bytes = b"*") -> list[bytes]:
+        return list(self.iter_keys(pattern))
+
+    def iter_keys(self, pattern: bytes = b"*") -> Iterator[bytes]:
+        if not is_glob_pattern(pattern):
+            if self.contains(pattern):
+                yield pattern
+            return
+
+        for slot in range(KEYSPACE_SLOTS):
+            yield from self._slot_keys(slot, pattern, None)
+
+    def scan(self, cursor: int, count: int, pattern: bytes, value_type: str | None, end_slot: int = KEYSPACE_SLOTS) -> tuple[int, list[bytes]]:
+        keys, examined, slot = [], 0, cursor
+
+        while slot < end_slot and examined < count:
+            examined += len(self._slots[slot])
+            keys += self._slot_keys(slot, pattern, value_type)
+            slot += 1
+
+        return (slot if slot < KEYSPACE_SLOTS else 0), keys
+
+    def active_expire_cycle(self, time_limit_ms: float) -> int:
+        deadline = monotonic() + time_limit_ms / 1000
+        now = current_ms()
+        expired, checked = 0, 0
+
+        for _ in range(len(self._shards)):
+            shard_no = self._expire_cursor
+            shard = self._shards[shard_no]
+
+            with shard.lock:
+                index = shard.expiry_index
+
+                while index and index[0][0] <= now:
+                    expiry, key = heappop(index)
+                    checked += 1
+
+                    if shard.expires.get(key) == expiry:
+                        self._remove(self._slots[key_slot(key)], shard, key)
+                        self._mark_dirty(key)
+                        expired += 1
+
+                    if checked % ACTIVE_EXPIRE_CYCLE_CHECK_EVERY == 0 and monotonic() > deadline:
+                        return expired
+
+                if len(index) > ACTIVE_EXPIRE_INDEX_MIN_SIZE and len(index) > 2 * len(shard.expires):
+                    shard.expiry_index = [(expiry, key) for key, expiry in shard.expires.items()]
+                    heapify(shard.expiry_index)
+
+            self._expire_cursor = (shard_no + 1) % len(self._shards)
+
+        return expired
+
+    def clear(self) -> None:
+        for shard_no, shard in enumerate(self._shards):
+            with shard.lock:
+                for slot in range(shard_no, KEYSPACE_SLOTS, len(self._shards)):
+                    self._slots[slot] = {}
+
+                shard.expires = {}
+                shard.access = {}
+                shard.expiry_index = []
+                shard.used_memory = 0
+
+        self._mark_dirty(None)
+
+    def items(self) -> list[tuple[bytes, bytes | int | Collection, int | None]]:
+        items = []
+
+        for slot, data in enumerate(self._slots):
+            expires = self._shards[slot % len(self._shards)].expires
+            items += [(key, value, expires.get(key)) for key, value in list(data.items())]
+
+        return items
+
+    def dump_rdb(self, file: BinaryIO) -> None:
+        items = self.items()
+        expires_size = sum([1 for _, _, expiry in items if expiry is not None])
+
+        RDBWriter(file).write(self._rdb_items(items), len(items), expires_size)
+
+    def _rdb_items(self, items: list[tuple[bytes, bytes | int | Collection, int | None]]) -> Iterator[tuple[bytes, str, object, int | None]]:
+        for key, value, expiry in items:
+            if isinstance(value, Collection):
+                yield key, value.type_name, value.to_rdb(), expiry
+            else:
+                yield key, "string", decode_int(value), expiry
+
+    def _slot_keys(self, slot: int, pattern: bytes, value_type: str | None) -> list[bytes]:
+        data = self._slots[slot]
+
+        if not data:
+            return []
+
+        match = compile_glob(pattern).match if pattern != b"*" else None
+        expires = self._shards[slot % len(self._shards)].expires
+        now = current_ms()
+        keys = []
+
+        for key, value in list(data.items()):
+            expiry = expires.get(key)
+
+            if expiry is not None and expiry <= now:
+                continue
+
+            if (match is None or match(key)) and (value_type is None or type_name(value) == value_type):
+                keys.append(key)
+
+        return keys
+
+    def _locate(self, key: bytes) -> tuple[dict, "_Shard"]:
+        slot = key_slot(key)
+        return self._slots[slot], self._shards[slot % len(self._shards)]
+
+    def _insert(self, data: dict, shard: "_Shard", key: bytes, value: bytes | int | Collection, expiry: int | None) -> None:
+        data[key] = value
+
+        if expiry is not None:
+            shard.expires[key] = expiry
+            heappush(shard.expiry_index, (expiry, key))
+
+        if isinstance(value, Collection):
+            value.memory_growth()
+
+        if self._access_tracking is not None:
+            self._record_access(shard, key)
+
+        shard.used_memory += self._entry_memory(key, value, expiry)
+
+    def _remove(self, data: dict, shard: "_Shard", key: bytes) -> None:
+        value = data.pop(key)
+        expiry = shard.expires.pop(key, None)
+        shard.access.pop(key, None)
+        shard.used_memory -= self._entry_memory(key, value, expiry)
+
+    def _record_access(self, shard: "_Shard", key: bytes) -> None:
+        if self._access_tracking == "lfu":
+            access = shard.access.get(key)
+            shard.access[key] = lfu_access(access) if access is not None else (lfu_minutes() << 8) | LFU_INIT_VAL
+        else:
+            shard.access[key] = lru_clock()
+
+    def _entry_memory(self, key: bytes, value: bytes | int | Collection, expiry: int | None) -> int:
+        memory = MEMORY_DICT_ENTRY_BYTES + getsizeof(key)
+        memory += value.memory_usage() if isinstance(value, Collection) else getsizeof(value)
+
+        if expiry is not None:
+            memory += MEMORY_EXPIRE_ENTRY_BYTES
+
+        return memory
+
+    def _mark_dirty(self, key: bytes | None) -> None:
+        with self._dirty_lock:
+            self.dirty += 1
+
+        self._writes.count += 1
+
+        if self._watchers:
+            self._touch_watched(key)
+
+    def _touch_watched(self, key: bytes | None) -> None:
+        with self._watch_lock:
+            if key is None:
+                watchers = [transaction for transactions in self._watchers.values() for transaction in transactions]
+            else:
+                watchers = self._watchers.get(key, ())
+
+            for transaction in watchers:
+                transaction.dirty = True
+
+    def load_rdb_file(self, filename: str) -> None:
         with open(filename, "rb") as file:
-            self._check_magic_string(file)
-            self._check_version(file)
-            while True:
-                try:
-                    self._parse_next(file)
-                except StopIteration:
-                    break
-
-    def _check_magic_string(self, file: BufferedReader) -> None:
-        if file.read(5) != b'REDIS':
-            raise Exception("Invalid file format")
-        
-    def _check_version(self, file: BufferedReader) -> None:
-        version_str = file.read(4)
-        version = int(version_str)
-        if version < 1:
-            raise Exception(f"Invalid version: {version}")
-        
-    def _parse_next(self, file: BufferedReader) -> None:
-        opcode = file.read(1)
-
-        match opcode:
-            case b'\xFA':
-                self._parse_aux(file)
-            case b"\xFB":
-                self._parse_resizedb(file)
-            case b"\xFE":
-                self._parse_selectdb(file)
-            case b'\xFD':
-                expiry_s = self._parse_expiry_s(file)
-                file.read(1)
-                self._parse_key_value_pair(file, expiry_s * 1000)
-            case b'\xFC':
-                expiry_ms = self._parse_expiry_ms(file)
-                file.read(1)
-                self._parse_key_value_pair(file, expiry_ms)
-            case b"\x00":
-                self._parse_key_value_pair(file, None)
-            case b'\xFF':
-                file.read(8)
-                raise StopIteration
-    
-    def _parse_aux(self, file: BufferedReader) -> None:
-        key = self._parse_string(file)
-        value = self._parse_string(file)
-        print(f"AUX {key}: {value}")
+            if os.fstat(file.fileno()).st_size == 0:
+                raise Exception("Invalid file format")
 
-    def _parse_resizedb(self, file: BufferedReader) -> None:
-        db_size = self._parse_length(file)
-        expiry_size = self._parse_length(file)
+            with mmap(file.fileno(), 0, access=ACCESS_READ) as data:
+                with memoryview(data) as view:
+                    self.load_rdb(view)
 
-        print(f"db_size: {db_size}")
-        print(f"expiry_size: {expiry_size}")
+    def load_rdb(self, data: bytes | memoryview) -> None:
+        reader = RDBReader(data)
+        skipped = 0
 
-    def _parse_selectdb(self, file: BufferedReader) -> None:
-        db_number = self._parse_length(file)
+        for db, key, value_type, value, expiry_ms in reader.entries():
+            if db != 0:
+                skipped += 1
+                continue
 
-        print(f"db_number: {db_number}")
+            if value_type == "stream":
+                value = self._stream_from_rdb(value)
+            elif value_type != "string":
+                value = collection_from_rdb(value_type, value)
+            elif isinstance(value, bytes):
+                value = encode_int(value)
 
-    def _parse_expiry_ms(self, file: BufferedReader) -> int:
-        bytes = file.read(8)
-        expiry = unpack('<Q', bytes)[0]
+            slot_data, shard = self._locate(key)
+            self._insert(slot_data, shard, key, value, expiry_ms)
 
-        return expiry
-    
-    def _parse_expiry_s(self, file: BufferedReader) -> int:
-        bytes = file.read(4)
-        expiry = unpack('<I', bytes)[0]
+        logger.notice("loaded RDB version %d: %d keys, resize hints %s, %d skipped", reader.version, len(self), reader.resize_hints, skipped)
+
+    def _stream_from_rdb(self, value: dict) -> Stream:
+        stream = Stream()
+
+        for entry_id, fields in value["entries"]:
+            stream.append(entry_id, fields)
+
+        stream.restore_rdb(value)
+
+        return stream
+
+class _Shard:
+    def __init__(self) -> None:
+        self.lock = RLock()
+        self.expires = {}
+        self.access = {}
+        self.expiry_index = []
+        self.used_memory = 0
+
+class _WriteCounter(local):
+    count = 0
+
+def type_name(value: bytes | int | Collection) -> str:
+    return value.type_name if isinstance(value, Collection) else "string"
+
+def lru_clock() -> int:
+    return int(monotonic() * 1000)
+
+def lfu_minutes() -> int:
+    return int(monotonic() / 60)
+
+def lfu_counter(access: int) -> int:
+    counter = access & 0xFF
+    periods = (lfu_minutes() - (access >> 8)) // LFU_DECAY_TIME_MINUTES
+
+    return max(0, counter - periods)
 
-        return expiry
+def lfu_access(access: int) -> int:
+    counter = lfu_counter(access)
 
-    def _parse_key_value_pair(self, file: BufferedReader, expiry_ms: int | None) -> None:
-        key = self._parse_string(file)
-        value = self._parse_string(file)
+    if counter < 0xFF and random() < 1 / (max(0, counter - LFU_INIT_VAL) * LFU_LOG_FACTOR + 1):
+        counter += 1
 
-        self._data[key] = (value, expiry_ms)
+    return (lfu_minutes() << 8) | counter
 
-    def _parse_string(self, file: BufferedReader) -> str | int:
-        length = self._parse_length(file)
+def key_slot(key: bytes) -> int:
+    start = key.find(b"{")
 
-        if length > 0:
-            return file.read(length).decode()
-        
-        byte = file.read(1)
-        return unpack("B", byte)[0]
+    if start >= 0:
+        end = key.find(b"}", start + 1)
 
-    def _parse_length(self, file: BufferedReader) -> int:
-        byte = file.read(1)
-        
-        length = unpack("B", byte)[0]
-        bits = length >> 6
+        if end > start + 1:
+            key = key[start + 1:end]
 
-        return length if bits == 0b00 else -1
\ No newline at end of file
+    return crc_hqx(key, 0) & (KEYSPACE_SLOTS - 1)
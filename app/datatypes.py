@@ -0,0 +1,376 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from itertools import islice
+from operator import itemgetter
+from sys import getsizeof
+from app.constants import *
+
+_limits = dict(ENCODING_LIMIT_DEFAULTS)
+_score = itemgetter(0)
+
+def configure(config: dict) -> None:
+    for name in ENCODING_LIMIT_DEFAULTS:
+        _limits[name] = config[name]
+
+class Collection:
+    type_name = ""
+
+    def __init__(self) -> None:
+        self._memory = getsizeof(self)
+        self._accounted_memory = 0
+
+    def memory_usage(self) -> int:
+        return self._memory
+
+    def memory_growth(self) -> int:
+        growth = self._memory - self._accounted_memory
+        self._accounted_memory = self._memory
+        return growth
+
+class Hash(Collection):
+    type_name = "hash"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.encoding = "listpack"
+        self._fields = []
+        self._values = []
+        self._table = None
+        self._memory += getsizeof(self._fields) + getsizeof(self._values)
+
+    def __len__(self) -> int:
+        return len(self._fields) if self._table is None else len(self._table)
+
+    def get(self, field: bytes) -> bytes | None:
+        if self._table is not None:
+            return self._table.get(field)
+
+        try:
+            return self._values[self._fields.index(field)]
+        except ValueError:
+            return None
+
+    def set(self, field: bytes, value: bytes) -> bool:
+        if self._table is not None:
+            current = self._table.get(field)
+            self._table[field] = value
+
+            if current is None:
+                self._memory += element_memory(field) + element_memory(value)
+            else:
+                self._memory += getsizeof(value) - getsizeof(current)
+
+            return current is None
+
+        try:
+            i = self._fields.index(field)
+        except ValueError:
+            i = None
+
+        if i is None:
+            self._fields.append(field)
+            self._values.append(value)
+            self._memory += element_memory(field) + element_memory(value)
+        else:
+            self._memory += getsizeof(value) - getsizeof(self._values[i])
+            self._values[i] = value
+
+        if len(self._fields) > _limits[HASH_MAX_LISTPACK_ENTRIES] or max(len(field), len(value)) > _limits[HASH_MAX_LISTPACK_VALUE]:
+            self._convert()
+
+        return i is None
+
+    def delete(self, field: bytes) -> bool:
+        if self._table is not None:
+            value = self._table.pop(field, None)
+        else:
+            try:
+                i = self._fields.index(field)
+            except ValueError:
+                return False
+
+            del self._fields[i]
+            value = self._values.pop(i)
+
+        if value is None:
+            return False
+
+        self._memory -= element_memory(field) + element_memory(value)
+        return True
+
+    def items(self) -> list[bytes]:
+        pairs = zip(self._fields, self._values) if self._table is None else self._table.items()
+        return [element for pair in pairs for element in pair]
+
+    def to_rdb(self) -> tuple[str, list[bytes]]:
+        return self.encoding, self.items()
+
+    def _convert(self) -> None:
+        self._table = dict(zip(self._fields, self._values))
+        self._memory += getsizeof(self._table) - getsizeof(self._fields) - getsizeof(self._values)
+        self._fields = self._values = None
+        self.encoding = "hashtable"
+
+class List(Collection):
+    type_name = "list"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.encoding = "listpack"
+        self._items = []
+        self._memory += getsizeof(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def push(self, values: list[bytes], left: bool) -> int:
+        if not left:
+            self._items.extend(values)
+        elif self._items.__class__ is deque:
+            self._items.extendleft(values)
+        else:
+            self._items[0:0] = values[::-1]
+
+        self._memory += sum([element_memory(value) for value in values])
+
+        if self._items.__class__ is list and len(self._items) > _limits[LIST_MAX_LISTPACK_SIZE]:
+            self._convert(deque, "quicklist")
+
+        return len(self._items)
+
+    def pop(self, left: bool) -> bytes | None:
+        if not self._items:
+            return None
+
+        if self._items.__class__ is deque:
+            value = self._items.popleft() if left else self._items.pop()
+
+            if len(self._items) <= _limits[LIST_MAX_LISTPACK_SIZE] // 2:
+                self._convert(list, "listpack")
+        else:
+            value = self._items.pop(0 if left else -1)
+
+        self._memory -= element_memory(value)
+        return value
+
+    def range(self, start: int, stop: int) -> list[bytes]:
+        if self._items.__class__ is list:
+            return self._items[start:stop]
+
+        return list(islice(self._items, start, stop))
+
+    def items(self) -> list[bytes]:
+        return list(self._items)
+
+    def to_rdb(self) -> tuple[str, list[bytes]]:
+        return self.encoding, self.items()
+
+    def _convert(self, container: type, encoding: str) -> None:
+        memory = getsizeof(self._items)
+        self._items = container(self._items)
+        self._memory += getsizeof(self._items) - memory
+        self.encoding = encoding
+
+class Set(Collection):
+    type_name = "set"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.encoding = "intset"
+        self._members = []
+        self._memory += getsizeof(self._members)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def contains(self, member: bytes) -> bool:
+        if self.encoding != "intset":
+            return member in self._members
+
+        number = encode_int(member)
+
+        if number.__class__ is not int:
+            return False
+
+        i = bisect_left(self._members, number)
+        return i < len(self._members) and self._members[i] == number
+
+    def add(self, member: bytes) -> bool:
+        if self.encoding == "intset":
+            number = encode_int(member)
+
+            if number.__class__ is int:
+                i = bisect_left(self._members, number)
+
+                if i < len(self._members) and self._members[i] == number:
+                    return False
+
+                self._members.insert(i, number)
+                self._memory += element_memory(number)
+
+                if len(self._members) > _limits[SET_MAX_INTSET_ENTRIES]:
+                    self._convert("hashtable")
+
+                return True
+
+            small = len(self._members) < _limits[SET_MAX_LISTPACK_ENTRIES] and len(member) <= _limits[SET_MAX_LISTPACK_VALUE]
+            self._convert("listpack" if small else "hashtable")
+
+        if member in self._members:
+            return False
+
+        if self.encoding == "listpack":
+            self._members.append(member)
+        else:
+            self._members.add(member)
+
+        self._memory += element_memory(member)
+
+        if self.encoding == "listpack" and (len(self._members) > _limits[SET_MAX_LISTPACK_ENTRIES] or len(member) > _limits[SET_MAX_LISTPACK_VALUE]):
+            self._convert("hashtable")
+
+        return True
+
+    def remove(self, member: bytes) -> bool:
+        if not self.contains(member):
+            return False
+
+        if self.encoding == "intset":
+            member = encode_int(member)
+            del self._members[bisect_left(self._members, member)]
+        else:
+            self._members.remove(member)
+
+        self._memory -= element_memory(member)
+        return True
+
+    def members(self) -> list[bytes]:
+        if self.encoding == "intset":
+            return [b"%d" % number for number in self._members]
+
+        return list(self._members)
+
+    def to_rdb(self) -> tuple[str, list[bytes] | list[int]]:
+        return self.encoding, list(self._members) if self.encoding == "intset" else self.members()
+
+    def _convert(self, encoding: str) -> None:
+        memory = getsizeof(self._members)
+        members = self.members()
+        self._members = members if encoding == "listpack" else set(members)
+        self._memory += getsizeof(self._members) - memory
+        self.encoding = encoding
+
+class SortedSet(Collection):
+    type_name = "zset"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.encoding = "listpack"
+        self._entries = []
+        self._scores = None
+        self._memory += getsizeof(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def score(self, member: bytes) -> float | None:
+        if self._scores is not None:
+            return self._scores.get(member)
+
+        for score, entry_member in self._entries:
+            if entry_member == member:
+                return score
+
+        return None
+
+    def add(self, member: bytes, score: float) -> bool:
+        current = self.score(member)
+
+        if current == score:
+            return False
+
+        if current is None:
+            self._memory += element_memory(member) + MEMORY_ZSET_ENTRY_BYTES
+        else:
+            del self._entries[bisect_left(self._entries, (current, member))]
+
+        insort(self._entries, (score, member))
+
+        if self._scores is not None:
+            self._scores[member] = score
+        elif len(self._entries) > _limits[ZSET_MAX_LISTPACK_ENTRIES] or len(member) > _limits[ZSET_MAX_LISTPACK_VALUE]:
+            self._scores = {entry_member: entry_score for entry_score, entry_member in self._entries}
+            self._memory += getsizeof(self._scores)
+            self.encoding = "skiplist"
+
+        return current is None
+
+    def remove(self, member: bytes) -> bool:
+        score = self.score(member)
+
+        if score is None:
+            return False
+
+        del self._entries[bisect_left(self._entries, (score, member))]
+
+        if self._scores is not None:
+            del self._scores[member]
+
+        self._memory -= element_memory(member) + MEMORY_ZSET_ENTRY_BYTES
+        return True
+
+    def rank(self, member: bytes) -> int | None:
+        score = self.score(member)
+        return bisect_left(self._entries, (score, member)) if score is not None else None
+
+    def range(self, start: int, stop: int) -> list[tuple[float, bytes]]:
+        return self._entries[start:stop]
+
+    def score_range(self, low: float, high: float, low_exclusive: bool, high_exclusive: bool) -> tuple[int, int]:
+        start = (bisect_right if low_exclusive else bisect_left)(self._entries, low, key=_score)
+        stop = (bisect_left if high_exclusive else bisect_right)(self._entries, high, key=_score)
+
+        return start, max(start, stop)
+
+    def to_rdb(self) -> tuple[str, list[tuple[bytes, float]]]:
+        return self.encoding, [(member, score) for score, member in self._entries]
+
+def element_memory(value: bytes | int) -> int:
+    return getsizeof(value) + MEMORY_POINTER_BYTES
+
+def collection_from_rdb(value_type: str, value: object) -> Collection:
+    if value_type == "hash":
+        collection = Hash()
+
+        for field, field_value in value.items():
+            collection.set(field, field_value)
+    elif value_type == "list":
+        collection = List()
+        collection.push(value, False)
+    elif value_type == "set":
+        collection = Set()
+
+        for member in value:
+            collection.add(member)
+    else:
+        collection = SortedSet()
+
+        for member, score in value.items():
+            collection.add(member, score)
+
+    return collection
+
+def encode_int(value: bytes) -> bytes | int:
+    if 0 < len(value) <= 20 and (value[0] == 0x2D or 0x30 <= value[0] <= 0x39):
+        try:
+            number = int(value)
+        except ValueError:
+            return value
+
+        if INT64_MIN <= number <= INT64_MAX and b"%d" % number == value:
+            return number
+
+    return value
+
+def decode_int(value: bytes | int) -> bytes:
+    return b"%d" % value if isinstance(value, int) else value
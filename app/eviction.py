@@ -0,0 +1,77 @@
+from bisect import insort
+from threading import Lock
+from app.constants import *
+from app.database import Database, lfu_counter, lru_clock
+
+class Evictor:
+    def __init__(self, config: dict, database: Database) -> None:
+        self._config = config
+        self._database = database
+        self._pool = []
+        self._policy = None
+        self._lock = Lock()
+
+    def evict(self) -> tuple[list[bytes], bool]:
+        maxmemory = self._config[MAXMEMORY]
+        evicted = []
+
+        with self._lock:
+            self._sync_policy()
+
+            if not maxmemory or self._database.used_memory() <= maxmemory:
+                return evicted, True
+
+            if self._policy == "noeviction":
+                return evicted, False
+
+            while self._database.used_memory() > maxmemory:
+                key = self._next_victim()
+
+                if key is None:
+                    return evicted, False
+
+                if self._database.evict(key):
+                    evicted.append(key)
+
+            return evicted, True
+
+    def _sync_policy(self) -> None:
+        policy = self._config[MAXMEMORY_POLICY]
+
+        if policy == self._policy:
+            return
+
+        self._policy = policy
+        self._pool = []
+
+        if policy.endswith("-lru"):
+            self._database.set_access_tracking("lru")
+        elif policy.endswith("-lfu"):
+            self._database.set_access_tracking("lfu")
+        else:
+            self._database.set_access_tracking(None)
+
+    def _next_victim(self) -> bytes | None:
+        volatile = self._policy.startswith("volatile-")
+        samples = self._database.sample(1 if self._policy == "allkeys-random" else self._config[MAXMEMORY_SAMPLES], volatile)
+
+        if self._policy == "allkeys-random":
+            return samples[0][0] if samples else None
+
+        pooled = {key for _, key in self._pool}
+
+        for key, expiry, access in samples:
+            if key not in pooled:
+                insort(self._pool, (self._score(expiry, access), key))
+
+        del self._pool[:-EVICTION_POOL_SIZE]
+
+        return self._pool.pop()[1] if self._pool else None
+
+    def _score(self, expiry: int | None, access: int) -> int:
+        if self._policy == "volatile-ttl":
+            return -expiry
+        elif self._policy.endswith("-lfu"):
+            return 0xFF - lfu_counter(access)
+
+        return lru_clock() - access
@@ -0,0 +1,37 @@
+from time import time, localtime, strftime
+from app.constants import LOG_LEVELS
+import os
+
+DEBUG, VERBOSE, NOTICE, WARNING = range(len(LOG_LEVELS))
+
+_MARKERS = ".-*#"
+_level = NOTICE
+
+def set_level(name: str) -> None:
+    global _level
+    _level = LOG_LEVELS.index(name)
+
+def is_enabled(level: int) -> bool:
+    return level >= _level
+
+def debug(message: str, *args: object) -> None:
+    if _level <= DEBUG:
+        _log(DEBUG, message, args)
+
+def verbose(message: str, *args: object) -> None:
+    if _level <= VERBOSE:
+        _log(VERBOSE, message, args)
+
+def notice(message: str, *args: object) -> None:
+    if _level <= NOTICE:
+        _log(NOTICE, message, args)
+
+def warning(message: str, *args: object) -> None:
+    if _level <= WARNING:
+        _log(WARNING, message, args)
+
+def _log(level: int, message: str, args: tuple[object, ...]) -> None:
+    now = time()
+    timestamp = strftime("%d %b %Y %H:%M:%S", localtime(now)) + ".%03d" % (now * 1000 % 1000)
+
+    print(f"{os.getpid()}:{timestamp} {_MARKERS[level]} {message % args if args else message}", flush=True)
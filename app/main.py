@@ -1,8 +1,17 @@
 import argparse
 from app.server import Server
 from app.constants import *
+from app import logger, datatypes
 import os
+import secrets
+import shutil
+import signal
+import sys
+import tempfile
 from app.database import Database
+from app.persistence import rdb_path
+from app.command_handlers import parse_memory
+from app.workers import WorkerRouter, listen_worker_socket, worker_filename
 
 def main():
     parser = argparse.ArgumentParser(description="Redis clone")
@@ -11,8 +20,36 @@ def main():
     parser.add_argument("--replicaof", nargs=2)
     parser.add_argument("--dir", help="The directory where RDB files are stored")
     parser.add_argument("--dbfilename", help="The name of the RDB file")
+    parser.add_argument("--save", default="", help="Snapshot rules as '<seconds> <changes>' pairs, e.g. '900 1 300 10'")
+    parser.add_argument("--appendonly", choices=["yes", "no"], default="no", help="Log every write command to an append only file")
+    parser.add_argument("--appendfsync", choices=[APPENDFSYNC_ALWAYS, APPENDFSYNC_EVERYSEC, APPENDFSYNC_NO], default=APPENDFSYNC_EVERYSEC, help="How often the append only file is fsynced")
+    parser.add_argument("--appendfilename", default=DEFAULT_APPENDFILENAME, help="The name of the append only file")
+    parser.add_argument("--repl-backlog-size", type=int, default=1024 * 1024, help="Size in bytes of the replication backlog used for partial resyncs")
+    parser.add_argument("--client-output-buffer-limit-replica", nargs=3, type=int, default=[256 * 1024 * 1024, 64 * 1024 * 1024, 60], metavar=("HARD", "SOFT", "SECONDS"), help="Disconnect a replica whose output buffer exceeds HARD bytes, or stays over SOFT bytes for SECONDS")
+    parser.add_argument("--maxmemory", default="0", help="Memory limit for the dataset, e.g. 100mb; 0 means no limit")
+    parser.add_argument("--maxmemory-policy", choices=MAXMEMORY_POLICIES, default="noeviction", help="How keys are chosen for eviction once maxmemory is reached")
+    parser.add_argument("--maxmemory-samples", type=int, default=5, help="How many keys are sampled per eviction")
+    parser.add_argument("--hz", type=int, default=10, help="How many times per second background tasks such as active expiry run")
+    parser.add_argument("--active-expire-cpu", type=int, default=25, help="Percentage of each background tick active expiry may spend")
+    parser.add_argument("--event-loop", action="store_true", help="Serve all clients from a single-threaded event loop")
+    parser.add_argument("--loglevel", choices=LOG_LEVELS, default="notice", help="Log verbosity; debug logs every request")
+    parser.add_argument("--slowlog-log-slower-than", type=int, default=10000, help="Log commands slower than this many microseconds to the SLOWLOG; negative disables it")
+    parser.add_argument("--slowlog-max-len", type=int, default=128, help="Number of entries kept in the SLOWLOG")
+    parser.add_argument("--hash-max-listpack-entries", type=int, default=ENCODING_LIMIT_DEFAULTS[HASH_MAX_LISTPACK_ENTRIES], help="Hashes with more fields are converted from a listpack to a hash table")
+    parser.add_argument("--hash-max-listpack-value", type=int, default=ENCODING_LIMIT_DEFAULTS[HASH_MAX_LISTPACK_VALUE], help="Hashes with a longer field or value are converted from a listpack to a hash table")
+    parser.add_argument("--list-max-listpack-size", type=int, default=ENCODING_LIMIT_DEFAULTS[LIST_MAX_LISTPACK_SIZE], help="Lists with more elements are converted from a listpack to a quicklist")
+    parser.add_argument("--set-max-intset-entries", type=int, default=ENCODING_LIMIT_DEFAULTS[SET_MAX_INTSET_ENTRIES], help="Integer sets with more members are converted from an intset to a hash table")
+    parser.add_argument("--set-max-listpack-entries", type=int, default=ENCODING_LIMIT_DEFAULTS[SET_MAX_LISTPACK_ENTRIES], help="Sets with more members are converted from a listpack to a hash table")
+    parser.add_argument("--set-max-listpack-value", type=int, default=ENCODING_LIMIT_DEFAULTS[SET_MAX_LISTPACK_VALUE], help="Sets with a longer member are converted from a listpack to a hash table")
+    parser.add_argument("--zset-max-listpack-entries", type=int, default=ENCODING_LIMIT_DEFAULTS[ZSET_MAX_LISTPACK_ENTRIES], help="Sorted sets with more members are converted from a listpack to a skiplist")
+    parser.add_argument("--zset-max-listpack-value", type=int, default=ENCODING_LIMIT_DEFAULTS[ZSET_MAX_LISTPACK_VALUE], help="Sorted sets with a longer member are converted from a listpack to a skiplist")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes sharing the port, each owning a slice of the keyspace")
 
     args = parser.parse_args()
+    logger.set_level(args.loglevel)
+
+    if args.workers > 1 and args.replicaof:
+        parser.error("--replicaof is not supported with multiple workers")
 
     leader_host, leader_port, rdb_dir, rdb_filename = None, None, None, None
 
@@ -25,30 +62,107 @@ def main():
     if args.dbfilename:
         rdb_filename = args.dbfilename.rstrip()
 
+    save_rules = [int(n) for n in args.save.split()]
+
     config = {
         ROLE:  FOLLOWER_ROLE if args.replicaof else LEADER_ROLE,
         LEADER_HOST: leader_host,
         LEADER_PORT: int(leader_port) if leader_port else leader_port,
-        REPLID: "8371b4fb1155b71f4a04d3e1bc3e18c4a990aeeb",
+        REPLID: secrets.token_hex(20),
         REPLOFFSET: 0,
+        REPL_BACKLOG_SIZE: args.repl_backlog_size,
+        REPLICA_OUTPUT_BUFFER_LIMIT: tuple(args.client_output_buffer_limit_replica),
         RDB_DIR: rdb_dir,
         RDB_FILENAME: rdb_filename,
+        APPENDONLY: args.appendonly == "yes",
+        APPENDFSYNC: args.appendfsync,
+        APPENDFILENAME: args.appendfilename,
+        SAVE_RULES: list(zip(save_rules[0::2], save_rules[1::2])),
+        HZ: args.hz,
+        ACTIVE_EXPIRE_CPU: args.active_expire_cpu,
+        MAXMEMORY: parse_memory(args.maxmemory),
+        MAXMEMORY_POLICY: args.maxmemory_policy,
+        MAXMEMORY_SAMPLES: args.maxmemory_samples,
+        WORKERS: args.workers,
+        LOGLEVEL: args.loglevel,
+        SLOWLOG_LOG_SLOWER_THAN: args.slowlog_log_slower_than,
+        SLOWLOG_MAX_LEN: args.slowlog_max_len,
     }
 
+    for name in ENCODING_LIMIT_DEFAULTS:
+        config[name] = getattr(args, name.replace("-", "_"))
+
+    datatypes.configure(config)
+
+    if args.workers > 1:
+        run_workers(args, config)
+    else:
+        serve(args, config)
+
+def serve(args: argparse.Namespace, config: dict, router: WorkerRouter | None = None) -> None:
     filename = None
+    aof_filename = os.path.join(config[RDB_DIR] or DEFAULT_RDB_DIR, config[APPENDFILENAME])
+    use_aof = config[APPENDONLY] and os.path.isfile(aof_filename)
 
-    if rdb_dir and rdb_filename:
-        filename = os.path.join(rdb_dir, rdb_filename)
-        print(f"filename: {filename}")
+    if not use_aof:
+        filename = rdb_path(config)
+        logger.notice("filename: %s", filename)
         filename = filename if os.path.isfile(filename) else None
-        
+
     database = Database(filename)
-    server = Server(config, database)
+    server = Server(config, database, router)
+    server.replay_aof()
+    server.open_aof()
 
     try:
-        server.start(args.port)
+        if args.event_loop:
+            server.start_event_loop(args.port)
+        else:
+            server.start(args.port)
     except KeyboardInterrupt:
-        print("\nCaught KeyboardInterrupt. Shutting down.")
+        logger.warning("Caught KeyboardInterrupt. Shutting down.")
+
+def run_workers(args: argparse.Namespace, config: dict) -> None:
+    socket_dir = tempfile.mkdtemp(prefix="redis-workers-")
+    listeners = [listen_worker_socket(socket_dir, worker) for worker in range(args.workers)]
+    pids = []
+
+    for worker in range(args.workers):
+        pid = os.fork()
+
+        if pid == 0:
+            for other, listener in enumerate(listeners):
+                if other != worker:
+                    listener.close()
+
+            worker_config = dict(config)
+            worker_config[WORKER_ID] = worker
+            worker_config[WORKER_SOCKET_DIR] = socket_dir
+            worker_config[MAXMEMORY] = config[MAXMEMORY] // args.workers
+            worker_config[RDB_FILENAME] = worker_filename(config[RDB_FILENAME] or DEFAULT_RDB_FILENAME, worker)
+            worker_config[APPENDFILENAME] = worker_filename(config[APPENDFILENAME], worker)
+
+            serve(args, worker_config, WorkerRouter(worker_config, listeners[worker]))
+            os._exit(0)
+
+        pids.append(pid)
+
+    logger.notice("started %d workers: %s", args.workers, pids)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        for pid in pids:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        logger.warning("Caught KeyboardInterrupt. Shutting down workers.")
+    finally:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        shutil.rmtree(socket_dir, ignore_errors=True)
 
 if __name__ == "__main__":
     main()
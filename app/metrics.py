@@ -0,0 +1,154 @@
+from collections import deque
+from threading import Lock
+from time import time
+from app.constants import *
+
+HISTOGRAM_SUB_BUCKETS = 1 << LATENCY_HISTOGRAM_SUB_BUCKET_BITS
+HISTOGRAM_HALF_BUCKETS = HISTOGRAM_SUB_BUCKETS // 2
+HISTOGRAM_BUCKETS = HISTOGRAM_SUB_BUCKETS + (LATENCY_HISTOGRAM_MAX_USEC_BITS - LATENCY_HISTOGRAM_SUB_BUCKET_BITS) * HISTOGRAM_HALF_BUCKETS
+
+class CommandStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.usec = 0
+        self.rejected_calls = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def percentile(self, p: float) -> int:
+        target, seen = max(1, -(-self.calls * p // 100)), 0
+
+        for index, count in enumerate(self.histogram):
+            seen += count
+
+            if seen >= target:
+                return bucket_upper_bound(index)
+
+        return 0
+
+    def cumulative_histogram(self) -> list[int]:
+        buckets, seen, bound = [], 0, 1
+
+        for index, count in enumerate(self.histogram):
+            if not count:
+                continue
+
+            while bucket_upper_bound(index) > bound:
+                if seen:
+                    buckets += [bound, seen]
+
+                bound *= 2
+
+            seen += count
+
+        return buckets + [bound, seen] if seen else buckets
+
+class SlowLog:
+    def __init__(self, config: dict) -> None:
+        self._config = config
+        self._entries = deque()
+        self._next_id = 0
+        self._lock = Lock()
+
+    def add(self, args: list[bytes], usec: int, addr: tuple[str, int]) -> None:
+        if len(args) > SLOWLOG_MAX_ARGC:
+            args = args[:SLOWLOG_MAX_ARGC - 1] + [b"... (%d more arguments)" % (len(args) - SLOWLOG_MAX_ARGC + 1)]
+
+        args = [arg if len(arg) <= SLOWLOG_MAX_ARGLEN else arg[:SLOWLOG_MAX_ARGLEN] + b"... (%d more bytes)" % (len(arg) - SLOWLOG_MAX_ARGLEN) for arg in args]
+        client = f"{addr[0]}:{addr[1]}" if isinstance(addr, tuple) else str(addr or "")
+
+        with self._lock:
+            self._entries.appendleft([self._next_id, int(time()), usec, args, client, ""])
+            self._next_id += 1
+
+            while len(self._entries) > self._config[SLOWLOG_MAX_LEN]:
+                self._entries.pop()
+
+    def get(self, count: int) -> list[list[object]]:
+        with self._lock:
+            return list(self._entries)[:count] if count >= 0 else list(self._entries)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class Metrics:
+    def __init__(self, config: dict) -> None:
+        self._config = config
+        self._commands = {}
+        self._lock = Lock()
+        self.slowlog = SlowLog(config)
+        self.connected_clients = 0
+        self.total_connections_received = 0
+        self.total_net_input_bytes = 0
+        self.total_net_output_bytes = 0
+
+    def record_call(self, command: str, args: list[bytes], elapsed_ns: int, addr: tuple[str, int], blocking: bool) -> None:
+        usec = elapsed_ns // 1000
+
+        with self._lock:
+            stats = self._commands.get(command)
+
+            if stats is None:
+                stats = self._commands[command] = CommandStats()
+
+            stats.calls += 1
+            stats.usec += usec
+            stats.histogram[bucket_index(usec)] += 1
+
+        threshold = self._config[SLOWLOG_LOG_SLOWER_THAN]
+
+        if 0 <= threshold <= usec and not blocking:
+            self.slowlog.add([command.encode(ENCODING)] + args, usec, addr)
+
+    def record_rejected(self, command: str) -> None:
+        with self._lock:
+            stats = self._commands.get(command)
+
+            if stats is None:
+                stats = self._commands[command] = CommandStats()
+
+            stats.rejected_calls += 1
+
+    def connection_opened(self) -> None:
+        with self._lock:
+            self.connected_clients += 1
+            self.total_connections_received += 1
+
+    def connection_closed(self) -> None:
+        with self._lock:
+            self.connected_clients -= 1
+
+    def record_input(self, n: int) -> None:
+        with self._lock:
+            self.total_net_input_bytes += n
+
+    def record_output(self, n: int) -> None:
+        with self._lock:
+            self.total_net_output_bytes += n
+
+    def command_stats(self) -> list[tuple[str, CommandStats]]:
+        with self._lock:
+            return sorted(self._commands.items())
+
+    def total_commands_processed(self) -> int:
+        with self._lock:
+            return sum(stats.calls for stats in self._commands.values())
+
+def bucket_index(usec: int) -> int:
+    if usec < HISTOGRAM_SUB_BUCKETS:
+        return usec
+
+    shift = usec.bit_length() - LATENCY_HISTOGRAM_SUB_BUCKET_BITS
+
+    return min(HISTOGRAM_BUCKETS - 1, HISTOGRAM_SUB_BUCKETS + (shift - 1) * HISTOGRAM_HALF_BUCKETS + (usec >> shift) - HISTOGRAM_HALF_BUCKETS)
+
+def bucket_upper_bound(index: int) -> int:
+    if index < HISTOGRAM_SUB_BUCKETS:
+        return index
+
+    shift, offset = divmod(index - HISTOGRAM_SUB_BUCKETS, HISTOGRAM_HALF_BUCKETS)
+
+    return ((offset + HISTOGRAM_HALF_BUCKETS + 1) << (shift + 1)) - 1
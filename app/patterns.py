@@ -0,0 +1,61 @@
+from functools import lru_cache
+from app.constants import *
+import re
+
+def is_glob_pattern(pattern: bytes) -> bool:
+    return any(c in GLOB_SPECIAL_CHARS for c in pattern)
+
+@lru_cache(maxsize=GLOB_PATTERN_CACHE_SIZE)
+def compile_glob(pattern: bytes) -> re.Pattern:
+    regex, i, n = [], 0, len(pattern)
+
+    while i < n:
+        c = pattern[i:i + 1]
+
+        if c == b"*":
+            while pattern[i + 1:i + 2] == b"*":
+                i += 1
+
+            regex.append(b".*")
+        elif c == b"?":
+            regex.append(b".")
+        elif c == b"[" and pattern.find(b"]", i + 1) > i:
+            char_class, i = _translate_class(pattern, i + 1)
+            regex.append(char_class)
+        elif c == b"\\" and i + 1 < n:
+            i += 1
+            regex.append(re.escape(pattern[i:i + 1]))
+        else:
+            regex.append(re.escape(c))
+
+        i += 1
+
+    return re.compile(b"".join(regex) + b"\\Z", re.DOTALL)
+
+def _translate_class(pattern: bytes, i: int) -> tuple[bytes, int]:
+    negate = pattern[i:i + 1] == b"^"
+
+    if negate:
+        i += 1
+
+    items = []
+
+    while i < len(pattern) and pattern[i:i + 1] != b"]":
+        c = pattern[i:i + 1]
+
+        if c == b"\\" and i + 1 < len(pattern):
+            i += 1
+            c = pattern[i:i + 1]
+
+        if pattern[i + 1:i + 2] == b"-" and i + 2 < len(pattern) and pattern[i + 2:i + 3] != b"]":
+            start, end = sorted([c, pattern[i + 2:i + 3]])
+            items.append(re.escape(start) + b"-" + re.escape(end))
+            i += 3
+        else:
+            items.append(re.escape(c))
+            i += 1
+
+    if not items:
+        return (b"." if negate else b"(?!)"), i
+
+    return b"[" + (b"^" if negate else b"") + b"".join(items) + b"]", i
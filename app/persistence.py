@@ -0,0 +1,100 @@
+from time import time
+from app.constants import *
+from app import logger
+from app.database import Database
+import os
+
+def rdb_path(config: dict) -> str:
+    return os.path.join(config[RDB_DIR] or DEFAULT_RDB_DIR, config[RDB_FILENAME] or DEFAULT_RDB_FILENAME)
+
+class SnapshotManager:
+    def __init__(self, config: dict, database: Database) -> None:
+        self._config = config
+        self._database = database
+        self._child_pid = None
+        self._dirty_at_fork = 0
+        self._last_bgsave_ok = True
+        self._last_bgsave_try = 0
+        self.last_save = int(time())
+
+    def path(self) -> str:
+        return rdb_path(self._config)
+
+    def in_progress(self) -> bool:
+        return self._child_pid is not None
+
+    def save(self) -> None:
+        with self._database.locked(None):
+            dirty = self._database.dirty
+            self._write(self.path())
+            self._database.subtract_dirty(dirty)
+        self.last_save = int(time())
+
+    def background_save(self) -> bool:
+        if self.in_progress():
+            return False
+
+        self._last_bgsave_try = time()
+
+        with self._database.locked(None):
+            dirty = self._database.dirty
+            pid = self.fork_dump(self.path())
+
+        logger.notice("background saving started by pid %d", pid)
+        self._child_pid, self._dirty_at_fork = pid, dirty
+        return True
+
+    def fork_dump(self, path: str) -> int:
+        pid = os.fork()
+
+        if pid == 0:
+            try:
+                self._write(path)
+                os._exit(0)
+            except BaseException:
+                os._exit(1)
+
+        return pid
+
+    def temp_path(self, filename: str) -> str:
+        return os.path.join(os.path.dirname(self.path()) or ".", filename)
+
+    def cron(self) -> None:
+        if self.in_progress():
+            self._reap_child()
+            return
+
+        if not self._last_bgsave_ok and time() - self._last_bgsave_try < BGSAVE_RETRY_DELAY_S:
+            return
+
+        for seconds, changes in self._config[SAVE_RULES]:
+            if self._database.dirty >= changes and time() - self.last_save >= seconds:
+                logger.notice("%d changes in %d seconds. Saving...", changes, seconds)
+                self.background_save()
+                break
+
+    def _reap_child(self) -> None:
+        pid, status = os.waitpid(self._child_pid, os.WNOHANG)
+
+        if pid == 0:
+            return
+
+        self._child_pid = None
+        self._last_bgsave_ok = os.waitstatus_to_exitcode(status) == 0
+
+        if self._last_bgsave_ok:
+            self._database.subtract_dirty(self._dirty_at_fork)
+            self.last_save = int(time())
+            logger.notice("background saving terminated with success")
+        else:
+            logger.warning("background saving error")
+
+    def _write(self, path: str) -> None:
+        temp_path = self.temp_path(f"temp-{os.getpid()}.rdb")
+
+        with open(temp_path, "wb") as file:
+            self._database.dump_rdb(file)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp_path, path)
@@ -0,0 +1,623 @@
+from struct import pack, unpack_from
+from time import time
+from typing import BinaryIO, Iterable, Iterator
+from app.constants import *
+
+class RDBReader:
+    def __init__(self, data: bytes | memoryview) -> None:
+        self._data = memoryview(data)
+        self._pos = 0
+        self.version = 0
+        self.aux = {}
+        self.resize_hints = {}
+
+    def entries(self) -> Iterator[tuple[int, bytes, str, object, int | None]]:
+        self._check_header()
+
+        db, expiry_ms = 0, None
+
+        while True:
+            opcode = self._read_byte()
+
+            if opcode == RDB_OPCODE_EOF:
+                return
+            elif opcode == RDB_OPCODE_AUX:
+                key = self._read_string()
+                self.aux[key] = self._read_string()
+            elif opcode == RDB_OPCODE_RESIZEDB:
+                self.resize_hints[db] = (self._read_length(), self._read_length())
+            elif opcode == RDB_OPCODE_SELECTDB:
+                db = self._read_length()
+            elif opcode == RDB_OPCODE_EXPIRETIME_MS:
+                expiry_ms = unpack_from("<Q", self._take(8))[0]
+            elif opcode == RDB_OPCODE_EXPIRETIME:
+                expiry_ms = unpack_from("<I", self._take(4))[0] * 1000
+            elif opcode == RDB_OPCODE_FREQ:
+                self._take(1)
+            elif opcode == RDB_OPCODE_IDLE:
+                self._read_length()
+            elif opcode == RDB_OPCODE_FUNCTION2:
+                self._read_string()
+            elif opcode in (RDB_OPCODE_MODULE_AUX, RDB_TYPE_MODULE, RDB_TYPE_MODULE_2):
+                raise Exception("RDB files containing module data are not supported")
+            else:
+                key = self._read_string()
+                value_type, value = self._read_value(opcode)
+                yield db, key, value_type, value, expiry_ms
+                expiry_ms = None
+
+    def _check_header(self) -> None:
+        if bytes(self._take(5)) != b'REDIS':
+            raise Exception("Invalid file format")
+
+        self.version = int(bytes(self._take(4)))
+
+        if self.version < 1:
+            raise Exception(f"Invalid version: {self.version}")
+
+    def _take(self, n: int) -> memoryview:
+        start = self._pos
+        self._pos += n
+
+        if self._pos > len(self._data):
+            raise Exception("Unexpected end of RDB file")
+
+        return self._data[start:self._pos]
+
+    def _read_byte(self) -> int:
+        byte = self._data[self._pos]
+        self._pos += 1
+        return byte
+
+    def _read_length_or_encoding(self) -> tuple[int, bool]:
+        byte = self._read_byte()
+        bits = byte >> 6
+
+        if bits == 0b00:
+            return byte & 0x3F, False
+        elif bits == 0b01:
+            return ((byte & 0x3F) << 8) | self._read_byte(), False
+        elif byte == 0x80:
+            return unpack_from(">I", self._take(4))[0], False
+        elif byte == 0x81:
+            return unpack_from(">Q", self._take(8))[0], False
+        elif bits == 0b11:
+            return byte & 0x3F, True
+
+        raise Exception(f"Unknown length encoding: {byte:#x}")
+
+    def _read_length(self) -> int:
+        length, encoded = self._read_length_or_encoding()
+
+        if encoded:
+            raise Exception("Unexpected string encoding where a length was expected")
+
+        return length
+
+    def _read_string(self) -> bytes:
+        length, encoded = self._read_length_or_encoding()
+
+        if not encoded:
+            return bytes(self._take(length))
+
+        if length == RDB_ENC_INT8:
+            return b"%d" % unpack_from("<b", self._take(1))[0]
+        elif length == RDB_ENC_INT16:
+            return b"%d" % unpack_from("<h", self._take(2))[0]
+        elif length == RDB_ENC_INT32:
+            return b"%d" % unpack_from("<i", self._take(4))[0]
+        elif length == RDB_ENC_LZF:
+            compressed_length = self._read_length()
+            uncompressed_length = self._read_length()
+            return lzf_decompress(self._take(compressed_length), uncompressed_length)
+
+        raise Exception(f"Unknown string encoding: {length}")
+
+    def _read_double(self) -> float:
+        length = self._read_byte()
+
+        if length == 253:
+            return float("nan")
+        elif length == 254:
+            return float("inf")
+        elif length == 255:
+            return float("-inf")
+
+        return float(bytes(self._take(length)))
+
+    def _read_value(self, value_type: int) -> tuple[str, object]:
+        if value_type == RDB_TYPE_STRING:
+            return "string", self._read_string()
+        elif value_type == RDB_TYPE_LIST:
+            return "list", [self._read_string() for _ in range(self._read_length())]
+        elif value_type == RDB_TYPE_SET:
+            return "set", {self._read_string() for _ in range(self._read_length())}
+        elif value_type == RDB_TYPE_ZSET:
+            return "zset", {self._read_string(): self._read_double() for _ in range(self._read_length())}
+        elif value_type == RDB_TYPE_ZSET_2:
+            return "zset", {self._read_string(): unpack_from("<d", self._take(8))[0] for _ in range(self._read_length())}
+        elif value_type == RDB_TYPE_HASH:
+            return "hash", {self._read_string(): self._read_string() for _ in range(self._read_length())}
+        elif value_type == RDB_TYPE_HASH_ZIPMAP:
+            return "hash", _pairs_to_dict(parse_zipmap(self._read_string()))
+        elif value_type == RDB_TYPE_LIST_ZIPLIST:
+            return "list", parse_ziplist(self._read_string())
+        elif value_type == RDB_TYPE_SET_INTSET:
+            return "set", set(parse_intset(self._read_string()))
+        elif value_type == RDB_TYPE_SET_LISTPACK:
+            return "set", set(parse_listpack(self._read_string()))
+        elif value_type == RDB_TYPE_ZSET_ZIPLIST:
+            return "zset", _pairs_to_zset(parse_ziplist(self._read_string()))
+        elif value_type == RDB_TYPE_ZSET_LISTPACK:
+            return "zset", _pairs_to_zset(parse_listpack(self._read_string()))
+        elif value_type == RDB_TYPE_HASH_ZIPLIST:
+            return "hash", _pairs_to_dict(parse_ziplist(self._read_string()))
+        elif value_type == RDB_TYPE_HASH_LISTPACK:
+            return "hash", _pairs_to_dict(parse_listpack(self._read_string()))
+        elif value_type == RDB_TYPE_LIST_QUICKLIST:
+            return "list", [e for _ in range(self._read_length()) for e in parse_ziplist(self._read_string())]
+        elif value_type == RDB_TYPE_LIST_QUICKLIST_2:
+            return "list", self._read_quicklist_2()
+        elif value_type in (RDB_TYPE_STREAM_LISTPACKS, RDB_TYPE_STREAM_LISTPACKS_2, RDB_TYPE_STREAM_LISTPACKS_3):
+            return "stream", self._read_stream(value_type)
+
+        raise Exception(f"Unknown RDB value type: {value_type}")
+
+    def _read_quicklist_2(self) -> list[bytes]:
+        elements = []
+
+        for _ in range(self._read_length()):
+            container = self._read_length()
+            node = self._read_string()
+
+            if container == RDB_QUICKLIST_NODE_PLAIN:
+                elements.append(node)
+            else:
+                elements.extend(parse_listpack(node))
+
+        return elements
+
+    def _read_stream(self, value_type: int) -> dict:
+        entries = []
+
+        for _ in range(self._read_length()):
+            master_id = self._read_string()
+            master_ms, master_seq = unpack_from(">QQ", master_id)
+            entries.extend(_parse_stream_listpack(parse_listpack(self._read_string()), master_ms, master_seq))
+
+        self._read_length()
+        last_id = (self._read_length(), self._read_length())
+
+        max_deleted_id, entries_added = (0, 0), len(entries)
+
+        if value_type != RDB_TYPE_STREAM_LISTPACKS:
+            self._read_length()
+            self._read_length()
+            max_deleted_id = (self._read_length(), self._read_length())
+            entries_added = self._read_length()
+
+        groups = []
+
+        for _ in range(self._read_length()):
+            name = self._read_string()
+            group_last_id = (self._read_length(), self._read_length())
+            entries_read = self._read_length() if value_type != RDB_TYPE_STREAM_LISTPACKS else None
+
+            if entries_read == STREAM_ID_MAX:
+                entries_read = None
+
+            pending = {}
+
+            for _ in range(self._read_length()):
+                entry_id = unpack_from(">QQ", self._take(16))
+                delivery_time = unpack_from("<Q", self._take(8))[0]
+                pending[entry_id] = [None, delivery_time, self._read_length()]
+
+            consumers = {}
+
+            for _ in range(self._read_length()):
+                consumer = self._read_string()
+                seen_time = unpack_from("<Q", self._take(8))[0]
+
+                if value_type == RDB_TYPE_STREAM_LISTPACKS_3:
+                    self._take(8)
+
+                consumers[consumer] = seen_time
+
+                for _ in range(self._read_length()):
+                    entry_id = unpack_from(">QQ", self._take(16))
+
+                    if entry_id in pending:
+                        pending[entry_id][0] = consumer
+
+            groups.append({"name": name, "last_id": group_last_id, "entries_read": entries_read, "pending": pending, "consumers": consumers})
+
+        return {"entries": entries, "last_id": last_id, "max_deleted_id": max_deleted_id, "entries_added": entries_added, "groups": groups}
+
+def lzf_decompress(data: memoryview, expected_length: int) -> bytes:
+    output = bytearray()
+    i, n = 0, len(data)
+
+    while i < n:
+        ctrl = data[i]
+        i += 1
+
+        if ctrl < 32:
+            output += data[i:i + ctrl + 1]
+            i += ctrl + 1
+        else:
+            length = ctrl >> 5
+
+            if length == 7:
+                length += data[i]
+                i += 1
+
+            start = len(output) - ((ctrl & 0x1F) << 8) - data[i] - 1
+            i += 1
+            length += 2
+
+            if start < 0:
+                raise Exception("Invalid LZF back reference")
+
+            while length > 0:
+                chunk = output[start:start + length]
+                output += chunk
+                start += len(chunk)
+                length -= len(chunk)
+
+    if len(output) != expected_length:
+        raise Exception("LZF decompressed length mismatch")
+
+    return bytes(output)
+
+def parse_ziplist(data: bytes) -> list[bytes]:
+    elements = []
+    pos = 10
+
+    while data[pos] != 0xFF:
+        pos += 5 if data[pos] == 0xFE else 1
+        encoding = data[pos]
+        bits = encoding >> 6
+
+        if bits == 0b00:
+            length, pos = encoding & 0x3F, pos + 1
+        elif bits == 0b01:
+            length, pos = ((encoding & 0x3F) << 8) | data[pos + 1], pos + 2
+        elif bits == 0b10:
+            length, pos = unpack_from(">I", data, pos + 1)[0], pos + 5
+        else:
+            value, pos = _read_ziplist_int(data, pos)
+            elements.append(b"%d" % value)
+            continue
+
+        elements.append(bytes(data[pos:pos + length]))
+        pos += length
+
+    return elements
+
+def _read_ziplist_int(data: bytes, pos: int) -> tuple[int, int]:
+    encoding = data[pos]
+
+    if encoding == 0xC0:
+        return unpack_from("<h", data, pos + 1)[0], pos + 3
+    elif encoding == 0xD0:
+        return unpack_from("<i", data, pos + 1)[0], pos + 5
+    elif encoding == 0xE0:
+        return unpack_from("<q", data, pos + 1)[0], pos + 9
+    elif encoding == 0xF0:
+        return int.from_bytes(data[pos + 1:pos + 4], "little", signed=True), pos + 4
+    elif encoding == 0xFE:
+        return unpack_from("<b", data, pos + 1)[0], pos + 2
+    elif 0xF1 <= encoding <= 0xFD:
+        return (encoding & 0x0F) - 1, pos + 1
+
+    raise Exception(f"Unknown ziplist encoding: {encoding:#x}")
+
+def parse_listpack(data: bytes) -> list[bytes | int]:
+    elements = []
+    pos = 6
+
+    while data[pos] != 0xFF:
+        start = pos
+        encoding = data[pos]
+
+        if encoding < 0x80:
+            value, pos = encoding, pos + 1
+        elif encoding >> 6 == 0b10:
+            length = encoding & 0x3F
+            value, pos = bytes(data[pos + 1:pos + 1 + length]), pos + 1 + length
+        elif encoding >> 5 == 0b110:
+            value = ((encoding & 0x1F) << 8) | data[pos + 1]
+            value, pos = value - (1 << 13) if value >= 1 << 12 else value, pos + 2
+        elif encoding >> 4 == 0b1110:
+            length = ((encoding & 0x0F) << 8) | data[pos + 1]
+            value, pos = bytes(data[pos + 2:pos + 2 + length]), pos + 2 + length
+        elif encoding == 0xF0:
+            length = unpack_from("<I", data, pos + 1)[0]
+            value, pos = bytes(data[pos + 5:pos + 5 + length]), pos + 5 + length
+        elif encoding == 0xF1:
+            value, pos = unpack_from("<h", data, pos + 1)[0], pos + 3
+        elif encoding == 0xF2:
+            value, pos = int.from_bytes(data[pos + 1:pos + 4], "little", signed=True), pos + 4
+        elif encoding == 0xF3:
+            value, pos = unpack_from("<i", data, pos + 1)[0], pos + 5
+        elif encoding == 0xF4:
+            value, pos = unpack_from("<q", data, pos + 1)[0], pos + 9
+        else:
+            raise Exception(f"Unknown listpack encoding: {encoding:#x}")
+
+        entry_length = pos - start
+        pos += 1 if entry_length <= 127 else 2 if entry_length < 16383 else 3 if entry_length < 2097151 else 4 if entry_length < 268435455 else 5
+        elements.append(value)
+
+    return [e if isinstance(e, bytes) else b"%d" % e for e in elements]
+
+def parse_intset(data: bytes) -> list[bytes]:
+    width, length = unpack_from("<II", data)
+    code = {2: "h", 4: "i", 8: "q"}[width]
+
+    return [b"%d" % v for v in unpack_from(f"<{length}{code}", data, 8)]
+
+def parse_zipmap(data: bytes) -> list[bytes]:
+    elements = []
+    pos = 1
+
+    while data[pos] != 0xFF:
+        length, pos = _read_zipmap_length(data, pos)
+        elements.append(bytes(data[pos:pos + length]))
+        pos += length
+
+        length, pos = _read_zipmap_length(data, pos)
+        free = data[pos]
+        elements.append(bytes(data[pos + 1:pos + 1 + length]))
+        pos += 1 + length + free
+
+    return elements
+
+def _read_zipmap_length(data: bytes, pos: int) -> tuple[int, int]:
+    if data[pos] < 254:
+        return data[pos], pos + 1
+
+    return unpack_from("<I", data, pos + 1)[0], pos + 5
+
+def _parse_stream_listpack(elements: list[bytes], master_ms: int, master_seq: int) -> list[tuple[tuple[int, int], list[bytes]]]:
+    entries = []
+    count, deleted, num_fields = int(elements[0]), int(elements[1]), int(elements[2])
+    master_fields = elements[3:3 + num_fields]
+    pos = 3 + num_fields + 1
+
+    for _ in range(count + deleted):
+        flags = int(elements[pos])
+        entry_id = (master_ms + int(elements[pos + 1]), master_seq + int(elements[pos + 2]))
+        pos += 3
+
+        if flags & RDB_STREAM_ITEM_FLAG_SAMEFIELDS:
+            values = elements[pos:pos + num_fields]
+            fields = [v for pair in zip(master_fields, values) for v in pair]
+            pos += num_fields
+        else:
+            n = int(elements[pos])
+            fields = elements[pos + 1:pos + 1 + 2 * n]
+            pos += 1 + 2 * n
+
+        pos += 1
+
+        if not flags & RDB_STREAM_ITEM_FLAG_DELETED:
+            entries.append((entry_id, fields))
+
+    return entries
+
+def _pairs_to_dict(elements: list[bytes]) -> dict[bytes, bytes]:
+    return dict(zip(elements[0::2], elements[1::2]))
+
+def _pairs_to_zset(elements: list[bytes]) -> dict[bytes, float]:
+    return {member: float(score) for member, score in zip(elements[0::2], elements[1::2])}
+
+class RDBWriter:
+    def __init__(self, file: BinaryIO) -> None:
+        self._file = file
+        self._buffer = bytearray()
+
+    def write(self, items: Iterable[tuple[bytes, str, object, int | None]], db_size: int, expires_size: int) -> None:
+        buffer = self._buffer
+        buffer += b"REDIS0011"
+        buffer += bytes([RDB_OPCODE_AUX]) + encode_string(b"redis-ver") + encode_string(RDB_REDIS_VERSION)
+        buffer += bytes([RDB_OPCODE_AUX]) + encode_string(b"redis-bits") + encode_string(b"64")
+        buffer += bytes([RDB_OPCODE_AUX]) + encode_string(b"ctime") + encode_string(b"%d" % time())
+        buffer += bytes([RDB_OPCODE_SELECTDB]) + encode_length(0)
+        buffer += bytes([RDB_OPCODE_RESIZEDB]) + encode_length(db_size) + encode_length(expires_size)
+
+        for key, value_type, value, expiry_ms in items:
+            if expiry_ms is not None:
+                buffer += bytes([RDB_OPCODE_EXPIRETIME_MS]) + pack("<Q", expiry_ms)
+
+            if value_type == "string":
+                buffer += bytes([RDB_TYPE_STRING]) + encode_string(key) + encode_string(value)
+            elif value_type == "stream":
+                buffer += bytes([RDB_TYPE_STREAM_LISTPACKS_3]) + encode_string(key)
+                self._write_stream(value)
+            elif value_type == "list":
+                buffer += bytes([RDB_TYPE_LIST_QUICKLIST_2]) + encode_string(key)
+                self._write_list(value[1])
+            elif value_type in ("hash", "set", "zset"):
+                self._write_collection(key, value_type, *value)
+            else:
+                raise Exception(f"Cannot write RDB value of type {value_type}")
+
+            if len(buffer) >= RDB_WRITE_BUFFER_BYTES:
+                self._flush()
+
+        buffer += bytes([RDB_OPCODE_EOF]) + b"\x00" * 8
+        self._flush()
+
+    def _flush(self) -> None:
+        self._file.write(self._buffer)
+        self._buffer.clear()
+
+    def _write_list(self, elements: list[bytes]) -> None:
+        nodes = [elements[i:i + RDB_LIST_NODE_MAX_ENTRIES] for i in range(0, len(elements), RDB_LIST_NODE_MAX_ENTRIES)]
+        buffer = self._buffer
+
+        buffer += encode_length(len(nodes))
+
+        for node in nodes:
+            buffer += encode_length(RDB_QUICKLIST_NODE_PACKED) + encode_string(encode_listpack(node))
+
+    def _write_collection(self, key: bytes, value_type: str, encoding: str, elements: list) -> None:
+        buffer = self._buffer
+
+        if value_type == "zset" and encoding == "listpack":
+            buffer += bytes([RDB_TYPE_ZSET_LISTPACK]) + encode_string(key)
+            buffer += encode_string(encode_listpack([e for member, score in elements for e in (member, b"%r" % score)]))
+        elif value_type == "zset":
+            buffer += bytes([RDB_TYPE_ZSET_2]) + encode_string(key) + encode_length(len(elements))
+
+            for member, score in elements:
+                buffer += encode_string(member) + pack("<d", score)
+        elif value_type == "set" and encoding == "intset":
+            buffer += bytes([RDB_TYPE_SET_INTSET]) + encode_string(key) + encode_string(encode_intset(elements))
+        elif encoding == "listpack":
+            buffer += bytes([RDB_TYPE_HASH_LISTPACK if value_type == "hash" else RDB_TYPE_SET_LISTPACK]) + encode_string(key)
+            buffer += encode_string(encode_listpack(elements))
+        else:
+            buffer += bytes([RDB_TYPE_HASH if value_type == "hash" else RDB_TYPE_SET]) + encode_string(key)
+            buffer += encode_length(len(elements) // 2 if value_type == "hash" else len(elements))
+
+            for element in elements:
+                buffer += encode_string(element)
+
+    def _write_stream(self, value: dict) -> None:
+        entries = value["entries"]
+        nodes = [entries[i:i + RDB_STREAM_NODE_MAX_ENTRIES] for i in range(0, len(entries), RDB_STREAM_NODE_MAX_ENTRIES)]
+        buffer = self._buffer
+
+        buffer += encode_length(len(nodes))
+
+        for node in nodes:
+            (master_ms, master_seq), master_fields = node[0]
+            master_fields = master_fields[0::2]
+            elements = [len(node), 0, len(master_fields), *master_fields, 0]
+
+            for (ms, seq), fields in node:
+                names, values = fields[0::2], fields[1::2]
+
+                if names == master_fields:
+                    elements += [RDB_STREAM_ITEM_FLAG_SAMEFIELDS, ms - master_ms, seq - master_seq, *values, len(values) + 3]
+                else:
+                    elements += [0, ms - master_ms, seq - master_seq, len(values), *fields, 2 * len(values) + 4]
+
+            buffer += encode_string(pack(">QQ", master_ms, master_seq))
+            buffer += encode_string(encode_listpack(elements))
+
+        first_id = entries[0][0] if entries else (0, 0)
+
+        buffer += encode_length(len(entries))
+        buffer += encode_length(value["last_id"][0]) + encode_length(value["last_id"][1])
+        buffer += encode_length(first_id[0]) + encode_length(first_id[1])
+        buffer += encode_length(value["max_deleted_id"][0]) + encode_length(value["max_deleted_id"][1])
+        buffer += encode_length(value["entries_added"])
+        buffer += encode_length(len(value["groups"]))
+
+        for group in value["groups"]:
+            entries_read = group["entries_read"]
+            owned = {name: [] for name in group["consumers"]}
+
+            buffer += encode_string(group["name"])
+            buffer += encode_length(group["last_id"][0]) + encode_length(group["last_id"][1])
+            buffer += encode_length(entries_read if entries_read is not None else STREAM_ID_MAX)
+            buffer += encode_length(len(group["pending"]))
+
+            for entry_id, (consumer, delivery_time, delivery_count) in group["pending"].items():
+                buffer += pack(">QQ", *entry_id) + pack("<Q", delivery_time) + encode_length(delivery_count)
+                owned[consumer].append(entry_id)
+
+            buffer += encode_length(len(owned))
+
+            for consumer, entry_ids in owned.items():
+                seen_time = group["consumers"][consumer]
+
+                buffer += encode_string(consumer) + pack("<QQ", seen_time, seen_time)
+                buffer += encode_length(len(entry_ids))
+
+                for entry_id in entry_ids:
+                    buffer += pack(">QQ", *entry_id)
+
+def encode_length(n: int) -> bytes:
+    if n < 1 << 6:
+        return bytes([n])
+    elif n < 1 << 14:
+        return bytes([0x40 | (n >> 8), n & 0xFF])
+    elif n < 1 << 32:
+        return b"\x80" + pack(">I", n)
+
+    return b"\x81" + pack(">Q", n)
+
+def encode_string(value: bytes) -> bytes:
+    if 0 < len(value) <= 11 and (value[0] == 0x2D or 0x30 <= value[0] <= 0x39):
+        try:
+            number = int(value)
+        except ValueError:
+            number = None
+
+        if number is not None and b"%d" % number == value:
+            if -(1 << 7) <= number < 1 << 7:
+                return b"\xc0" + pack("<b", number)
+            elif -(1 << 15) <= number < 1 << 15:
+                return b"\xc1" + pack("<h", number)
+            elif -(1 << 31) <= number < 1 << 31:
+                return b"\xc2" + pack("<i", number)
+
+    return encode_length(len(value)) + value
+
+def encode_listpack(elements: list[bytes | int]) -> bytes:
+    body = bytearray()
+
+    for element in elements:
+        entry = _encode_listpack_entry(element)
+        body += entry
+        body += _encode_listpack_backlen(len(entry))
+
+    body += b"\xff"
+
+    return pack("<IH", 6 + len(body), min(len(elements), 0xFFFF)) + body
+
+def encode_intset(elements: list[int]) -> bytes:
+    low, high = (elements[0], elements[-1]) if elements else (0, 0)
+    width, code = (2, "h") if -(1 << 15) <= low and high < 1 << 15 else (4, "i") if -(1 << 31) <= low and high < 1 << 31 else (8, "q")
+
+    return pack(f"<II{len(elements)}{code}", width, len(elements), *elements)
+
+def _encode_listpack_entry(element: bytes | int) -> bytes:
+    if isinstance(element, int):
+        if 0 <= element < 1 << 7:
+            return bytes([element])
+        elif -(1 << 12) <= element < 1 << 12:
+            element &= 0x1FFF
+            return bytes([0xC0 | (element >> 8), element & 0xFF])
+        elif -(1 << 15) <= element < 1 << 15:
+            return b"\xf1" + pack("<h", element)
+        elif -(1 << 23) <= element < 1 << 23:
+            return b"\xf2" + (element & 0xFFFFFF).to_bytes(3, "little")
+        elif -(1 << 31) <= element < 1 << 31:
+            return b"\xf3" + pack("<i", element)
+
+        return b"\xf4" + pack("<q", element)
+
+    length = len(element)
+
+    if length < 1 << 6:
+        return bytes([0x80 | length]) + element
+    elif length < 1 << 12:
+        return bytes([0xE0 | (length >> 8), length & 0xFF]) + element
+
+    return b"\xf0" + pack("<I", length) + element
+
+def _encode_listpack_backlen(length: int) -> bytes:
+    digits = [length & 0x7F]
+    length >>= 7
+
+    while length:
+        digits.append(length & 0x7F)
+        length >>= 7
+
+    return bytes([digits[-1]] + [d | 0x80 for d in reversed(digits[:-1])])
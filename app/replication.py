@@ -0,0 +1,172 @@
+from threading import Condition, Lock, Thread
+from collections import deque
+from time import monotonic
+from app.constants import *
+from app import logger
+from app.resp import RESPSocket
+from app.persistence import SnapshotManager
+import os
+
+class ReplicationBacklog:
+    def __init__(self, size: int) -> None:
+        self._buffer = bytearray(size)
+        self._size = size
+        self._index = 0
+        self._length = 0
+        self._offset = 0
+        self.active = False
+        self.lock = Lock()
+
+    def reset(self, offset: int) -> None:
+        self._index = 0
+        self._length = 0
+        self._offset = offset
+
+    def append(self, payload: bytes) -> None:
+        self._offset += len(payload)
+
+        if len(payload) >= self._size:
+            self._buffer[:] = payload[-self._size:]
+            self._index, self._length = 0, self._size
+            return
+
+        end = self._index + len(payload)
+
+        if end <= self._size:
+            self._buffer[self._index:end] = payload
+        else:
+            split = self._size - self._index
+            self._buffer[self._index:] = payload[:split]
+            self._buffer[:end - self._size] = payload[split:]
+
+        self._index = end % self._size
+        self._length = min(self._length + len(payload), self._size)
+
+    def read_from(self, offset: int) -> bytes | None:
+        if offset < self._offset - self._length or offset > self._offset:
+            return None
+
+        n = self._offset - offset
+        start = (self._index - n) % self._size
+
+        if start + n <= self._size:
+            return bytes(self._buffer[start:start + n])
+
+        return bytes(self._buffer[start:]) + bytes(self._buffer[:start + n - self._size])
+
+class ReplicaConnection:
+    def __init__(self, socket: RESPSocket, config: dict, online: bool) -> None:
+        self.socket = socket
+        self.ack_offset = 0
+        self.online = online
+        self.closed = False
+        self._hard_limit, self._soft_limit, self._soft_seconds = config[REPLICA_OUTPUT_BUFFER_LIMIT]
+        self._soft_limit_since = None
+        self._queue = deque()
+        self._buffered = 0
+        self._ready = Condition()
+
+    def start(self) -> None:
+        thread = Thread(target=self._drain, daemon=True)
+        thread.start()
+
+    def send(self, payload: bytes) -> None:
+        with self._ready:
+            if self.closed:
+                return
+
+            self._queue.append(payload)
+            self._buffered += len(payload)
+
+            reason = self._check_limits()
+
+            if reason is None:
+                self._ready.notify()
+                return
+
+        self.disconnect(reason)
+
+    def set_online(self) -> None:
+        with self._ready:
+            self.online = True
+            self._ready.notify()
+
+    def close(self) -> None:
+        with self._ready:
+            self.closed = True
+            self._queue.clear()
+            self._ready.notify()
+
+    def disconnect(self, reason: str) -> None:
+        logger.warning("disconnecting replica %s: %s", self.socket.get_addr(), reason)
+        self.close()
+        self.socket.shutdown()
+
+    def _check_limits(self) -> str | None:
+        if self._hard_limit and self._buffered > self._hard_limit:
+            return f"output buffer of {self._buffered} bytes over hard limit"
+
+        if not self._soft_limit or self._buffered <= self._soft_limit:
+            self._soft_limit_since = None
+            return None
+
+        now = monotonic()
+
+        if self._soft_limit_since is None:
+            self._soft_limit_since = now
+        elif now - self._soft_limit_since > self._soft_seconds:
+            return f"output buffer of {self._buffered} bytes over soft limit for {self._soft_seconds}s"
+
+        return None
+
+    def _drain(self) -> None:
+        while True:
+            with self._ready:
+                while not self.closed and not (self.online and self._queue):
+                    self._ready.wait()
+
+                if self.closed:
+                    return
+
+                payload = b"".join(self._queue)
+                self._queue.clear()
+
+            try:
+                self.socket.sendall(payload)
+                self.socket.drain()
+            except OSError as e:
+                if not self.closed:
+                    self.disconnect(f"write failed: {e}")
+                return
+
+            with self._ready:
+                self._buffered -= len(payload)
+
+def start_full_resync(replica: ReplicaConnection, snapshots: SnapshotManager) -> None:
+    path = snapshots.temp_path(f"temp-sync-{id(replica)}.rdb")
+    pid = snapshots.fork_dump(path)
+
+    thread = Thread(target=_transfer_rdb, args=(replica, pid, path), daemon=True)
+    thread.start()
+
+def _transfer_rdb(replica: ReplicaConnection, pid: int, path: str) -> None:
+    _, status = os.waitpid(pid, 0)
+
+    if os.waitstatus_to_exitcode(status) != 0:
+        replica.disconnect("snapshot failed")
+        return
+
+    try:
+        replica.socket.sendall(b"$%d\r\n" % os.path.getsize(path))
+
+        with open(path, "rb") as file:
+            while not replica.closed and (chunk := file.read(RDB_TRANSFER_CHUNK_BYTES)):
+                replica.socket.sendall(chunk)
+                replica.socket.drain()
+
+        replica.set_online()
+        logger.notice("replica %s is online", replica.socket.get_addr())
+    except OSError as e:
+        replica.disconnect(f"transfer failed: {e}")
+    finally:
+        os.remove(path)
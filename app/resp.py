@@ -1,102 +1,399 @@
-from app.constants import ENCODING
-from base64 import b64decode
-from socket import socket
+from app.constants import ENCODING, OUTPUT_BUFFER_FLUSH_BYTES, PROTO_MAX_BULK_LEN, PROTO_MAX_HEADER_BYTES, PROTO_MAX_MULTIBULK_LEN, RESP_HEADER_CACHE_SIZE
+from socket import socket, SHUT_RDWR
+from threading import Condition, Lock
+from typing import Callable
 
 class RESPSocket:
-    def __init__(self, socket: socket, addr: tuple[str, int]) -> None:
+    def __init__(self, socket: socket, addr: tuple[str, int], on_sent: Callable[[int], None] | None = None) -> None:
         self._socket = socket
         self._addr = addr
+        self._on_sent = on_sent
+        self._out_buffer = bytearray()
+        self._out_lock = Lock()
+        self.transaction = None
      
     def sendall(self, payload: bytes) -> None:
-        self._socket.sendall(payload)
+        with self._out_lock:
+            self._out_buffer += payload
+
+            if len(self._out_buffer) >= OUTPUT_BUFFER_FLUSH_BYTES:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._out_lock:
+            self._flush()
+
+    def drain(self) -> None:
+        self.flush()
+
+    def shutdown(self) -> None:
+        try:
+            self._socket.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _flush(self) -> None:
+        if self._out_buffer:
+            self._socket.sendall(self._out_buffer)
+
+            if self._on_sent is not None:
+                self._on_sent(len(self._out_buffer))
+
+            self._out_buffer.clear()
 
     def get_addr(self) -> tuple[str, int]:
         return self._addr
 
+    def fileno(self) -> int:
+        return self._socket.fileno()
+
+class EventLoopSocket(RESPSocket):
+    def __init__(self, socket: socket, addr: tuple[str, int], on_write: Callable[["EventLoopSocket"], None], on_sent: Callable[[int], None] | None = None) -> None:
+        super().__init__(socket, addr, on_sent)
+        self.parser = RESPParser()
+        self.blocked = False
+        self.waiter = None
+        self.closing = False
+        self.closed = False
+        self._on_write = on_write
+        self._drained = Condition(self._out_lock)
+
+    def sendall(self, payload: bytes) -> None:
+        with self._out_lock:
+            self._out_buffer += payload
+        self._on_write(self)
+
+    def flush(self) -> None:
+        return None
+
+    def drain(self) -> None:
+        with self._drained:
+            while self._out_buffer and not self.closed:
+                self._drained.wait()
+
+    def recv(self, size: int) -> bytes:
+        return self._socket.recv(size)
+
+    def send_pending(self) -> bool:
+        with self._out_lock:
+            if self._out_buffer:
+                try:
+                    sent = self._socket.send(self._out_buffer)
+                except BlockingIOError:
+                    sent = 0
+                del self._out_buffer[:sent]
+
+                if sent and self._on_sent is not None:
+                    self._on_sent(sent)
+
+            if not self._out_buffer:
+                self._drained.notify_all()
+                return True
+
+            return False
+
+    def close(self) -> None:
+        with self._drained:
+            self.closed = True
+            self._drained.notify_all()
+        self._socket.close()
+
 class NullSocket(RESPSocket):
     def __init__(self) -> None:
-        pass
+        self.transaction = None
 
     def sendall(self, payload: bytes) -> None:
         return None
+
+    def flush(self) -> None:
+        return None
     
     def getsockname(self) -> tuple[str, int]:
         return ("", -1)
 
-class RESPBuffer:
-    def __init__(self, buffer):
-        self.buffer = buffer
-    
-    def read(self, num: int) -> bytes:
-        b, self.buffer = self.buffer[:num], self.buffer[num:]
-        return b
-    
-    def partition(self, delimiter: bytes):
-        b, _, self.buffer = self.buffer.partition(delimiter)
-        return b
-    
+class ReplyBuffer(RESPSocket):
+    def __init__(self, addr: tuple[str, int]) -> None:
+        self._addr = addr
+        self.buffer = bytearray()
+        self.transaction = None
+
+    def sendall(self, payload: bytes) -> None:
+        self.buffer += payload
+
+    def flush(self) -> None:
+        return None
+
+class RESPParser:
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._offset = 0
+        self._position = 0
+        self._stack = []
+        self.consumed = 0
+
+    def feed(self, data: bytes) -> None:
+        if self._offset:
+            del self._buffer[:self._offset]
+            self._position -= self._offset
+            self._offset = 0
+
+        self._buffer += data
+
     def is_not_empty(self) -> bool:
-        return len(self.buffer) > 0
-
-def decode(buffer: RESPBuffer):
-    first_char = buffer.read(1)
-
-    if first_char == b'*':
-        n = int(buffer.partition(b'\r\n').decode(ENCODING))
-        return [decode(buffer) for _ in range(n)]
-    elif first_char == b'$':
-        n = int(buffer.partition(b'\r\n'))
-        bulk_string = buffer.read(n)
-        
-        if not bulk_string.startswith(b'REDIS0011') and buffer.read(2) != b'\r\n':
-            raise Exception("Invalid RESP request")
-            
-        return bulk_string.decode(ENCODING)
-    elif first_char == b'+':
-        simple_string = buffer.partition(b'\r\n').decode(ENCODING)
-        return simple_string
-    else:
-        raise Exception(f"Unknown RESP type: {first_char}")
+        return self._offset < len(self._buffer)
+
+    def next_frame(self) -> object | None:
+        try:
+            return self._next_frame(False)
+        except _IncompleteFrame:
+            return None
+
+    def next_raw(self) -> bytes | None:
+        start = self._offset
+
+        try:
+            self._next_frame(False)
+        except _IncompleteFrame:
+            return None
+
+        return bytes(self._buffer[start:self._offset])
+
+    def next_command(self) -> tuple[str, list[bytes]] | None:
+        try:
+            frame = self._next_frame(True)
+        except _IncompleteFrame:
+            return None
+
+        if not frame:
+            raise ProtocolError("expected an array of bulk strings")
+
+        return frame[0].decode(ENCODING).upper(), frame[1:]
+
+    def next_bulk_length(self) -> int | None:
+        buffer, offset = self._buffer, self._offset
+        end = buffer.find(b'\r\n', offset)
+
+        if end < 0:
+            return None
+
+        if buffer[offset] != 0x24:
+            raise ProtocolError(f"expected '$', got '{chr(buffer[offset])}'")
+
+        n = _parse_int(buffer[offset + 1:end], "bulk length")
+        self._advance(end + 2)
+        return n
+
+    def take(self, n: int) -> bytes:
+        stop = min(len(self._buffer), self._offset + n)
+        data = bytes(self._buffer[self._offset:stop])
+        self._advance(stop)
+        return data
 
-def decode_command(buffer: RESPBuffer) -> tuple[str, list[str]]:
-    decoded = decode(buffer)
+    def _advance(self, offset: int) -> None:
+        self.consumed += offset - self._offset
+        self._offset = self._position = offset
 
-    return decoded[0].upper(), decoded[1:]
+    def _next_frame(self, command: bool) -> object:
+        stack = self._stack
 
-def encode_simple_string(value: str) -> bytes:
-    return f"+{value}\r\n".encode(ENCODING)
+        while True:
+            if stack and stack[-1][1] == 0:
+                frame = stack.pop()[0]
+            else:
+                frame = self._parse(command)
+
+                if frame is _ARRAY_STARTED:
+                    continue
+
+            if not stack:
+                self._advance(self._position)
+                return frame
+
+            stack[-1][0].append(frame)
+            stack[-1][1] -= 1
+
+    def _parse(self, command: bool) -> object:
+        buffer, offset = self._buffer, self._position
+        end = buffer.find(b'\r\n', offset)
+
+        if end < 0:
+            if command and len(buffer) - offset > PROTO_MAX_HEADER_BYTES:
+                raise ProtocolError("too big header")
+
+            raise _IncompleteFrame()
+
+        prefix = buffer[offset]
+
+        if command and not self._stack and prefix != 0x2A:
+            raise ProtocolError("expected an array of bulk strings")
+
+        if command and self._stack and prefix != 0x24:
+            raise ProtocolError(f"expected '$', got '{chr(prefix)}'")
+
+        if prefix == 0x2A:
+            n = _parse_int(buffer[offset + 1:end], "multibulk length")
+
+            if command and not 0 <= n <= PROTO_MAX_MULTIBULK_LEN:
+                raise ProtocolError("invalid multibulk length")
+
+            self._position = end + 2
+
+            if n < 0:
+                return None
+
+            self._stack.append([[], n])
+            return _ARRAY_STARTED
+        elif prefix == 0x24:
+            n = _parse_int(buffer[offset + 1:end], "bulk length")
+
+            if n > PROTO_MAX_BULK_LEN or (command and n < 0):
+                raise ProtocolError("invalid bulk length")
+
+            if n < 0:
+                self._position = end + 2
+                return None
+
+            start = end + 2
+            stop = start + n
+
+            if len(buffer) < stop + 2:
+                raise _IncompleteFrame()
+
+            if buffer[stop:stop + 2] != b'\r\n':
+                raise ProtocolError("bulk string is not terminated by CRLF")
+
+            self._position = stop + 2
+            return bytes(buffer[start:stop])
+
+        self._position = end + 2
+
+        if prefix == 0x2B:
+            return buffer[offset + 1:end].decode(ENCODING)
+        elif prefix == 0x2D:
+            return Exception(buffer[offset + 1:end].decode(ENCODING))
+        elif prefix == 0x3A:
+            return _parse_int(buffer[offset + 1:end], "integer")
+        else:
+            raise ProtocolError(f"unknown RESP type '{chr(prefix)}'")
+
+class ProtocolError(Exception):
+    pass
+
+class _IncompleteFrame(Exception):
+    pass
+
+_ARRAY_STARTED = object()
+
+def _parse_int(value: bytearray, name: str) -> int:
+    digits = value[1:] if value.startswith(b"-") else value
+
+    if not digits.isdigit():
+        raise ProtocolError(f"invalid {name}")
+
+    return int(value)
+
+def _to_bytes(value: object) -> bytes:
+    if isinstance(value, bytes):
+        return value
+
+    return str(value).encode(ENCODING)
+
+def encode_simple_string(value: str | bytes) -> bytes:
+    if (cached := _SIMPLE_STRINGS.get(value)) is not None:
+        return cached
+
+    return b"".join((b"+", _to_bytes(value), CRLF))
 
 def encode_error_string(value: str) -> bytes:
     return f"-{value}\r\n".encode(ENCODING)
 
-def encode_bulk_string(value: list[str]) -> bytes:
+def encode_bulk(value: bytes | str | int | None) -> bytes:
+    if value is None:
+        return NULL_BULK_STRING
+
+    if value.__class__ is not bytes:
+        value = _to_bytes(value)
+
+    return b"".join((_bulk_header(len(value)), value, CRLF))
+
+def encode_bulk_string(value: list[str | bytes]) -> bytes:
     if not value:
-        return "$-1\r\n".encode(ENCODING)
+        return NULL_BULK_STRING
 
-    bulk_string = "\r\n".join(value)
-        
-    return f"${len(bulk_string)}\r\n{bulk_string}\r\n".encode(ENCODING)
+    return encode_bulk(b"\r\n".join([_to_bytes(v) for v in value]))
 
 def encode_array(value: list[object]) -> bytes:
-    elements = ("\r\n").join([f"${len(str(s))}\r\n{s}" for s in value])
+    parts = [_array_header(len(value))]
+    append = parts.append
+
+    for element in value:
+        if element.__class__ is not bytes:
+            if element is None:
+                append(NULL_BULK_STRING)
+                continue
 
-    return f"*{len(value)}\r\n{elements}\r\n".encode(ENCODING)
+            element = _to_bytes(element)
 
-def encode_rdb_file(contents_b64: str) -> bytes:
-    return f"${len(b64decode(contents_b64))}\r\n".encode(ENCODING) + b64decode(contents_b64)
+        append(_bulk_header(len(element)))
+        append(element)
+        append(CRLF)
+
+    return b"".join(parts)
 
 def encode_integer(value: int) -> bytes:
-    return f":{value}\r\n".encode(ENCODING)
+    if 0 <= value < RESP_HEADER_CACHE_SIZE:
+        return _INTEGERS[value]
+
+    return b":%d\r\n" % value
+
+def encode_value(value: object) -> bytes:
+    parts = []
+    _encode_value(value, parts.append)
+
+    return b"".join(parts)
+
+def _encode_value(value: object, append: Callable[[bytes], None]) -> None:
+    if value is None:
+        append(NULL_BULK_STRING)
+    elif isinstance(value, int):
+        append(encode_integer(value))
+    elif isinstance(value, (list, tuple)):
+        append(_array_header(len(value)))
+
+        for element in value:
+            _encode_value(element, append)
+    else:
+        append(encode_bulk(value))
+
+def encode_stream(stream: list[tuple[bytes, bytes]]) -> bytes:
+    parts = [_array_header(len(stream))]
+    extend = parts.extend
+
+    for entry_id, entry in stream:
+        extend((_ENTRY_HEADER, _bulk_header(len(entry_id)), entry_id, CRLF, entry))
+
+    return b"".join(parts)
+
+def _bulk_header(length: int) -> bytes:
+    if length < RESP_HEADER_CACHE_SIZE:
+        return _BULK_HEADERS[length]
 
-def encode_stream(stream: list[list[str]]) -> bytes:
-    stream_str = f"*{len(stream)}\r\n"
+    return b"$%d\r\n" % length
 
-    for entry in stream:
-        stream_str += "*2\r\n"
-        entry_id, entry = entry[0], entry[1:]
-        stream_str += f"${len(entry_id)}\r\n{entry_id}\r\n*{len(entry)}\r\n"
+def _array_header(length: int) -> bytes:
+    if length < RESP_HEADER_CACHE_SIZE:
+        return _ARRAY_HEADERS[length]
 
-        for value in entry:
-            stream_str += f"${len(value)}\r\n{value}\r\n"
+    return b"*%d\r\n" % length
 
-    return stream_str.encode(ENCODING)
\ No newline at end of file
+CRLF = b"\r\n"
+NULL_BULK_STRING = b"$-1\r\n"
+NULL_ARRAY = b"*-1\r\n"
+_ENTRY_HEADER = b"*2\r\n"
+_BULK_HEADERS = [b"$%d\r\n" % n for n in range(RESP_HEADER_CACHE_SIZE)]
+_ARRAY_HEADERS = [b"*%d\r\n" % n for n in range(RESP_HEADER_CACHE_SIZE)]
+_INTEGERS = [b":%d\r\n" % n for n in range(RESP_HEADER_CACHE_SIZE)]
+_SIMPLE_STRINGS = {
+    value: b"+%s\r\n" % value.encode(ENCODING)
+    for value in ["OK", "PONG", "QUEUED"]
+}
@@ -1,42 +1,130 @@
-from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
-from threading import Thread
+from socket import socket, socketpair, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, SO_REUSEPORT, SOMAXCONN
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
+from threading import Thread, get_ident, local
+from time import monotonic, perf_counter_ns, sleep
+from collections import deque
+from typing import Callable
+import os
 from app.resp import *
 from app.command_handlers import *
 from app.constants import *
+from app import logger
 from app.database import Database
+from app.blocking import KeyspaceNotifier
+from app.persistence import SnapshotManager
+from app.aof import AppendOnlyFile, wrap_transaction
+from app.replication import ReplicationBacklog
+from app.workers import WorkerRouter
+from app.eviction import Evictor
+from app.metrics import Metrics
+from app.commands import Command, command_table, xread_keys, xread_blocks, xread_without_block, xreadgroup_blocks, xreadgroup_without_block, memory_keys, object_keys
+from app.transactions import Transaction
 
 class Server:
-    def __init__(self, config: dict, database: Database) -> None:
+    def __init__(self, config: dict, database: Database, router: WorkerRouter | None = None) -> None:
         self._config = config
         self._database = database
+        self._router = router
         self._replicas = {}
-        self._handlers = {
-            'PING': [handle_ping],
-            'ECHO': [handle_echo],
-            'SET': [lambda socket, args: handle_set(socket, args, self._database)],
-            'GET': [lambda socket, args: handle_get(socket, args, self._database)],
-            'INFO': [lambda socket, args: handle_info(socket, args, self._config)],
-            'REPLCONF': [lambda socket, args: handle_replconf(socket, args, self._config, self._replicas)],
-            'PSYNC': [lambda socket, args: handle_psync(socket, args, self._config, self._replicas)],
-            'WAIT': [lambda socket, args: handle_wait(socket, args, self._config, self._replicas)],
-            'CONFIG': [lambda socket, args: handle_config(socket, args, self._config)],
-            'KEYS': [lambda socket, args: handle_keys(socket, args, self._database)],
-            'TYPE': [lambda socket, args: handle_type(socket, args, self._database)],
-            'XADD': [lambda socket, args: handle_xadd(socket, args, self._database)],
-            'XRANGE': [lambda socket, args: handle_xrange(socket, args, self._database)],
-            'XREAD': [lambda socket, args: handle_xread(socket, args, self._database)]
-        }
+        self._notifier = KeyspaceNotifier()
+        self._snapshots = SnapshotManager(config, database)
+        self._aof = AppendOnlyFile(config, database)
+        self._backlog = ReplicationBacklog(config[REPL_BACKLOG_SIZE])
+        self._evictor = Evictor(config, database)
+        self._metrics = Metrics(config)
+        self._leader_replid = None
+        self._pending_propagation = _PendingPropagation()
+        self._commands = command_table([
+            Command('PING', handle_ping, -1, ["fast"]),
+            Command('ECHO', handle_echo, 2, ["fast"]),
+            Command('SET', lambda socket, args: handle_set(socket, args, self._database), -3, ["write", "denyoom"], 1, 1, 1),
+            Command('GET', lambda socket, args: handle_get(socket, args, self._database), 2, ["readonly", "fast"], 1, 1, 1),
+            Command('MGET', lambda socket, args: handle_mget(socket, args, self._database), -2, ["readonly", "fast"], 1, -1, 1),
+            Command('MSET', lambda socket, args: handle_mset(socket, args, self._database), -3, ["write", "denyoom"], 1, -1, 2),
+            Command('MSETNX', lambda socket, args: handle_msetnx(socket, args, self._database), -3, ["write", "denyoom"], 1, -1, 2),
+            Command('INCR', lambda socket, args: handle_incr(socket, args, self._database), 2, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('DECR', lambda socket, args: handle_decr(socket, args, self._database), 2, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('INCRBY', lambda socket, args: handle_incrby(socket, args, self._database), 3, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('DECRBY', lambda socket, args: handle_decrby(socket, args, self._database), 3, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('INCRBYFLOAT', lambda socket, args: handle_incrbyfloat(socket, args, self._database), 3, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('APPEND', lambda socket, args: handle_append(socket, args, self._database), 3, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('STRLEN', lambda socket, args: handle_strlen(socket, args, self._database), 2, ["readonly", "fast"], 1, 1, 1),
+            Command('GETRANGE', lambda socket, args: handle_getrange(socket, args, self._database), 4, ["readonly"], 1, 1, 1),
+            Command('SETRANGE', lambda socket, args: handle_setrange(socket, args, self._database), 4, ["write", "denyoom"], 1, 1, 1),
+            Command('DEL', lambda socket, args: handle_del(socket, args, self._database), -2, ["write"], 1, -1, 1),
+            Command('INFO', lambda socket, args: handle_info(socket, args, self._config, self._database, self._metrics), -1, ["leader", "stale"]),
+            Command('REPLCONF', lambda socket, args: handle_replconf(socket, args, self._config, self._replicas, self._notifier), -1, ["admin", "leader", "stale", "no-multi"]),
+            Command('PSYNC', lambda socket, args: handle_psync(socket, args, self._config, self._replicas, self._backlog, self._snapshots, self._database), -3, ["admin", "no-multi"]),
+            Command('WAIT', lambda socket, args: handle_wait(socket, args, self._config, self._replicas, self._notifier, self._feed_replicas), 3, ["blocking", "no-multi"]),
+            Command('CONFIG', lambda socket, args: handle_config(socket, args, self._config), -2, ["admin", "stale"]),
+            Command('KEYS', lambda socket, args: handle_keys(socket, args, self._database), 2, ["readonly"]),
+            Command('SCAN', lambda socket, args: handle_scan(socket, args, self._database, self._router.end_slot() if self._router else KEYSPACE_SLOTS), -2, ["readonly"]),
+            Command('TYPE', lambda socket, args: handle_type(socket, args, self._database), 2, ["readonly", "fast"], 1, 1, 1),
+            Command('XADD', lambda socket, args: handle_xadd(socket, args, self._database, self._notifier), -5, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('XRANGE', lambda socket, args: handle_xrange(socket, args, self._database), -4, ["readonly"], 1, 1, 1),
+            Command('XREAD', lambda socket, args: handle_xread(socket, args, self._database, self._notifier), -4, ["readonly", "blocking", "movablekeys"], get_keys=xread_keys, blocks=xread_blocks, unblock=xread_without_block),
+            Command('XTRIM', lambda socket, args: handle_xtrim(socket, args, self._database), -4, ["write"], 1, 1, 1),
+            Command('XSETID', lambda socket, args: handle_xsetid(socket, args, self._database), -3, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('XGROUP', lambda socket, args: handle_xgroup(socket, args, self._database), -2, ["write", "denyoom"], 2, 2, 1),
+            Command('XREADGROUP', lambda socket, args: handle_xreadgroup(socket, args, self._database, self._notifier, self._propagate), -7, ["write", "blocking", "movablekeys"], get_keys=xread_keys, blocks=xreadgroup_blocks, unblock=xreadgroup_without_block),
+            Command('XACK', lambda socket, args: handle_xack(socket, args, self._database), -4, ["write", "fast"], 1, 1, 1),
+            Command('XPENDING', lambda socket, args: handle_xpending(socket, args, self._database), -3, ["readonly"], 1, 1, 1),
+            Command('XCLAIM', lambda socket, args: handle_xclaim(socket, args, self._database), -6, ["write", "fast"], 1, 1, 1),
+            Command('XAUTOCLAIM', lambda socket, args: handle_xautoclaim(socket, args, self._database), -6, ["write", "fast"], 1, 1, 1),
+            Command('HSET', lambda socket, args: handle_hset(socket, args, self._database), -4, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('HGET', lambda socket, args: handle_hget(socket, args, self._database), 3, ["readonly", "fast"], 1, 1, 1),
+            Command('HGETALL', lambda socket, args: handle_hgetall(socket, args, self._database), 2, ["readonly"], 1, 1, 1),
+            Command('HDEL', lambda socket, args: handle_hdel(socket, args, self._database), -3, ["write", "fast"], 1, 1, 1),
+            Command('HLEN', lambda socket, args: handle_hlen(socket, args, self._database), 2, ["readonly", "fast"], 1, 1, 1),
+            Command('HEXISTS', lambda socket, args: handle_hexists(socket, args, self._database), 3, ["readonly", "fast"], 1, 1, 1),
+            Command('LPUSH', lambda socket, args: handle_push(socket, args, self._database, self._notifier, True), -3, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('RPUSH', lambda socket, args: handle_push(socket, args, self._database, self._notifier, False), -3, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('LPOP', lambda socket, args: handle_pop(socket, args, self._database, True), -2, ["write", "fast"], 1, 1, 1),
+            Command('RPOP', lambda socket, args: handle_pop(socket, args, self._database, False), -2, ["write", "fast"], 1, 1, 1),
+            Command('BLPOP', lambda socket, args: handle_blocking_pop(socket, args, self._database, self._notifier, self._propagate, self._pending_propagation.commands is None, True), -3, ["write", "blocking"], 1, -2, 1),
+            Command('BRPOP', lambda socket, args: handle_blocking_pop(socket, args, self._database, self._notifier, self._propagate, self._pending_propagation.commands is None, False), -3, ["write", "blocking"], 1, -2, 1),
+            Command('LRANGE', lambda socket, args: handle_lrange(socket, args, self._database), 4, ["readonly"], 1, 1, 1),
+            Command('LLEN', lambda socket, args: handle_llen(socket, args, self._database), 2, ["readonly", "fast"], 1, 1, 1),
+            Command('SADD', lambda socket, args: handle_sadd(socket, args, self._database), -3, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('SREM', lambda socket, args: handle_srem(socket, args, self._database), -3, ["write", "fast"], 1, 1, 1),
+            Command('SISMEMBER', lambda socket, args: handle_sismember(socket, args, self._database), 3, ["readonly", "fast"], 1, 1, 1),
+            Command('SMEMBERS', lambda socket, args: handle_smembers(socket, args, self._database), 2, ["readonly"], 1, 1, 1),
+            Command('SCARD', lambda socket, args: handle_scard(socket, args, self._database), 2, ["readonly", "fast"], 1, 1, 1),
+            Command('ZADD', lambda socket, args: handle_zadd(socket, args, self._database), -4, ["write", "denyoom", "fast"], 1, 1, 1),
+            Command('ZREM', lambda socket, args: handle_zrem(socket, args, self._database), -3, ["write", "fast"], 1, 1, 1),
+            Command('ZSCORE', lambda socket, args: handle_zscore(socket, args, self._database), 3, ["readonly", "fast"], 1, 1, 1),
+            Command('ZRANK', lambda socket, args: handle_zrank(socket, args, self._database), 3, ["readonly", "fast"], 1, 1, 1),
+            Command('ZCARD', lambda socket, args: handle_zcard(socket, args, self._database), 2, ["readonly", "fast"], 1, 1, 1),
+            Command('ZRANGE', lambda socket, args: handle_zrange(socket, args, self._database), -4, ["readonly"], 1, 1, 1),
+            Command('ZRANGEBYSCORE', lambda socket, args: handle_zrangebyscore(socket, args, self._database), -4, ["readonly"], 1, 1, 1),
+            Command('OBJECT', lambda socket, args: handle_object(socket, args, self._database), -2, ["readonly"], get_keys=object_keys),
+            Command('SAVE', lambda socket, args: handle_save(socket, args, self._snapshots), 1, ["admin"]),
+            Command('BGSAVE', lambda socket, args: handle_bgsave(socket, args, self._snapshots), -1, ["admin"]),
+            Command('LASTSAVE', lambda socket, args: handle_lastsave(socket, args, self._snapshots), 1, ["fast"]),
+            Command('MEMORY', lambda socket, args: handle_memory(socket, args, self._database), -2, ["readonly", "movablekeys"], get_keys=memory_keys),
+            Command('BGREWRITEAOF', lambda socket, args: handle_bgrewriteaof(socket, args, self._aof), 1, ["admin"]),
+            Command('SLOWLOG', lambda socket, args: handle_slowlog(socket, args, self._metrics), -2, ["admin"]),
+            Command('LATENCY', lambda socket, args: handle_latency(socket, args, self._metrics), -2, ["admin"]),
+            Command('MULTI', handle_multi, 1, ["fast"]),
+            Command('EXEC', lambda socket, args: handle_exec(socket, args, self._database, self._exec_transaction), 1, []),
+            Command('DISCARD', lambda socket, args: handle_discard(socket, args, self._database), 1, ["fast"]),
+            Command('WATCH', lambda socket, args: handle_watch(socket, args, self._database), -2, ["fast"], 1, -1, 1),
+            Command('UNWATCH', lambda socket, args: handle_unwatch(socket, args, self._database), 1, ["fast"]),
+            Command('COMMAND', lambda socket, args: handle_command(socket, args, self._commands), -1, ["stale"]),
+        ])
 
     def start(self, port: int) -> None:
         if self._config[ROLE] is FOLLOWER_ROLE:
             self._send_handshake(port)
 
-        with socket(AF_INET, SOCK_STREAM) as s:
-            s.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
-            s.bind(('', port))
+        with self._listen_socket(port) as s:
             s.listen()
 
-            print(f"Listening on port {port}")
+            logger.notice("Listening on port %d", port)
+            self._serve_peers()
+
+            cron_thread = Thread(target=self._run_cron, daemon=True)
+            cron_thread.start()
 
             while True:
                 client_socket, addr = s.accept()
@@ -44,10 +132,507 @@ class Server:
                 thread = Thread(target=self._on_client_request, args=(client_socket, addr), daemon=True)
                 thread.start()
 
+    def start_event_loop(self, port: int) -> None:
+        if self._config[ROLE] is FOLLOWER_ROLE:
+            self._send_handshake(port)
+
+        self._selector = DefaultSelector()
+        self._loop_thread = get_ident()
+        self._callbacks = deque()
+        self._pending_writes = set()
+        self._wakeup_reader, self._wakeup_writer = socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._selector.register(self._wakeup_reader, EVENT_READ, self._on_wakeup)
+        self._notifier.use_event_loop(self._loop_thread, self._call_soon)
+
+        with self._listen_socket(port) as s:
+            s.listen(SOMAXCONN)
+            s.setblocking(False)
+            self._selector.register(s, EVENT_READ, self._on_accept)
+
+            logger.notice("Listening on port %d (event loop)", port)
+            self._serve_peers()
+
+            next_cron = monotonic()
+
+            while True:
+                for key, mask in self._selector.select(self._select_timeout(next_cron)):
+                    self._guard(key.data, key.fileobj, mask)
+
+                self._notifier.expire_waiters()
+
+                if monotonic() >= next_cron:
+                    self._cron()
+                    next_cron = monotonic() + self._cron_period()
+
+                while self._callbacks:
+                    self._guard(self._callbacks.popleft())
+
+                self._aof.flush()
+                self._flush_pending_writes()
+
+    def _select_timeout(self, next_cron: float) -> float:
+        deadline = self._notifier.next_deadline()
+        wakeup = next_cron if deadline is None else min(next_cron, deadline)
+
+        return max(0, wakeup - monotonic())
+
+    def _guard(self, callback: Callable[..., None], *args: object) -> None:
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.warning("event loop callback failed: %r", e)
+
+    def _listen_socket(self, port: int) -> socket:
+        s = socket(AF_INET, SOCK_STREAM)
+        s.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+
+        if self._router is not None:
+            s.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+
+        s.bind(('', port))
+        return s
+
+    def _serve_peers(self) -> None:
+        if self._router is not None:
+            self._router.serve(lambda peer_socket, addr: self._on_client_request(peer_socket, addr, route=False))
+
+    def _run_cron(self) -> None:
+        while True:
+            sleep(self._cron_period())
+            self._cron()
+
+    def _cron(self) -> None:
+        time_limit_ms = self._cron_period() * 1000 * self._config[ACTIVE_EXPIRE_CPU] / 100
+        self._database.active_expire_cycle(time_limit_ms)
+        self._snapshots.cron()
+        self._aof.cron()
+
+    def _cron_period(self) -> float:
+        return 1 / self._config[HZ]
+
+    def _call_soon(self, callback: Callable[[], None]) -> None:
+        self._callbacks.append(callback)
+
+        try:
+            self._wakeup_writer.send(b"\0")
+        except BlockingIOError:
+            pass
+
+    def _on_wakeup(self, wakeup_socket: socket, mask: int) -> None:
+        try:
+            while wakeup_socket.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _on_accept(self, server_socket: socket, mask: int) -> None:
+        while True:
+            try:
+                client_socket, addr = server_socket.accept()
+            except BlockingIOError:
+                return
+
+            client_socket.setblocking(False)
+            connection = EventLoopSocket(client_socket, addr, self._schedule_write, self._metrics.record_output)
+            self._selector.register(connection, EVENT_READ, self._on_connection_event)
+            self._metrics.connection_opened()
+
+    def _schedule_write(self, connection: EventLoopSocket) -> None:
+        if get_ident() == self._loop_thread:
+            self._pending_writes.add(connection)
+        else:
+            self._call_soon(lambda: self._pending_writes.add(connection))
+
+    def _flush_pending_writes(self) -> None:
+        for connection in self._pending_writes:
+            if connection.closed:
+                continue
+
+            try:
+                flushed = connection.send_pending()
+            except OSError:
+                self._close_connection(connection)
+                continue
+
+            if flushed and connection.closing:
+                self._close_connection(connection)
+            elif not flushed:
+                self._selector.modify(connection, EVENT_READ | EVENT_WRITE, self._on_connection_event)
+
+        self._pending_writes.clear()
+
+    def _on_connection_event(self, connection: EventLoopSocket, mask: int) -> None:
+        if mask & EVENT_WRITE:
+            try:
+                flushed = connection.send_pending()
+            except OSError:
+                self._close_connection(connection)
+                return
+
+            if flushed and connection.closing:
+                self._close_connection(connection)
+                return
+
+            if flushed:
+                self._selector.modify(connection, EVENT_READ, self._on_connection_event)
+
+        if mask & EVENT_READ:
+            try:
+                data = connection.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b""
+
+            if len(data) == 0:
+                self._close_connection(connection)
+                return
+
+            if connection.closing:
+                return
+
+            self._metrics.record_input(len(data))
+            connection.parser.feed(data)
+            self._process_connection_input(connection)
+
+    def _process_connection_input(self, connection: EventLoopSocket) -> None:
+        parser = connection.parser
+
+        try:
+            while not connection.blocked and (request := parser.next_command()):
+                command, args = request
+
+                if self._is_blocking(command, args) and self._is_remote(command, args):
+                    connection.blocked = True
+                    thread = Thread(target=self._run_blocking, args=(connection, command, args), daemon=True)
+                    thread.start()
+                    continue
+
+                self._execute_safely(connection, command, args)
+                waiter = self._notifier.take_parked()
+
+                if waiter is not None:
+                    waiter.on_done = lambda: self._resume(connection)
+                    connection.blocked, connection.waiter = True, waiter
+        except ProtocolError as e:
+            logger.verbose("protocol error from client %s: %s", connection.get_addr(), e)
+            connection.sendall(encode_error_string(f"ERR Protocol error: {e}"))
+            connection.closing = True
+
+    def _run_blocking(self, connection: EventLoopSocket, command: str, args: list[bytes]) -> None:
+        self._execute_safely(connection, command, args)
+        self._call_soon(lambda: self._resume(connection))
+
+    def _resume(self, connection: EventLoopSocket) -> None:
+        connection.blocked, connection.waiter = False, None
+
+        if not connection.closed:
+            self._process_connection_input(connection)
+
+    def _execute_safely(self, resp_socket: RESPSocket, command: str, args: list[bytes], route: bool = True) -> None:
+        try:
+            self._execute(resp_socket, command, args, route)
+        except Exception as e:
+            logger.warning("error executing %s from client %s: %r", command, resp_socket.get_addr(), e)
+            resp_socket.sendall(encode_error_string(f"ERR {e}"))
+
+    def _close_connection(self, connection: EventLoopSocket) -> None:
+        if connection.closed:
+            return
+
+        logger.verbose("closing client connection %s", connection.get_addr())
+        self._selector.unregister(connection)
+
+        if connection.waiter is not None:
+            self._notifier.cancel(connection.waiter)
+        connection.close()
+        self._metrics.connection_closed()
+        self._discard_transaction(connection)
+        self._remove_replica(connection)
+
+    def _is_blocking(self, command: str, args: list[bytes]) -> bool:
+        entry = self._commands.get(command)
+        return entry is not None and entry.is_blocking(args)
+
+    def _is_remote(self, command: str, args: list[bytes]) -> bool:
+        if self._router is None:
+            return False
+
+        return bool(self._router.owners(self._commands[command].keys(args)) - {self._router.worker_id})
+
+    def _execute(self, resp_socket: RESPSocket, command: str, args: list[bytes], route: bool = True) -> None:
+        entry = self._commands.get(command)
+        transaction = resp_socket.transaction
+
+        if entry is None:
+            self._reject(resp_socket, unknown_command_error(command, args))
+            return
+
+        if not entry.check_arity(args):
+            self._reject(resp_socket, f"ERR wrong number of arguments for '{command.lower()}' command")
+            self._metrics.record_rejected(command)
+            return
+
+        if transaction is not None and transaction.in_multi() and entry.name not in TRANSACTION_COMMANDS:
+            if entry.no_multi:
+                self._reject(resp_socket, "ERR Command not allowed inside a transaction")
+            else:
+                transaction.queue(entry, args)
+                resp_socket.sendall(encode_simple_string("QUEUED"))
+            return
+
+        blocking = entry.is_blocking(args)
+
+        if blocking:
+            self._flush_propagated()
+            resp_socket.flush()
+
+        self._call(resp_socket, entry, args, route, blocking)
+
+    def _call(self, resp_socket: RESPSocket, entry: Command, args: list[bytes], route: bool, blocking: bool, evict: bool = True) -> None:
+        start = perf_counter_ns()
+
+        if self._dispatch(resp_socket, entry, args, route, evict):
+            self._metrics.record_call(entry.name, args, perf_counter_ns() - start, resp_socket.get_addr(), blocking)
+        else:
+            self._metrics.record_rejected(entry.name)
+
+    def _reject(self, resp_socket: RESPSocket, error: str) -> None:
+        if resp_socket.transaction is not None and resp_socket.transaction.in_multi():
+            resp_socket.transaction.failed = True
+
+        resp_socket.sendall(encode_error_string(error))
+
+    def _exec_transaction(self, resp_socket: RESPSocket, transaction: Transaction) -> None:
+        if self._router is not None and self._route_transaction(resp_socket, transaction):
+            return
+
+        if not self._evict(resp_socket, any(entry.denyoom for entry, _ in transaction.queued)):
+            return
+
+        replies = ReplyBuffer(resp_socket.get_addr())
+
+        with self._database.locked(None):
+            if transaction.dirty:
+                resp_socket.sendall(NULL_ARRAY)
+                return
+
+            self._pending_propagation.commands = []
+
+            try:
+                for entry, args in transaction.queued:
+                    self._call(replies, entry, entry.without_blocking(args), False, False, False)
+            finally:
+                propagated, self._pending_propagation.commands = self._pending_propagation.commands, None
+
+            self._propagate_transaction(propagated)
+
+        resp_socket.sendall(b"*%d\r\n" % len(transaction.queued) + replies.buffer)
+
+    def _route_transaction(self, resp_socket: RESPSocket, transaction: Transaction) -> bool:
+        owners = self._router.owners([key for entry, args in transaction.queued for key in entry.keys(args)])
+
+        if not owners or owners == {self._router.worker_id}:
+            return False
+
+        if len(owners) > 1 or transaction.watched:
+            resp_socket.sendall(encode_error_string("CROSSSLOT Keys in request don't hash to the same slot"))
+            return True
+
+        commands = [["MULTI"]] + [[entry.name] + args for entry, args in transaction.queued] + [["EXEC"]]
+
+        try:
+            resp_socket.sendall(self._router.forward_batch(owners.pop(), commands)[-1])
+        except OSError as e:
+            resp_socket.sendall(encode_error_string(f"ERR worker unavailable: {e}"))
+
+        return True
+
+    def _dispatch(self, resp_socket: RESPSocket, entry: Command, args: list[bytes], route: bool, evict: bool) -> bool:
+        if route and self._router is not None and self._route(resp_socket, entry, args):
+            return True
+
+        if not entry.write or entry.is_blocking(args):
+            entry.handler(resp_socket, args)
+            return True
+
+        if evict and not self._evict(resp_socket, entry.denyoom):
+            return False
+
+        with self._database.locked(entry.keys(args)):
+            writes = self._database.writes()
+            entry.handler(resp_socket, args)
+
+            if self._database.writes() != writes:
+                self._propagate(entry.name, args)
+
+        return True
+
+    def _evict(self, resp_socket: RESPSocket, denyoom: bool) -> bool:
+        evicted, ok = self._evictor.evict()
+
+        for key in evicted:
+            self._propagate('DEL', [key])
+
+        if not ok and denyoom:
+            resp_socket.sendall(encode_error_string("OOM command not allowed when used memory > 'maxmemory'."))
+            return False
+
+        return True
+
+    def _route(self, resp_socket: RESPSocket, entry: Command, args: list[bytes]) -> bool:
+        try:
+            if entry.name == 'KEYS':
+                keys = self._database.keys(args[0] if args else b"*")
+
+                for reply in self._router.gather(entry.name, args):
+                    keys += reply
+
+                resp_socket.sendall(encode_array(keys))
+                return True
+
+            if entry.name == 'SCAN':
+                cursor = int(args[0]) if args and args[0].isdigit() else 0
+                owners = {self._router.slot_owner(cursor)} if cursor < KEYSPACE_SLOTS else set()
+            else:
+                owners = self._router.owners(entry.keys(args))
+
+            if not owners or owners == {self._router.worker_id}:
+                return False
+
+            if entry.name == 'WATCH':
+                resp_socket.sendall(encode_error_string("CROSSSLOT WATCH keys must belong to this worker"))
+                return True
+
+            if len(owners) > 1:
+                resp_socket.sendall(encode_error_string("CROSSSLOT Keys in request don't hash to the same slot"))
+                return True
+
+            resp_socket.sendall(self._router.forward(owners.pop(), entry.name, args))
+        except OSError as e:
+            resp_socket.sendall(encode_error_string(f"ERR worker unavailable: {e}"))
+
+        return True
+
+    def _propagate(self, command: str, args: list[bytes]) -> None:
+        payload = encode_array([command] + args)
+
+        if self._pending_propagation.commands is not None:
+            self._pending_propagation.commands.append((payload, self._aof.persistent_payload(command, args, payload)))
+            return
+
+        self._aof.feed(command, args, payload)
+        self._feed_replicas(payload)
+
+    def _propagate_transaction(self, commands: list[tuple[bytes, bytes]]) -> None:
+        if not commands:
+            return
+
+        self._aof.feed_transaction([aof_payload for _, aof_payload in commands])
+        self._feed_replicas(wrap_transaction([payload for payload, _ in commands]))
+
+    def _feed_replicas(self, payload: bytes) -> None:
+        with self._backlog.lock:
+            if not self._backlog.active:
+                return
+
+            for replica in list(self._replicas.values()):
+                replica.send(payload)
+
+            self._backlog.append(payload)
+            logger.debug("incrementing leader offset %d by %d", self._config[REPLOFFSET], len(payload))
+            self._config[REPLOFFSET] += len(payload)
+
+    def _discard_transaction(self, resp_socket: RESPSocket) -> None:
+        if resp_socket.transaction is not None:
+            self._database.unwatch(resp_socket.transaction)
+
+    def _remove_replica(self, resp_socket: RESPSocket) -> None:
+        with self._backlog.lock:
+            replica = self._replicas.get(resp_socket.get_addr())
+
+            if replica and replica.socket is resp_socket:
+                logger.notice("removing replica: %s", resp_socket.get_addr())
+                del self._replicas[resp_socket.get_addr()]
+                replica.close()
+
+    def _flush_propagated(self) -> None:
+        self._aof.flush()
+
+    def replay_aof(self) -> None:
+        if not (self._aof.enabled() and os.path.isfile(self._aof.path())):
+            return
+
+        null_socket = NullSocket()
+        transaction = None
+
+        def apply(batch: list[tuple[Command, list[bytes]]]) -> None:
+            for entry, args in batch:
+                entry.handler(null_socket, args)
+
+        def execute(command: str, args: list[bytes]) -> None:
+            nonlocal transaction
+            transaction = self._apply_replicated(transaction, command, args, apply)
+
+        start = monotonic()
+        commands = self._aof.replay(execute)
+        self._database.dirty = 0
+
+        if transaction is not None:
+            logger.warning("discarding %d commands of an unfinished transaction at the end of the append only file", len(transaction))
+
+        logger.notice("replayed %d commands from %s in %.3fs", commands, self._aof.path(), monotonic() - start)
+
+    def _apply_replicated(self, transaction: list | None, command: str, args: list[bytes], apply: Callable[[list[tuple[Command, list[bytes]]]], None]) -> list | None:
+        if command == 'MULTI':
+            return []
+
+        if command == 'EXEC' and transaction is not None:
+            apply(transaction)
+            return None
+
+        entry = self._commands.get(command)
+
+        if entry is None:
+            return transaction
+
+        if transaction is not None:
+            transaction.append((entry, args))
+        else:
+            apply([(entry, args)])
+
+        return transaction
+
+    def _apply_leader_batch(self, leader_resp_socket: RESPSocket, batch: list[tuple[Command, list[bytes]]]) -> None:
+        payloads = []
+
+        with self._database.locked(None if len(batch) > 1 else []):
+            for entry, args in batch:
+                entry.handler(leader_resp_socket if entry.leader else NullSocket(), args)
+
+                if entry.write:
+                    payloads.append(self._aof.persistent_payload(entry.name, args, encode_array([entry.name] + args)))
+
+        if payloads:
+            self._aof.feed_transaction(payloads)
+
+    def open_aof(self) -> None:
+        self._aof.open()
+
     def _send_handshake(self, port: int) -> None:
+        leader_socket, parser = self._handshake(port)
+
+        thread = Thread(target=self._replicate, args=(port, leader_socket, parser), daemon=True)
+        thread.start()
+
+    def _handshake(self, port: int) -> tuple[socket, RESPParser]:
         s = socket(AF_INET, SOCK_STREAM)
         s.connect((self._config[LEADER_HOST], self._config[LEADER_PORT]))
 
+        parser = RESPParser()
+
         payload = [
             ["PING"],
             ["REPLCONF", "listening-port", port],
@@ -56,72 +641,152 @@ class Server:
 
         for p in payload:
             s.sendall(encode_array(p))
-            response = s.recv(1024)
-            print(response)
+            response = self._read_leader_frame(s, parser, parser.next_frame)
+            logger.verbose("%s", response)
 
-        s.sendall(encode_array(["PSYNC", "?", "-1"]))
+        if self._leader_replid:
+            s.sendall(encode_array(["PSYNC", self._leader_replid, self._config[REPLOFFSET] + 1]))
+        else:
+            s.sendall(encode_array(["PSYNC", "?", "-1"]))
 
-        thread = Thread(target=self._on_leader_request, args=(s,), daemon=True)
-        thread.start()
+        response = self._read_leader_frame(s, parser, parser.next_frame)
+        logger.notice("%s", response)
 
-    def _on_client_request(self, client_socket: socket, addr: tuple[str, int]) -> None:
-        while True: 
-            data = client_socket.recv(1024)
+        if response.startswith("FULLRESYNC"):
+            _, self._leader_replid, offset = response.split()
+            self._config[REPLOFFSET] = int(offset)
 
-            if len(data) == 0:
-                break
+            self._load_leader_rdb(s, parser)
+        elif response.startswith("CONTINUE"):
+            logger.notice("continuing replication from offset %d", self._config[REPLOFFSET])
+        else:
+            raise Exception(f"Unexpected PSYNC reply: {response}")
 
-            print(f"received request from client {addr}: {data}")
+        return s, parser
 
-            buffer = RESPBuffer(data)
-            resp_socket = RESPSocket(client_socket, addr)
+    def _load_leader_rdb(self, leader_socket: socket, parser: RESPParser) -> None:
+        size = self._read_leader_frame(leader_socket, parser, parser.next_bulk_length)
+        path = self._snapshots.temp_path(f"temp-sync-{os.getpid()}.rdb")
+        start = monotonic()
 
-            while buffer.is_not_empty():
-                command, args = decode_command(buffer)
+        try:
+            with open(path, "wb") as file:
+                remaining = size
 
-                if command not in self._handlers:
-                    continue
+                while remaining:
+                    if not parser.is_not_empty():
+                        data = leader_socket.recv(RDB_TRANSFER_CHUNK_BYTES)
+
+                        if len(data) == 0:
+                            raise Exception("Leader closed the connection during RDB transfer")
+
+                        parser.feed(data)
 
-                for handler in self._handlers[command]:
-                    handler(resp_socket, args)
+                    chunk = parser.take(remaining)
+                    file.write(chunk)
+                    remaining -= len(chunk)
 
-                if command in WRITE_COMMANDS and self._replicas:
-                    for replica_socket, _ in self._replicas.values():
-                        print(f"propagating {command} command to replica {replica_socket.get_addr()}")
-                        replica_socket.sendall(encode_array([command] + args))
-                    
-                    offset_increment = len(encode_array([command] + args))
-                    print(f"incrementing leader offset {self._config[REPLOFFSET]} by {offset_increment}")
-                    self._config[REPLOFFSET] += offset_increment
+            self._database.clear()
+            self._database.load_rdb_file(path)
+        finally:
+            os.remove(path)
 
-        print("closing client socket")
-        client_socket.close()
+        logger.notice("received RDB file from leader (%d bytes) in %.3fs", size, monotonic() - start)
 
-    def _on_leader_request(self, leader_socket: socket) -> None:
+    def _replicate(self, port: int, leader_socket: socket, parser: RESPParser) -> None:
         while True:
-            data = leader_socket.recv(1024)
+            try:
+                self._on_leader_request(leader_socket, parser)
+            except OSError as e:
+                logger.warning("lost connection to leader: %s", e)
+                leader_socket.close()
+
+            while True:
+                sleep(LEADER_RECONNECT_DELAY_S)
+
+                try:
+                    leader_socket, parser = self._handshake(port)
+                    break
+                except Exception as e:
+                    logger.warning("reconnecting to leader failed: %s", e)
+
+    def _read_leader_frame(self, leader_socket: socket, parser: RESPParser, next_frame: Callable[[], object | None]) -> object:
+        while (frame := next_frame()) is None:
+            data = leader_socket.recv(65536)
 
             if len(data) == 0:
-                break
-            
-            print(f"received request from leader {leader_socket.getsockname()}: {data}")
+                raise Exception("Leader closed the connection during handshake")
 
-            buffer = RESPBuffer(data)
+            parser.feed(data)
 
-            while buffer.is_not_empty():
-                command, args = decode_command(buffer)
+        return frame
 
-                if command not in self._handlers:
-                    continue
+    def _on_client_request(self, client_socket: socket, addr: tuple[str, int], route: bool = True) -> None:
+        parser = RESPParser()
+        resp_socket = RESPSocket(client_socket, addr, self._metrics.record_output)
+        self._metrics.connection_opened()
+
+        try:
+            while True: 
+                data = client_socket.recv(65536)
+
+                if len(data) == 0:
+                    break
+
+                self._metrics.record_input(len(data))
+                logger.debug("received request from client %s: %s", addr, data)
+
+                parser.feed(data)
+
+                try:
+                    while request := parser.next_command():
+                        command, args = request
+                        self._execute_safely(resp_socket, command, args, route)
+                except ProtocolError as e:
+                    logger.verbose("protocol error from client %s: %s", addr, e)
+                    resp_socket.sendall(encode_error_string(f"ERR Protocol error: {e}"))
+                    break
+                finally:
+                    self._flush_propagated()
+                    resp_socket.flush()
+        finally:
+            logger.verbose("closing client socket")
+            client_socket.close()
+            self._metrics.connection_closed()
+            self._discard_transaction(resp_socket)
+            self._remove_replica(resp_socket)
 
-                resp_socket = RESPSocket(leader_socket, leader_socket.getsockname()) if command in LEADER_COMMANDS else NullSocket() 
+    def _on_leader_request(self, leader_socket: socket, parser: RESPParser) -> None:
+        leader_resp_socket = RESPSocket(leader_socket, leader_socket.getsockname())
+        apply = lambda batch: self._apply_leader_batch(leader_resp_socket, batch)
+        transaction = None
 
-                for handler in self._handlers[command]:
-                    handler(resp_socket, args)
+        while True:
+            consumed = parser.consumed
+
+            while request := parser.next_command():
+                command, args = request
+                transaction = self._apply_replicated(transaction, command, args, apply)
 
-                offset_increment = len(encode_array([command] + args))
-                print(f"incrementing offset {self._config[REPLOFFSET]} by {offset_increment}")
+                offset_increment = parser.consumed - consumed
+                consumed = parser.consumed
+                logger.debug("incrementing offset %d by %d", self._config[REPLOFFSET], offset_increment)
                 self._config[REPLOFFSET] += offset_increment
 
-        print("closing leader socket")
-        leader_socket.close()
\ No newline at end of file
+            self._aof.flush()
+            leader_resp_socket.flush()
+
+            data = leader_socket.recv(65536)
+
+            if len(data) == 0:
+                break
+            
+            logger.debug("received request from leader %s: %s", leader_socket.getsockname(), data)
+
+            parser.feed(data)
+
+        logger.verbose("closing leader socket")
+        leader_socket.close()
+
+class _PendingPropagation(local):
+    commands = None
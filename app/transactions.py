@@ -0,0 +1,20 @@
+class Transaction:
+    def __init__(self) -> None:
+        self.queued = None
+        self.watched = set()
+        self.dirty = False
+        self.failed = False
+
+    def in_multi(self) -> bool:
+        return self.queued is not None
+
+    def begin(self) -> None:
+        self.queued = []
+
+    def queue(self, command: object, args: list[bytes]) -> None:
+        self.queued.append((command, args))
+
+    def reset(self) -> None:
+        self.queued = None
+        self.dirty = False
+        self.failed = False
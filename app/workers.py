@@ -0,0 +1,107 @@
+from socket import socket, AF_UNIX, SOCK_STREAM
+from threading import Lock, Thread
+from typing import Callable
+from app.constants import *
+from app import logger
+from app.database import key_slot
+from app.resp import RESPParser, encode_array
+import os
+
+class WorkerRouter:
+    def __init__(self, config: dict, listener: socket) -> None:
+        self.worker_id = config[WORKER_ID]
+        self._workers = config[WORKERS]
+        self._socket_dir = config[WORKER_SOCKET_DIR]
+        self._listener = listener
+        self._idle = [[] for _ in range(self._workers)]
+        self._lock = Lock()
+
+    def owners(self, keys: list[bytes]) -> set[int]:
+        return {self.slot_owner(key_slot(key)) for key in keys}
+
+    def slot_owner(self, slot: int) -> int:
+        return slot * self._workers // KEYSPACE_SLOTS
+
+    def end_slot(self) -> int:
+        return -(-(self.worker_id + 1) * KEYSPACE_SLOTS // self._workers)
+
+    def peers(self) -> list[int]:
+        return [worker for worker in range(self._workers) if worker != self.worker_id]
+
+    def serve(self, on_connection: Callable[[socket, str], None]) -> None:
+        thread = Thread(target=self._accept, args=(on_connection,), daemon=True)
+        thread.start()
+
+    def forward(self, worker: int, command: str, args: list[bytes]) -> bytes:
+        return self.forward_batch(worker, [[command] + args])[0]
+
+    def forward_batch(self, worker: int, commands: list[list[object]]) -> list[bytes]:
+        connection = self._acquire(worker)
+        peer_socket, parser = connection
+        replies = []
+
+        try:
+            peer_socket.sendall(b"".join([encode_array(command) for command in commands]))
+
+            while len(replies) < len(commands):
+                if (reply := parser.next_raw()) is not None:
+                    replies.append(reply)
+                    continue
+
+                data = peer_socket.recv(65536)
+
+                if len(data) == 0:
+                    raise ConnectionError(f"worker {worker} closed the connection")
+
+                parser.feed(data)
+        except OSError:
+            peer_socket.close()
+            raise
+
+        with self._lock:
+            self._idle[worker].append(connection)
+
+        return replies
+
+    def gather(self, command: str, args: list[bytes]) -> list[object]:
+        replies = []
+
+        for worker in self.peers():
+            parser = RESPParser()
+            parser.feed(self.forward(worker, command, args))
+            replies.append(parser.next_frame())
+
+        return replies
+
+    def _acquire(self, worker: int) -> tuple[socket, RESPParser]:
+        with self._lock:
+            if self._idle[worker]:
+                return self._idle[worker].pop()
+
+        peer_socket = socket(AF_UNIX, SOCK_STREAM)
+        peer_socket.connect(worker_socket_path(self._socket_dir, worker))
+
+        return peer_socket, RESPParser()
+
+    def _accept(self, on_connection: Callable[[socket, str], None]) -> None:
+        logger.notice("worker %d accepting peer connections", self.worker_id)
+
+        while True:
+            peer_socket, addr = self._listener.accept()
+
+            thread = Thread(target=on_connection, args=(peer_socket, addr), daemon=True)
+            thread.start()
+
+def worker_socket_path(socket_dir: str, worker: int) -> str:
+    return os.path.join(socket_dir, f"worker-{worker}.sock")
+
+def listen_worker_socket(socket_dir: str, worker: int) -> socket:
+    listener = socket(AF_UNIX, SOCK_STREAM)
+    listener.bind(worker_socket_path(socket_dir, worker))
+    listener.listen()
+
+    return listener
+
+def worker_filename(filename: str, worker: int) -> str:
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}-{worker}{ext}"
@@ -0,0 +1,302 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from socket import create_connection, IPPROTO_TCP, TCP_NODELAY
+from threading import Barrier, Thread
+from time import perf_counter
+from typing import Callable
+from app.resp import RESPParser, encode_array
+
+WORKLOADS = ["ping", "set", "get", "xadd", "xrange", "xread-block", "wait"]
+COMMAND_POOL_SIZE = 1024
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class Client:
+    def __init__(self, host: str, port: int) -> None:
+        self._socket = create_connection((host, port))
+        self._socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        self._parser = RESPParser()
+
+    def send(self, payload: bytes) -> None:
+        self._socket.sendall(payload)
+
+    def reply(self) -> bytes:
+        while (reply := self._parser.next_raw()) is None:
+            data = self._socket.recv(65536)
+
+            if len(data) == 0:
+                raise ConnectionError("server closed the connection")
+
+            self._parser.feed(data)
+
+        return reply
+
+    def call(self, *args: object) -> bytes:
+        self.send(encode_array(list(args)))
+        return self.reply()
+
+    def close(self) -> None:
+        self._socket.close()
+
+class Result:
+    def __init__(self) -> None:
+        self.latencies = []
+        self.errors = 0
+
+    def record(self, started: float, reply: bytes) -> None:
+        self.latencies.append(perf_counter() - started)
+
+        if reply[:1] == b"-":
+            self.errors += 1
+
+def spawn_server(port: int, server_args: list[str]) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, "-m", "app.main", "--port", str(port)] + server_args, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+
+    while True:
+        try:
+            create_connection(("localhost", port)).close()
+            return process
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError(f"server on port {port} failed to start")
+
+            time.sleep(0.05)
+
+def wait_for_replica(host: str, port: int) -> None:
+    client = Client(host, port)
+    deadline = time.monotonic() + 10
+
+    while client.call("WAIT", 1, 100) != b":1\r\n":
+        if time.monotonic() > deadline:
+            raise RuntimeError("replica did not connect")
+
+    client.close()
+
+def command_pool(workload: str, keyspace: int, value: bytes) -> list[bytes]:
+    commands = []
+
+    for _ in range(COMMAND_POOL_SIZE):
+        key = b"key:%012d" % random.randrange(keyspace)
+        stream = b"stream:%012d" % random.randrange(keyspace)
+
+        if workload == "ping":
+            commands.append(encode_array(["PING"]))
+        elif workload in ("set", "wait"):
+            commands.append(encode_array(["SET", key, value]))
+        elif workload == "get":
+            commands.append(encode_array(["GET", key]))
+        elif workload == "xadd":
+            commands.append(encode_array(["XADD", stream, "*", "field", value]))
+        elif workload == "xrange":
+            commands.append(encode_array(["XRANGE", stream, "-", "+", "COUNT", 10]))
+
+    return commands
+
+def prefill(host: str, port: int, workload: str, keyspace: int, value: bytes) -> None:
+    if workload not in ("get", "xrange"):
+        return
+
+    client = Client(host, port)
+
+    for start in range(0, keyspace, 1000):
+        batch = range(start, min(start + 1000, keyspace))
+
+        if workload == "get":
+            client.send(b"".join([encode_array(["SET", b"key:%012d" % i, value]) for i in batch]))
+        else:
+            client.send(b"".join([encode_array(["XADD", b"stream:%012d" % i, "*", "field", value]) for i in batch]))
+
+        for _ in batch:
+            client.reply()
+
+    client.close()
+
+def run_pipelined(client: Client, commands: list[bytes], requests: int, pipeline: int, result: Result) -> None:
+    sent = 0
+
+    while sent < requests:
+        batch = min(pipeline, requests - sent)
+        payload = b"".join([commands[(sent + i) % len(commands)] for i in range(batch)])
+        started = perf_counter()
+        client.send(payload)
+
+        for _ in range(batch):
+            result.record(started, client.reply())
+
+        sent += batch
+
+def run_wait(client: Client, commands: list[bytes], requests: int, pipeline: int, result: Result) -> None:
+    wait = encode_array(["WAIT", 1, 1000])
+    sent = 0
+
+    while sent < requests:
+        batch = min(pipeline, requests - sent)
+        payload = b"".join([commands[(sent + i) % len(commands)] for i in range(batch)])
+        started = perf_counter()
+        client.send(payload + wait)
+
+        for _ in range(batch):
+            client.reply()
+
+        result.record(started, client.reply())
+        sent += batch
+
+def run_xread_block(client: Client, producer: Client, stream: bytes, requests: int, result: Result) -> None:
+    xadd = encode_array(["XADD", stream, "*", "field", "value"])
+    producer.send(xadd)
+    last_id = producer.reply().split(b"\r\n")[1]
+
+    for _ in range(requests):
+        client.send(encode_array(["XREAD", "BLOCK", 1000, "STREAMS", stream, last_id]))
+        time.sleep(0.001)
+        started = perf_counter()
+        producer.send(xadd)
+        last_id = producer.reply().split(b"\r\n")[1]
+        result.record(started, client.reply())
+
+def run_workload(args: argparse.Namespace, host: str, port: int, workload: str) -> dict:
+    value = os.urandom(args.value_size // 2).hex().encode() + b"x" * (args.value_size % 2)
+    prefill(host, port, workload, args.keyspace, value)
+
+    per_client = [args.requests // args.clients + (1 if i < args.requests % args.clients else 0) for i in range(args.clients)]
+    results = [Result() for _ in range(args.clients)]
+    barrier = Barrier(args.clients + 1)
+    threads = []
+
+    for i in range(args.clients):
+        client = Client(host, port)
+
+        if workload == "xread-block":
+            target, target_args = run_xread_block, (Client(host, port), b"bstream:%d:%d" % (os.getpid(), i), per_client[i], results[i])
+        else:
+            target = run_wait if workload == "wait" else run_pipelined
+            target_args = (command_pool(workload, args.keyspace, value), per_client[i], args.pipeline, results[i])
+
+        threads.append(Thread(target=_after_barrier, args=(barrier, target, client) + target_args))
+        threads[-1].start()
+
+    barrier.wait()
+    started = perf_counter()
+
+    for thread in threads:
+        thread.join()
+
+    elapsed = perf_counter() - started
+    latencies = sorted(latency for result in results for latency in result.latencies)
+
+    return {
+        "workload": workload,
+        "clients": args.clients,
+        "pipeline": 1 if workload == "xread-block" else args.pipeline,
+        "requests": args.requests,
+        "errors": sum(result.errors for result in results),
+        "seconds": round(elapsed, 4),
+        "ops_per_sec": round(args.requests / elapsed, 1),
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "p999": percentile(latencies, 99.9),
+            "max": percentile(latencies, 100),
+        },
+    }
+
+def _after_barrier(barrier: Barrier, target: Callable, client: Client, *args: object) -> None:
+    barrier.wait()
+
+    try:
+        target(client, *args)
+    finally:
+        client.close()
+
+def percentile(latencies: list[float], p: float) -> float:
+    if not latencies:
+        return 0.0
+
+    index = min(len(latencies) - 1, max(0, int(len(latencies) * p / 100 + 0.5) - 1))
+
+    return round(latencies[index] * 1000, 3)
+
+def compare(results: list[dict], baseline_path: str, threshold: float) -> int:
+    with open(baseline_path) as file:
+        baseline = {result["workload"]: result for result in json.load(file)["results"]}
+
+    regressions = 0
+
+    for result in results:
+        previous = baseline.get(result["workload"])
+
+        if previous is None:
+            continue
+
+        ops_change = (result["ops_per_sec"] / previous["ops_per_sec"] - 1) * 100
+        p99_change = (result["latency_ms"]["p99"] / previous["latency_ms"]["p99"] - 1) * 100 if previous["latency_ms"]["p99"] else 0.0
+        regressed = ops_change < -threshold
+
+        print(f"{result['workload']:<12} ops/s {ops_change:+7.1f}%  p99 {p99_change:+7.1f}%{'  REGRESSION' if regressed else ''}")
+        regressions += regressed
+
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Drive a server over loopback and report throughput and latency, in the spirit of redis-benchmark")
+    parser.add_argument("--host", default="localhost", help="Host of the server under test")
+    parser.add_argument("--port", type=int, default=6399, help="Port of the server under test")
+    parser.add_argument("--no-spawn", action="store_true", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--server-args", default="", help="Extra arguments for the spawned server, e.g. '--event-loop'")
+    parser.add_argument("-t", "--tests", default=",".join(WORKLOADS), help=f"Comma separated workloads from {', '.join(WORKLOADS)}")
+    parser.add_argument("-c", "--clients", type=int, default=50, help="Number of parallel connections")
+    parser.add_argument("-n", "--requests", type=int, default=100000, help="Total number of requests per workload")
+    parser.add_argument("-P", "--pipeline", type=int, default=1, help="Number of requests pipelined per round trip")
+    parser.add_argument("-r", "--keyspace", type=int, default=10000, help="Number of distinct keys used by the workloads")
+    parser.add_argument("-d", "--value-size", type=int, default=3, help="Size in bytes of SET and XADD values")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Throughput drop in percent reported as a regression by --compare")
+
+    args = parser.parse_args()
+    workloads = [workload.strip() for workload in args.tests.split(",") if workload.strip()]
+
+    for workload in workloads:
+        if workload not in WORKLOADS:
+            parser.error(f"unknown workload {workload}")
+
+    processes = []
+
+    try:
+        if not args.no_spawn:
+            processes.append(spawn_server(args.port, args.server_args.split()))
+
+            if "wait" in workloads:
+                processes.append(spawn_server(args.port + 1, args.server_args.split() + ["--replicaof", "localhost", str(args.port)]))
+
+        if "wait" in workloads:
+            wait_for_replica(args.host, args.port)
+
+        results = []
+
+        for workload in workloads:
+            result = run_workload(args, args.host, args.port, workload)
+            results.append(result)
+
+            latency = result["latency_ms"]
+            print(f"{workload:<12} {result['ops_per_sec']:>12,.1f} ops/s  p50 {latency['p50']:.3f} ms  p99 {latency['p99']:.3f} ms  p999 {latency['p999']:.3f} ms  max {latency['max']:.3f} ms  errors {result['errors']}")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"timestamp": time.time(), "args": vars(args), "results": results}, file, indent=2)
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
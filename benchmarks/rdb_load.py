@@ -0,0 +1,105 @@
+"""Benchmark loading a synthetic RDB file.
+
+Run from the repository root with: python -m benchmarks.rdb_load
+"""
+
+import argparse
+import os
+import tempfile
+from struct import pack
+from time import perf_counter
+from app.database import Database
+from app.rdb import encode_length
+
+def encode_raw_string(value: bytes) -> bytes:
+    return encode_length(len(value)) + value
+
+def encode_int(value: int) -> bytes:
+    if -(1 << 7) <= value < 1 << 7:
+        return b"\xc0" + pack("<b", value)
+    elif -(1 << 15) <= value < 1 << 15:
+        return b"\xc1" + pack("<h", value)
+
+    return b"\xc2" + pack("<i", value)
+
+def encode_lzf_repeat(chunk: bytes, length: int) -> bytes:
+    compressed = bytes([len(chunk) - 1]) + chunk
+    remaining = length - len(chunk)
+    offset = len(chunk) - 1
+
+    while remaining > 0:
+        n = min(remaining, 264)
+
+        if n < 3:
+            compressed += bytes([n - 1]) + chunk[:n]
+        else:
+            compressed += bytes([0xE0 | (offset >> 8), n - 9, offset & 0xFF]) if n >= 9 else bytes([((n - 2) << 5) | (offset >> 8), offset & 0xFF])
+
+        remaining -= n
+
+    return b"\xc3" + encode_length(len(compressed)) + encode_length(length) + compressed
+
+def write_rdb(path: str, size: int, value_size: int) -> int:
+    keys = size // (value_size + 16)
+    random_block = os.urandom(1 << 20)
+
+    with open(path, "wb") as file:
+        file.write(b"REDIS0011\xfa" + encode_raw_string(b"redis-ver") + encode_raw_string(b"7.2.0"))
+        file.write(b"\xfe\x00\xfb" + encode_length(keys) + encode_length(keys // 8))
+
+        chunk = bytearray()
+
+        for i in range(keys):
+            key = b"key:%012d" % i
+
+            if i % 8 == 0:
+                chunk += b"\xfc" + pack("<Q", 4102444800000)
+
+            chunk += b"\x00" + encode_raw_string(key)
+
+            if i % 4 == 0:
+                chunk += encode_int(i % 100000)
+            elif i % 4 == 1 and value_size >= 32:
+                chunk += encode_lzf_repeat(b"%016d" % i, value_size)
+            else:
+                start = (i * value_size) % (len(random_block) - value_size)
+                chunk += encode_raw_string(random_block[start:start + value_size])
+
+            if len(chunk) > 1 << 20:
+                file.write(chunk)
+                chunk.clear()
+
+        file.write(chunk + b"\xff" + b"\x00" * 8)
+
+    return keys
+
+def load(path: str) -> None:
+    size = os.path.getsize(path)
+    start = perf_counter()
+    database = Database(path)
+    elapsed = perf_counter() - start
+
+    print(f"loaded {len(database.keys())} keys from {size / (1 << 20):.1f} MB in {elapsed:.2f}s ({size / (1 << 20) / elapsed:.1f} MB/s)")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark loading a synthetic RDB file. Run from the repository root with: python -m benchmarks.rdb_load")
+    parser.add_argument("--size-mb", type=int, default=64, help="Approximate size of the generated RDB file (1024 for 1 GB)")
+    parser.add_argument("--value-size", type=int, default=100, help="Size in bytes of each string value")
+    parser.add_argument("--file", help="Load this RDB file instead of generating one")
+
+    args = parser.parse_args()
+
+    if args.file:
+        load(args.file)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.rdb")
+        start = perf_counter()
+        keys = write_rdb(path, args.size_mb << 20, args.value_size)
+        print(f"generated {keys} keys in {perf_counter() - start:.2f}s")
+
+        load(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import subprocess
+from time import perf_counter
+from types import ModuleType
+from typing import Callable
+from app.constants import ENCODING
+from app.database import Stream
+from app.resp import encode_array, encode_bulk, encode_integer, encode_simple_string, encode_stream
+
+def load_baseline(revision: str) -> ModuleType:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = f"{revision}:app/resp.py"
+    source = subprocess.run(["git", "show", path], cwd=root, capture_output=True, check=True).stdout
+
+    module = ModuleType("baseline_resp")
+    exec(compile(source, path, "exec"), module.__dict__)
+    return module
+
+def measure(encode: Callable[[object], bytes], value: object, seconds: float) -> float:
+    calls, elapsed, batch = 0, 0.0, 1
+
+    while elapsed < seconds:
+        start = perf_counter()
+
+        for _ in range(batch):
+            encode(value)
+
+        elapsed += perf_counter() - start
+        calls += batch
+        batch *= 2
+
+    return calls / elapsed
+
+def build_cases(baseline: ModuleType, stream_entries: int, value_size: int) -> list[tuple[str, Callable, Callable, object]]:
+    value = os.urandom(value_size)
+    stream = Stream()
+
+    for i in range(stream_entries):
+        stream.append((i + 1, 0), [b"field", b"%d" % i, b"payload", value[:32]])
+
+    entries = stream.range((0, 0), (stream_entries + 1, 0), None)
+    keys = [b"key:%08d" % i for i in range(1000)]
+
+    return [
+        ("simple OK", baseline.encode_simple_string, encode_simple_string, "OK"),
+        ("integer 42", baseline.encode_integer, encode_integer, 42),
+        ("integer 10**12", baseline.encode_integer, encode_integer, 10 ** 12),
+        (f"bulk {value_size}B", lambda v: baseline.encode_bulk_string([v]), encode_bulk, value),
+        ("bulk 1MB", lambda v: baseline.encode_bulk_string([v]), encode_bulk, b"x" * (1 << 20)),
+        ("array SET k v", baseline.encode_array, encode_array, ["SET", b"key:00000001", value]),
+        ("array SET k v PXAT", baseline.encode_array, encode_array, ["SET", b"key:00000001", value, "PXAT", 4102444800000]),
+        ("array 1000 keys", baseline.encode_array, encode_array, keys),
+        (f"stream {stream_entries} entries", baseline.encode_stream, encode_stream, entries),
+    ]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the RESP encoders against those of an earlier revision")
+    parser.add_argument("--baseline", default="01370be^", help="Git revision whose app/resp.py encoders are the baseline")
+    parser.add_argument("--seconds", type=float, default=0.5, help="Time spent measuring each encoder")
+    parser.add_argument("--value-size", type=int, default=100, help="Size in bytes of string values")
+    parser.add_argument("--stream-entries", type=int, default=10000, help="Number of entries in the encoded stream")
+
+    args = parser.parse_args()
+    baseline = load_baseline(args.baseline)
+
+    print(f"baseline: {args.baseline}:app/resp.py")
+    print(f"{'case':<28}{'baseline ops/s':>16}{'current ops/s':>16}{'speedup':>10}")
+
+    for name, previous, current, value in build_cases(baseline, args.stream_entries, args.value_size):
+        assert previous(value) == current(value), name
+
+        baseline_rate = measure(previous, value, args.seconds)
+        current_rate = measure(current, value, args.seconds)
+
+        print(f"{name:<28}{baseline_rate:>16,.0f}{current_rate:>16,.0f}{current_rate / baseline_rate:>9.2f}x")
+
+if __name__ == "__main__":
+    main()